@@ -1,27 +1,56 @@
-from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from pydantic import ValidationError
-from model_classes import ExceptionMessageEnum,CustomException
-from dataprocessing.bart_summary import bart_summarization
+from model_classes import ExceptionMessageEnum,CustomException,JobQueueFullException
+from dataprocessing.bart_summary import bart_summarization, bart_batcher
+from dataprocessing.inference_backend import INFERENCE_WARM_UP
 from http import HTTPStatus
 from dataprocessing.summary import Summary
 from urllib.parse import unquote
-from dataprocessing.data_cleansing import process_conversation_notes
+from dataprocessing.data_cleansing import process_conversation_notes, warm_up_chitchat_classifier
 from model_classes import Note, CleanseDataStatusResponse, CleanseDataResponse, UnstructuredSummary, Job, StatusEnum, StructuredSummary, MajorIncidentCommunication, Telemetry, BuildSummary, BuildLogs
+from model_classes import BatchSummaryRequest, BatchSummaryResponse, BatchSummaryTypeEnum, BatchModeEnum
+from model_classes import TelemetryGroupSummary, TelemetryIngestResponse
 from fastapi.security.api_key import APIKey
 import auth
 from dotenv import load_dotenv
 from dataprocessing.chunking import Chunk
-from config import log_entry_exit
+from dataprocessing.batch import BatchSummarizer, check_batch_size, parse_ndjson, submit_batch_job, parse_batch_result
+from dataprocessing.telemetry_groups import telemetry_grouper, parse_event_stream
+from tracing import traced
+from metrics import registry, GaugeCallback, MetricsMiddleware
+from streaming import sse_stream
+from job_store import get_job_store
+from job_scheduler import JobScheduler
+from serving import cpu_pool
+from response_cache import response_cache
+from incremental_store import incremental_store
+from semantic_cache import semantic_cache
+from dataprocessing.json_parser import structured_output_metrics
+from llm_client import llm_client
+from single_flight import summary_flight, request_key
+from model_registry import model_registry, PRELOAD_MODELS, PRELOAD_IN_BACKGROUND
 import platform_config
 import logging
+from typing import List, Optional
 
 load_dotenv()
 
-job_object = {}
+# Proxies such as nginx must not buffer the event stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+job_store = get_job_store()
+job_scheduler = JobScheduler(job_store)
 
 app = FastAPI()
 
+def retry_after_headers(exception: CustomException):
+    # Rate limiting (429) and an open LLM circuit (503) tell clients when to retry
+    retry_after = getattr(exception, "retry_after", None)
+    return {"Retry-After": str(retry_after)} if retry_after is not None else None
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -30,51 +59,77 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@log_entry_exit
-def cleanse_note(note: Note, job):
-    '''
-    Method takes uncleansed notes as input and returns cleansed note as output
-    '''
-    try:
-        # Process and cleanse conversation notes
-        url_encoded_string = process_conversation_notes(note.work_note)
-        # Update job result and status
-        job_object[job.job_uuid.__str__()].result = url_encoded_string
-        job_object[job.job_uuid.__str__()].status = StatusEnum.SUCCESS
-    except Exception as e:
-        logging.error(ExceptionMessageEnum.DATA_CLEANSING_ERROR.value.format(e))
-        job_object[job.job_uuid.__str__()].result = ExceptionMessageEnum.DATA_CLEANSING_ERROR.value.format(e)
-        job_object[job.job_uuid.__str__()].status = StatusEnum.ERROR
+app.add_middleware(MetricsMiddleware)
+
+registry.register(GaugeCallback(
+    "textsummary_cleanse_queue_depth", "Cleanse-note jobs queued or running",
+    lambda: [((), job_scheduler.stats()["depth"])]))
+registry.register(GaugeCallback(
+    "textsummary_model_load_seconds", "Time it took to load each model",
+    lambda: [((name,), status["load_seconds"]) for name, status in model_registry.status().items()
+             if status["load_seconds"] is not None],
+    labelnames=("model",)))
+
+@app.on_event("startup")
+def start_job_store_purge():
+    # Expired cleanse-note results are removed on a schedule
+    job_store.start_purge_thread()
+
+@app.on_event("startup")
+def start_telemetry_flush():
+    # Telemetry groups are summarized in the background once their window is over
+    telemetry_grouper.start_flush_thread()
+
+@app.on_event("startup")
+def preload_models():
+    # Models are loaded lazily on first use unless listed in MODEL_REGISTRY.PRELOAD
+    model_registry.preload([name for name in PRELOAD_MODELS if name != "chitchat_classifier"],
+                           background=PRELOAD_IN_BACKGROUND, warm_up=INFERENCE_WARM_UP)
+    if "chitchat_classifier" in PRELOAD_MODELS:
+        # The chitchat classifier runs in the cleansing job pool, not in this process
+        job_scheduler.warm_up(warm_up_chitchat_classifier)
+
+@app.on_event("shutdown")
+def stop_job_scheduler():
+    job_scheduler.shutdown()
+
+@app.on_event("shutdown")
+def stop_cpu_pool():
+    cpu_pool.shutdown()
 
-@log_entry_exit
 @app.post("/text-tools/cleanse-note", response_model=CleanseDataStatusResponse, status_code=HTTPStatus.ACCEPTED)
-async def post_cleanse_note(note: Note, background_tasks: BackgroundTasks, api_key: APIKey = Depends(auth.get_api_key)):
+@traced
+async def post_cleanse_note(note: Note, api_key: APIKey = Depends(auth.get_api_key)):
     '''
     API to initiate data cleansing process
     '''
     try:
-        # Create a new job and add it to the job_object
+        # Create a new job and queue data cleansing on the job scheduler's process pool
         data_cleaning_job = Job()
-        job_uuid = data_cleaning_job.job_uuid.__str__()
-        job_object[job_uuid] = data_cleaning_job
-        # Add a background task to run data cleansing asynchronously
-        background_tasks.add_task(cleanse_note, note, data_cleaning_job)
+        # An identical note that is still being cleansed returns the transaction_id of that job
+        job_uuid = job_scheduler.submit(data_cleaning_job, process_conversation_notes, note.work_note,
+                                        dedup_key=request_key("cleanse_note", note.work_note))
         return CleanseDataStatusResponse(transaction_id=job_uuid, status=data_cleaning_job.status)
+    except JobQueueFullException as qe:
+        logging.warning(str(qe))
+        raise HTTPException(status_code=qe.error_code, detail=str(qe),
+                            headers={"Retry-After": str(qe.retry_after)})
     except Exception as e:
         logging.error(ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
         raise HTTPException(
             status_code=500, detail=ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
 
-@log_entry_exit
 @app.get("/text-tools/cleanse-note/status/{transaction_id}", response_model=CleanseDataStatusResponse)
+@traced
 def get_cleanse_note_status(transaction_id: str, api_key: APIKey = Depends(auth.get_api_key)):
     '''
     API to retrieve data cleansing job status
     '''
     try:
-        job = job_object.get(transaction_id)
+        job = job_store.get(transaction_id)
         if job:
-            return CleanseDataStatusResponse(transaction_id=transaction_id, status=job.status)
+            return CleanseDataStatusResponse(transaction_id=transaction_id, status=job.status,
+                                             queue_wait_ms=job.queue_wait_ms, run_time_ms=job.run_time_ms)
         else:
             return CleanseDataStatusResponse(transaction_id=transaction_id, status=StatusEnum.NOT_FOUND)
     except Exception as e:
@@ -82,14 +137,14 @@ def get_cleanse_note_status(transaction_id: str, api_key: APIKey = Depends(auth.
         raise HTTPException(
             status_code=500, detail=ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
 
-@log_entry_exit
 @app.get("/text-tools/cleanse-note/{transaction_id}", response_model=CleanseDataResponse)
+@traced
 def get_cleansed_note(transaction_id: str, api_key: APIKey = Depends(auth.get_api_key)):
     '''
     API to retrieve cleansed data
     '''
     try:
-        job = job_object.get(transaction_id)
+        job = job_store.get(transaction_id)
         if job:
             return CleanseDataResponse(transaction_id=transaction_id, status=job.status, result=job.result)
         else:
@@ -99,14 +154,15 @@ def get_cleansed_note(transaction_id: str, api_key: APIKey = Depends(auth.get_ap
         raise HTTPException(
             status_code=500, detail=ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
 
-@log_entry_exit
 @app.post("/text-tools/short-summary", response_model=UnstructuredSummary)
-def post_short_summary(note: Note, api_key: APIKey = Depends(auth.get_api_key)):
+@traced
+async def post_short_summary(note: Note, api_key: APIKey = Depends(auth.get_api_key)):
     '''
     API to generate a short summary using BART summarization
     '''
     try:
-        url_encoded_string = bart_summarization(note.work_note)
+        url_encoded_string = await summary_flight.run(request_key("short_summary", note.work_note),
+                                                    run_in_threadpool, bart_summarization, note.work_note)
         decoded_summary = unquote(url_encoded_string)
         return UnstructuredSummary(summary=decoded_summary)
     except Exception as e:
@@ -114,99 +170,274 @@ def post_short_summary(note: Note, api_key: APIKey = Depends(auth.get_api_key)):
         raise HTTPException(
             status_code=500, detail=ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
 
-@log_entry_exit
 @app.post("/text-tools/long-summary", response_model=UnstructuredSummary)
-def post_long_summary(note: Note, api_key: APIKey = Depends(auth.get_api_key)):
+@traced
+async def post_long_summary(note: Note, api_key: APIKey = Depends(auth.get_api_key)):
     '''
     API to generate a long summary using Llama summarization
     '''
     try:
         chunks = Chunk()
-        long_summary = chunks.summarize(note.work_note, summary_type='long_summary')
+        long_summary = await summary_flight.run(request_key("long_summary", note.work_note, note.incident_id),
+                                                chunks.asummarize, note.work_note, 'long_summary', note.incident_id)
         return UnstructuredSummary(summary=long_summary)
     
     except CustomException as ce:
         logging.error(str(ce))
-        raise HTTPException(status_code=ce.error_code, detail=str(ce))
+        raise HTTPException(status_code=ce.error_code, detail=str(ce), headers=retry_after_headers(ce))
     except Exception as e:
         logging.error(ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
         raise HTTPException(
             status_code=500, detail=ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
 
-@log_entry_exit
+@app.post("/text-tools/long-summary/stream")
+@traced
+def post_long_summary_stream(note: Note, api_key: APIKey = Depends(auth.get_api_key)):
+    '''
+    API to stream a long summary as Server-Sent Events: progress and partial chunk summaries, then the result
+    '''
+    events = Chunk().summarize_events(note.work_note, summary_type='long_summary', stream=True,
+                                      incident_id=note.incident_id)
+    return StreamingResponse(sse_stream(events, "long_summary"), media_type="text/event-stream", headers=SSE_HEADERS)
+
 @app.post("/text-tools/structured-summary", response_model=StructuredSummary)
-def post_structured_summary(note: Note, api_key: APIKey = Depends(auth.get_api_key)):
+@traced
+async def post_structured_summary(note: Note, api_key: APIKey = Depends(auth.get_api_key)):
     '''
     API to generate a structured summary using Llama summarization
     '''
     try:
         chunks = Chunk()
-        structured_summary = chunks.summarize(note.work_note, summary_type='structured_summary')
+        structured_summary = await summary_flight.run(
+            request_key("structured_summary", note.work_note, note.incident_id),
+            chunks.asummarize, note.work_note, 'structured_summary', note.incident_id)
         return structured_summary
 
     except ValidationError as ve:
         raise HTTPException(status_code=400, detail = ExceptionMessageEnum.VALIDATION_ERROR.value.format(ve))
     except CustomException as ce:
         logging.error(str(ce))
-        raise HTTPException(status_code=ce.error_code, detail=str(ce))
+        raise HTTPException(status_code=ce.error_code, detail=str(ce), headers=retry_after_headers(ce))
     except Exception as e:
         logging.error(ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
         raise HTTPException(
             status_code=500, detail=ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
 
-@log_entry_exit   
 @app.post("/text-tools/build-summary/", response_model=BuildSummary)
-def post_build_summary(input: BuildLogs, api_key: APIKey = Depends(auth.get_api_key)):
+@traced
+async def post_build_summary(input: BuildLogs, api_key: APIKey = Depends(auth.get_api_key)):
     '''
     API to generate a Build Log Summarization, essentially for build failures
     '''
     try:
         chunks = Chunk()
-        build_summary = chunks.summarize(input.logs, summary_type='build_summary_structured')
+        build_summary = await summary_flight.run(request_key("build_summary_structured", input.logs),
+                                                 chunks.asummarize, input.logs, 'build_summary_structured')
         return build_summary
 
     except ValidationError as ve:
         raise HTTPException(status_code=400, detail = ExceptionMessageEnum.VALIDATION_ERROR.value.format(ve))
     except CustomException as ce:
         logging.error(str(ce))
-        raise HTTPException(status_code=ce.error_code, detail=str(ce))
+        raise HTTPException(status_code=ce.error_code, detail=str(ce), headers=retry_after_headers(ce))
+    except Exception as e:
+        logging.error(ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
+        raise HTTPException(
+            status_code=500, detail=ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
+
+@app.post("/text-tools/build-summary/stream")
+@traced
+def post_build_summary_stream(input: BuildLogs, api_key: APIKey = Depends(auth.get_api_key)):
+    '''
+    API to stream a Build Log Summarization as Server-Sent Events: progress and partial chunk summaries, then the result
+    '''
+    events = Chunk().summarize_events(input.logs, summary_type='build_summary_structured', stream=True)
+    return StreamingResponse(sse_stream(events, "build_summary"), media_type="text/event-stream", headers=SSE_HEADERS)
+
+def start_batch(summary_type: BatchSummaryTypeEnum, items: list, mode: BatchModeEnum):
+    check_batch_size(items)
+    if mode == BatchModeEnum.JOB:
+        job = submit_batch_job(job_store, summary_type.value, items)
+        return JSONResponse(status_code=HTTPStatus.ACCEPTED,
+                            content=BatchSummaryResponse(transaction_id=job.job_uuid.__str__(), status=job.status).dict())
+    results = BatchSummarizer(summary_type.value).iter_results(items)
+    return StreamingResponse((result.json() + "\n" for result in results), media_type="application/x-ndjson")
+
+@app.post("/text-tools/batch-summary")
+@traced
+def post_batch_summary(batch: BatchSummaryRequest, mode: BatchModeEnum = BatchModeEnum.STREAM,
+                       api_key: APIKey = Depends(auth.get_api_key)):
+    '''
+    API to summarize many notes or build logs in one request, streamed back as NDJSON or run as a job
+    '''
+    try:
+        return start_batch(batch.summary_type, batch.items, mode)
+    except CustomException as ce:
+        logging.error(str(ce))
+        raise HTTPException(status_code=ce.error_code, detail=str(ce), headers=retry_after_headers(ce))
+    except Exception as e:
+        logging.error(ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
+        raise HTTPException(
+            status_code=500, detail=ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
+
+@app.post("/text-tools/batch-summary/ndjson")
+@traced
+async def post_batch_summary_ndjson(request: Request,
+                                    summary_type: BatchSummaryTypeEnum = BatchSummaryTypeEnum.LONG_SUMMARY,
+                                    mode: BatchModeEnum = BatchModeEnum.STREAM,
+                                    api_key: APIKey = Depends(auth.get_api_key)):
+    '''
+    API to summarize an NDJSON upload with one {"id": ..., "text": ...} object per line
+    '''
+    try:
+        items = parse_ndjson(await request.body())
+        return start_batch(summary_type, items, mode)
+    except CustomException as ce:
+        logging.error(str(ce))
+        raise HTTPException(status_code=ce.error_code, detail=str(ce), headers=retry_after_headers(ce))
+    except Exception as e:
+        logging.error(ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
+        raise HTTPException(
+            status_code=500, detail=ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
+
+@app.get("/text-tools/batch-summary/{transaction_id}", response_model=BatchSummaryResponse)
+@traced
+def get_batch_summary(transaction_id: str, api_key: APIKey = Depends(auth.get_api_key)):
+    '''
+    API to retrieve the status of a batch job and, once finished, the per-item results
+    '''
+    try:
+        job = job_store.get(transaction_id)
+        if not job:
+            return BatchSummaryResponse(transaction_id=transaction_id, status=StatusEnum.NOT_FOUND)
+        if job.status != StatusEnum.SUCCESS:
+            return BatchSummaryResponse(transaction_id=transaction_id, status=job.status)
+        return BatchSummaryResponse(transaction_id=transaction_id, status=job.status,
+                                    items=parse_batch_result(job.result))
     except Exception as e:
         logging.error(ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
         raise HTTPException(
             status_code=500, detail=ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
 
-@log_entry_exit
 @app.post("/text-tools/major-incident-communication", response_model=MajorIncidentCommunication)
-def major_incident_communication(note: Note, api_key: APIKey = Depends(auth.get_api_key)):
+@traced
+async def major_incident_communication(note: Note, api_key: APIKey = Depends(auth.get_api_key)):
     '''
     API to generate a major incident communication
     '''
     try:
-        major_incident_communication = Summary.major_incident_communication(
-            note.work_note)
+        major_incident_communication = await summary_flight.run(
+            request_key("major_incident_communication", note.work_note),
+            Summary.amajor_incident_communication, note.work_note)
         return MajorIncidentCommunication(email_content=major_incident_communication)
 
     except ValidationError as ve:
         raise HTTPException(status_code=400, detail = ExceptionMessageEnum.VALIDATION_ERROR.value.format(ve))
+    except CustomException as ce:
+        logging.error(str(ce))
+        raise HTTPException(status_code=ce.error_code, detail=str(ce), headers=retry_after_headers(ce))
     except Exception as e:
         logging.error(ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
         raise HTTPException(
             status_code=500, detail=ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
 
-@log_entry_exit
 @app.post("/text-tools/telemetry-summary", response_model=UnstructuredSummary)
-def telemetry_summary(telemetry: Telemetry, api_key: APIKey = Depends(auth.get_api_key)):
+@traced
+async def telemetry_summary(telemetry: Telemetry, api_key: APIKey = Depends(auth.get_api_key)):
     '''
     API to generate Telemetry text based rootcause summarization
     '''
     try:
-        telemetry_summary = Summary.summarize_rootcause_from_telemetry(
-            telemetry.anomaly,telemetry.metric,telemetry.error, summary_type='llama_telemetry_summary')
+        telemetry_summary = await summary_flight.run(
+            request_key("llama_telemetry_summary", telemetry.anomaly, telemetry.metric, telemetry.error),
+            Summary.asummarize_rootcause_from_telemetry,
+            telemetry.anomaly, telemetry.metric, telemetry.error, 'llama_telemetry_summary')
         
         return UnstructuredSummary(summary=telemetry_summary)
 
+    except CustomException as ce:
+        logging.error(str(ce))
+        raise HTTPException(status_code=ce.error_code, detail=str(ce), headers=retry_after_headers(ce))
     except Exception as e:
         logging.error(ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
         raise HTTPException(
             status_code=500, detail=ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
 
+@app.post("/text-tools/telemetry-events", response_model=TelemetryIngestResponse)
+@traced
+async def post_telemetry_events(request: Request, flush: bool = False, api_key: APIKey = Depends(auth.get_api_key)):
+    '''
+    API to stream anomaly events as NDJSON, one TelemetryEvent per line. Events are grouped by service, time window
+    and metric as they arrive, and each group is summarized once after its window; flush summarizes the groups of
+    this upload before responding
+    '''
+    try:
+        group_ids = {}
+        accepted = 0
+        async for event in parse_event_stream(request.stream()):
+            group_ids.setdefault(telemetry_grouper.add(event))
+            accepted += 1
+        groups = await run_in_threadpool(telemetry_grouper.flush, list(group_ids)) if flush else []
+        return TelemetryIngestResponse(accepted=accepted, group_ids=list(group_ids), groups=groups)
+    except CustomException as ce:
+        logging.error(str(ce))
+        raise HTTPException(status_code=ce.error_code, detail=str(ce), headers=retry_after_headers(ce))
+    except Exception as e:
+        logging.error(ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
+        raise HTTPException(
+            status_code=500, detail=ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
+
+@app.get("/text-tools/telemetry-groups", response_model=List[TelemetryGroupSummary])
+@traced
+def get_telemetry_groups(status: Optional[StatusEnum] = None, api_key: APIKey = Depends(auth.get_api_key)):
+    '''
+    API to list the telemetry groups of this worker, newest window first, with their summaries once ready
+    '''
+    return telemetry_grouper.groups(status)
+
+@app.get("/text-tools/telemetry-groups/{group_id}", response_model=TelemetryGroupSummary)
+@traced
+def get_telemetry_group(group_id: str, api_key: APIKey = Depends(auth.get_api_key)):
+    '''
+    API to retrieve one telemetry group and its summary
+    '''
+    group = telemetry_grouper.get(group_id)
+    if group is None:
+        raise HTTPException(status_code=404, detail=ExceptionMessageEnum.TELEMETRY_GROUP_NOT_FOUND.value.format(group_id=group_id))
+    return group
+
+@app.get("/text-tools/stats")
+@traced
+def get_stats(api_key: APIKey = Depends(auth.get_api_key)):
+    '''
+    API to retrieve runtime statistics such as LLM response cache hit rates, BART batch sizes and LLM client counters
+    '''
+    return {
+        "response_cache": response_cache.stats() if response_cache is not None else None,
+        "bart_batcher": bart_batcher.metrics.snapshot(),
+        "llm_client": llm_client.stats(),
+        "single_flight": summary_flight.stats(),
+        "cleanse_jobs": job_scheduler.stats(),
+        "cpu_pool": cpu_pool.stats(),
+        "telemetry_groups": telemetry_grouper.stats(),
+        "incremental": incremental_store.stats() if incremental_store is not None else None,
+        "semantic_cache": semantic_cache.stats() if semantic_cache is not None else None,
+        "structured_output": structured_output_metrics.snapshot(),
+    }
+
+@app.get("/metrics")
+def get_metrics():
+    '''
+    Prometheus metrics: request counts and latencies per route, pipeline stage latencies, input sizes,
+    the cleanse-note queue depth and model load times
+    '''
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/ready")
+def get_readiness():
+    '''
+    Readiness probe: 200 once every preloaded model is warm, 503 before that. Reports the state of all models
+    '''
+    models = model_registry.status()
+    ready = all(models.get(name, {}).get("warm") for name in PRELOAD_MODELS if name != "chitchat_classifier")
+    return JSONResponse(status_code=200 if ready else 503, content={"ready": ready, "models": models})
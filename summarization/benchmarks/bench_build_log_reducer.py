@@ -0,0 +1,97 @@
+'''
+Benchmark for the build-log pre-reduction in dataprocessing/build_log_reducer.py.
+
+Reports the token compression ratio, the reduction time and the end-to-end latency of
+Chunk.summarize with and without pre-reduction (offline stub integration) on synthetic
+CI logs, or on real logs passed with --log. Run from the summarization directory:
+
+    python -m benchmarks.bench_build_log_reducer --sizes 20000 100000 --latency 0.2
+    python -m benchmarks.bench_build_log_reducer --log console.txt
+'''
+import argparse
+import random
+import time
+from benchmarks import stub_integration
+from dataprocessing import chunking
+from dataprocessing.chunking import Chunk
+from dataprocessing.build_log_reducer import build_log_reducer
+from dataprocessing.tokenization import get_token_engine
+
+PROGRESS_LINES = [
+    "\x1b[1mINFO\x1b[0m Downloading https://repo.example.com/maven2/com/example/lib-{n}/{n}.0/lib-{n}.jar",
+    "Progress ({n}): {n}/{n} kB\r\x1b[1mProgress ({n}): {n}/{n} kB",
+    "[INFO] Compiling {n} source files to /workspace/target/classes",
+    "#{n} [stage-{n} 3/9] RUN npm ci --prefer-offline  {n}.{n}s",
+    "[INFO] Tests run: {n}, Failures: 0, Errors: 0, Skipped: 0, Time elapsed: {n}.{n} s",
+    "[WARNING] Deprecated API used in module payments-{n}",
+]
+FAILURE_LINES = [
+    "[ERROR] Tests run: 12, Failures: 1, Errors: 0, Skipped: 0 <<< FAILURE! - in com.example.OrderServiceTest",
+    "[ERROR] testCheckout(com.example.OrderServiceTest)  Time elapsed: 0.42 s  <<< FAILURE!",
+    "java.lang.AssertionError: expected:<200> but was:<500>",
+    "\tat com.example.OrderServiceTest.testCheckout(OrderServiceTest.java:87)",
+    "[ERROR] Failed to execute goal org.apache.maven.plugins:maven-surefire-plugin:3.0.0:test",
+    "Build step 'Invoke top-level Maven targets' marked build as failure",
+    "Finished: FAILURE (exit code 1)",
+]
+
+
+def build_log(approx_tokens, seed=7):
+    rng = random.Random(seed)
+    lines = []
+    tokens = 0
+    second = 0
+    while tokens < approx_tokens:
+        second += 1
+        line = rng.choice(PROGRESS_LINES).format(n=rng.randint(1, 9999))
+        lines.append(f"2024-05-01T10:{second // 60 % 60:02d}:{second % 60:02d}.{rng.randint(0, 999):03d}Z {line}")
+        # Rough BERT token estimate, good enough to size the corpus
+        tokens += len(line) // 4
+    lines.extend(f"2024-05-01T11:00:00.000Z {line}" for line in FAILURE_LINES)
+    return "\n".join(lines)
+
+
+def summarize_seconds(log, reduce):
+    chunking.BUILD_LOG_REDUCER_ENABLED = reduce
+    start = time.perf_counter()
+    Chunk().summarize(log, summary_type='build_summary_structured')
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20000, 100000],
+                        help="approximate sizes in tokens of the synthetic logs")
+    parser.add_argument("--log", nargs="*", default=[], help="real build logs to use instead")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub LLM latency per call in seconds")
+    args = parser.parse_args()
+
+    if args.log:
+        logs = []
+        for path in args.log:
+            with open(path, errors="replace") as log_file:
+                logs.append((path, log_file.read()))
+    else:
+        logs = [(f"synthetic-{size}", build_log(size)) for size in args.sizes]
+
+    token_engine = get_token_engine()
+    print(f"{'log':>20} {'tokens in':>10} {'tokens out':>10} {'ratio':>7} {'reduce s':>9} "
+          f"{'raw s':>7} {'reduced s':>9} {'saved s':>8}")
+    for name, log in logs:
+        start = time.perf_counter()
+        reduced, _ = build_log_reducer.reduce_with_stats(log)
+        reduce_seconds = time.perf_counter() - start
+        tokens_in = token_engine.count(log)
+        tokens_out = token_engine.count(reduced)
+
+        stub_integration.install(latency=args.latency)
+        raw_seconds = summarize_seconds(log, reduce=False)
+        stub_integration.install(latency=args.latency)
+        reduced_seconds = summarize_seconds(log, reduce=True)
+
+        print(f"{name[-20:]:>20} {tokens_in:>10} {tokens_out:>10} {tokens_in / max(tokens_out, 1):>6.1f}x "
+              f"{reduce_seconds:>9.3f} {raw_seconds:>7.2f} {reduced_seconds:>9.2f} {raw_seconds - reduced_seconds:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+'''
+Benchmark for chitchat removal in process_conversation_notes.
+
+Compares the previous behaviour (BERT reloaded for every line) against the resident,
+batched ChitchatClassifier. Run from the summarization directory:
+
+    python -m benchmarks.bench_chitchat --lines 500 --legacy-lines 20
+'''
+import argparse
+import random
+import time
+from transformers import BertTokenizer, BertForSequenceClassification
+from torch.nn.functional import softmax
+from dataprocessing.data_cleansing import (
+    CHITCHAT_MODEL_NAME, get_chitchat_classifier, process_conversation_notes)
+
+SAMPLE_LINES = [
+    "2024-01-12 10:32:11 Restarted the payment gateway pods in the east cluster",
+    "Thanks team, appreciate the quick turnaround!",
+    "[Work notes] Root cause identified as expired TLS certificate on the load balancer",
+    "Hi all, joining the bridge now",
+    "Rolled back deployment 4512 of the order service to the previous release",
+    "Good morning everyone",
+    "Database failover completed, replication lag back under 2 seconds",
+    "Ok, sounds good",
+]
+
+
+def build_note(line_count, seed=7):
+    rng = random.Random(seed)
+    return "\n".join(rng.choice(SAMPLE_LINES) for _ in range(line_count))
+
+
+def legacy_remove_chitchat(text):
+    # Previous implementation: model and tokenizer loaded for every line
+    tokenizer = BertTokenizer.from_pretrained(CHITCHAT_MODEL_NAME)
+    model = BertForSequenceClassification.from_pretrained(CHITCHAT_MODEL_NAME, num_labels=2)
+    inputs = tokenizer(text, return_tensors="pt", padding=True, truncation=True)
+    logits = model(**inputs).logits
+    probabilities = softmax(logits, dim=1).detach().cpu().numpy()[0]
+    return text if int(probabilities.argmax()) == 0 else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=500, help="lines per work note")
+    parser.add_argument("--legacy-lines", type=int, default=20,
+                        help="lines timed with the legacy per-line loader (it is slow)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    note = build_note(args.lines)
+    legacy_lines = note.split("\n")[:args.legacy_lines]
+
+    start = time.perf_counter()
+    for line in legacy_lines:
+        legacy_remove_chitchat(line)
+    legacy_per_line = (time.perf_counter() - start) / len(legacy_lines)
+
+    # Load the resident classifier before timing, as the API process does on first use
+    load_start = time.perf_counter()
+    get_chitchat_classifier()
+    load_time = time.perf_counter() - load_start
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        process_conversation_notes(note)
+        timings.append(time.perf_counter() - start)
+    batched_per_note = min(timings)
+
+    print(f"lines per note:            {args.lines}")
+    print(f"one-time model load:       {load_time:.3f} s")
+    print(f"legacy per line:           {legacy_per_line * 1000:.1f} ms")
+    print(f"legacy per note (est.):    {legacy_per_line * args.lines:.2f} s")
+    print(f"batched per line:          {batched_per_note / args.lines * 1000:.2f} ms")
+    print(f"batched per note:          {batched_per_note:.2f} s")
+    print(f"speed-up per note:         {legacy_per_line * args.lines / batched_per_note:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+'''
+Offline end-to-end benchmark of the summarization pipelines with the stub LLM integration.
+
+Runs every scenario on synthetic corpora (benchmarks/corpora.py) of several sizes and reports
+wall time and per-stage time (cleaning, tokenizing, chunking, preprocessing, llm, parsing) as
+p50/p95/p99, LLM calls per run and process RSS. The streamed scenarios also report the time to
+the first Server-Sent Event after "started" (first_byte_seconds), as the stream's done event
+gives it. Stage times come from the tracing spans; the
+chunker is lazy, so chunking is timed in a separate pass over the same input. Stages that run
+concurrently (map calls on several threads) are summed, so they can add up to more than the wall
+time. Run from the summarization directory:
+
+    python -m benchmarks.bench_e2e --sizes 2000 10000 50000 --iterations 5 --output results.json
+    python -m benchmarks.bench_e2e --scenarios long_summary build_summary --baseline results.json
+
+With --baseline, runs whose p50 or p95 wall time grew by more than --threshold against the same
+scenario and size in the baseline file are reported and the exit status is 1.
+'''
+import os
+
+# Stage timings are read from tracing spans, and tracing is configured when it is first imported
+os.environ.setdefault("TRACING_ENABLED", "true")
+
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import resource
+import tracing
+import response_cache
+import llm_client as llm_client_module
+import dataprocessing.chunking as chunking_module
+from llm_client import TokenBucket
+from benchmarks import corpora, stub_integration
+from dataprocessing.chunking import Chunk
+from streaming import sse_stream
+
+STAGES = {
+    "Utils.clean_text": "cleaning",
+    "process_conversation_notes": "cleaning",
+    "clean_text_with_ner": "cleaning",
+    "Chunk.token_count": "tokenizing",
+    "Chunk.exceeds_tokens": "tokenizing",
+    "Chunk.preprocess": "preprocessing",
+    "Summary.generate_text": "llm",
+    "Utils.process_response": "parsing",
+    "Summary.structured_summary_steps": "parsing",
+    "parse_summary_model": "parsing",
+}
+# Spans of step generators (dataprocessing.pipeline), which do not parent the spans of their steps
+STEP_PIPELINES = {"Summary.structured_summary_steps"}
+
+
+def run_long_summary(text):
+    return Chunk().summarize(text, 'long_summary')
+
+
+def run_structured_summary(text):
+    return Chunk().summarize(text, 'structured_summary')
+
+
+def run_build_summary(text):
+    return Chunk().summarize(text, 'build_summary_structured')
+
+
+def run_stream(text, summary_type):
+    # Returns the timings of the final "done" event
+    for message in sse_stream(Chunk().summarize_events(text, summary_type, stream=True), summary_type):
+        event, data = message.split("\n")[:2]
+    assert event == "event: done", event
+    return json.loads(data[len("data: "):])
+
+
+def run_long_summary_stream(text):
+    return run_stream(text, 'long_summary')
+
+
+def run_build_summary_stream(text):
+    return run_stream(text, 'build_summary_structured')
+
+
+def run_clean_text(text):
+    from utils import Utils
+    return Utils.clean_text([text])
+
+
+def run_cleanse_note(text):
+    from dataprocessing.data_cleansing import process_conversation_notes
+    return process_conversation_notes(text)
+
+
+def run_short_summary(text):
+    from dataprocessing.bart_summary import bart_summarization
+    return bart_summarization(text)
+
+
+def run_telemetry(fields):
+    from dataprocessing.summary import Summary
+    return Summary.summarize_rootcause_from_telemetry(
+        fields["anomaly"], fields["metric"], fields["error"], 'llama_telemetry_summary')
+
+
+# name -> (function, corpus, summary type whose chunking is timed or None)
+SCENARIOS = {
+    "long_summary": (run_long_summary, corpora.work_note, "long_summary"),
+    "structured_summary": (run_structured_summary, corpora.work_note, "structured_summary"),
+    "build_summary": (run_build_summary, corpora.build_log, "build_summary_structured"),
+    "long_summary_stream": (run_long_summary_stream, corpora.work_note, None),
+    "build_summary_stream": (run_build_summary_stream, corpora.build_log, None),
+    "clean_text": (run_clean_text, corpora.work_note, None),
+    "cleanse_note": (run_cleanse_note, corpora.work_note, None),
+    "short_summary": (run_short_summary, corpora.work_note, None),
+    "telemetry": (run_telemetry, corpora.telemetry, None),
+}
+STREAMED_SCENARIOS = {"long_summary_stream", "build_summary_stream"}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+def distribution(values) -> dict:
+    return {
+        "p50": round(percentile(values, 0.50), 6),
+        "p95": round(percentile(values, 0.95), 6),
+        "p99": round(percentile(values, 0.99), 6),
+        "mean": round(sum(values) / len(values), 6) if values else 0.0,
+    }
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+class SpanCollector:
+    '''
+    Collects the spans of one run and adds up their durations per stage. A span nested in a span
+    of the same stage is not counted twice. The span of a step pipeline (STEP_PIPELINES) is not
+    the parent of the spans of its steps, so there nested means within its start and end in the
+    same trace: parse_summary_model during structured_summary_steps. A "fix JSON" call made by
+    structured_summary_steps counts as parsing as well as llm.
+    '''
+
+    def __init__(self):
+        self.spans = []
+        tracing.exporter.add_listener(self.spans.append)
+
+    def stage_seconds(self) -> dict:
+        stage_of = {span["spanId"]: STAGES.get(span["name"]) for span in self.spans}
+        pipelines = [span for span in self.spans if span["name"] in STEP_PIPELINES]
+        totals = {}
+        for span in self.spans:
+            stage = stage_of[span["spanId"]]
+            if stage is None or stage_of.get(span["parentSpanId"]) == stage:
+                continue
+            if any(pipeline is not span and stage_of[pipeline["spanId"]] == stage
+                   and pipeline["traceId"] == span["traceId"]
+                   and pipeline["startTimeUnixNano"] <= span["startTimeUnixNano"]
+                   and span["endTimeUnixNano"] <= pipeline["endTimeUnixNano"] for pipeline in pipelines):
+                continue
+            totals[stage] = totals.get(stage, 0.0) + span["durationMs"] / 1000
+        return totals
+
+
+def time_chunking(text, summary_type) -> float:
+    chunk = Chunk()
+    text = chunk.preprocess(text, summary_type)
+    start = time.perf_counter()
+    for _ in chunk.create_chunks(text):
+        pass
+    return time.perf_counter() - start
+
+
+def run(name, size, iterations, warmup, integration, collector) -> dict:
+    function, corpus, chunked_type = SCENARIOS[name]
+    payload = corpus(size)
+    for _ in range(warmup):
+        function(payload)
+
+    walls, calls, stages, first_bytes = [], [], {}, []
+    rss_before = rss_mb()
+    for _ in range(iterations):
+        collector.spans.clear()
+        calls_before = integration.calls
+        start = time.perf_counter()
+        output = function(payload)
+        walls.append(time.perf_counter() - start)
+        calls.append(integration.calls - calls_before)
+        if name in STREAMED_SCENARIOS:
+            first_bytes.append(output["first_byte_ms"] / 1000)
+
+        run_stages = collector.stage_seconds()
+        if chunked_type is not None:
+            run_stages["chunking"] = time_chunking(payload, chunked_type)
+        for stage, seconds in run_stages.items():
+            stages.setdefault(stage, []).append(seconds)
+
+    result = {
+        "scenario": name,
+        "size_tokens": size,
+        "iterations": iterations,
+        "wall_seconds": distribution(walls),
+        "stage_seconds": {stage: distribution(values) for stage, values in sorted(stages.items())},
+        "llm_calls": max(calls),
+        "rss_mb": round(rss_mb(), 1),
+        "rss_growth_mb": round(rss_mb() - rss_before, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    if first_bytes:
+        result["first_byte_seconds"] = distribution(first_bytes)
+    return result
+
+
+def compare(results, baseline, threshold) -> list:
+    '''
+    Prints the change of p50/p95 wall time against the baseline; returns the regressed runs
+    '''
+    previous = {(result["scenario"], result["size_tokens"]): result for result in baseline["results"]}
+    regressions = []
+    print(f"\n{'scenario':<20} {'tokens':>8} {'p50 base':>9} {'p50 now':>9} {'change':>8} "
+          f"{'p95 base':>9} {'p95 now':>9} {'change':>8}")
+    for result in results:
+        before = previous.get((result["scenario"], result["size_tokens"]))
+        if before is None:
+            continue
+        row = []
+        regressed = False
+        for key in ("p50", "p95"):
+            old, new = before["wall_seconds"][key], result["wall_seconds"][key]
+            change = (new - old) / old if old else 0.0
+            regressed = regressed or change > threshold
+            row.append(f"{old:>9.3f} {new:>9.3f} {change:>+8.1%}")
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{result['scenario']:<20} {result['size_tokens']:>8} {' '.join(row)}{flag}")
+        if regressed:
+            regressions.append(result)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2000, 10000, 50000],
+                        help="approximate input sizes in tokens")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs per scenario and size (model loading)")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub LLM latency per call in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="stub LLM latency jitter in seconds")
+    parser.add_argument("--summary-words", type=int, default=120)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    # Spans are collected by the listener, not logged
+    tracing.logger.propagate = False
+    tracing.logger.addHandler(logging.NullHandler())
+    collector = SpanCollector()
+
+    integration = stub_integration.install(latency=args.latency, summary_words=args.summary_words,
+                                           jitter=args.jitter)
+    # Every iteration has to reach the (stub) LLM, so the response and semantic caches and the rate limit are off
+    response_cache.response_cache = None
+    llm_client_module.response_cache = None
+    chunking_module.semantic_cache = None
+    llm_client_module.llm_client.bucket = TokenBucket(rate=0)
+
+    results = []
+    print(f"{'scenario':<20} {'tokens':>8} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'llm':>5} {'rss MB':>8}  stages p50 s")
+    for name in args.scenarios:
+        for size in args.sizes:
+            result = run(name, size, args.iterations, args.warmup, integration, collector)
+            results.append(result)
+            wall = result["wall_seconds"]
+            stages = " ".join(f"{stage}={values['p50']:.3f}" for stage, values in result["stage_seconds"].items())
+            if "first_byte_seconds" in result:
+                stages += f" first_byte={result['first_byte_seconds']['p50']:.3f}"
+            print(f"{name:<20} {size:>8} {wall['p50']:>8.3f} {wall['p95']:>8.3f} {wall['p99']:>8.3f} "
+                  f"{result['llm_calls']:>5} {result['rss_mb']:>8.1f}  {stages}")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "arguments": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+'''
+Benchmark of the CPU inference backends (pytorch, quantized, onnx) for the BART
+summarizer and the BERT chitchat classifier.
+
+Every backend runs in its own subprocess on a fixed corpus of work notes. The benchmark
+reports load time, latency, throughput and resident memory. It also compares the output
+with the fp32 pytorch baseline: ROUGE-1/ROUGE-L F1 for BART summaries, and label
+agreement for the classifier. Run from the summarization directory:
+
+    python -m benchmarks.bench_inference_backends --backends pytorch quantized onnx
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CORPUS = [
+    "User reported that the payroll portal returned HTTP 500 since 9am. Logs show the connection pool to the HR "
+    "database was exhausted after the overnight batch job leaked connections. The batch job was stopped, the pool "
+    "was recycled and the portal recovered. A fix to close connections in the batch job is scheduled.",
+    "Build 4512 of the order service failed in the integration test stage. The checkout test expected status 200 "
+    "but received 500 because the payment sandbox credentials had expired. Credentials were rotated in the vault "
+    "and the pipeline was re-run successfully.",
+    "Customers in the EU region could not log in to the mobile app. The identity provider certificate expired at "
+    "midnight UTC. The certificate was renewed and pushed to all edge nodes, after which logins succeeded again.",
+    "Disk usage on the primary Kafka broker reached 95 percent because retention for the audit topic was set to "
+    "unlimited. Retention was reduced to seven days, old segments were deleted and consumer lag returned to normal.",
+    "The nightly ETL job into the data warehouse ran four hours late after an upstream schema change added a new "
+    "nullable column. The mapping was updated, the job re-run and downstream dashboards refreshed by 10am.",
+    "Thanks everyone for joining the bridge. Ok, sounds good. I will restart the gateway pods in the east cluster "
+    "now. Latency is back to normal, we will keep monitoring for the next hour before closing the incident.",
+]
+
+
+def rss_mb():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def tokens(text):
+    return text.lower().split()
+
+
+def rouge_1(reference, candidate):
+    reference_tokens, candidate_tokens = tokens(reference), tokens(candidate)
+    if not reference_tokens or not candidate_tokens:
+        return 0.0
+    counts = {}
+    for token in reference_tokens:
+        counts[token] = counts.get(token, 0) + 1
+    overlap = 0
+    for token in candidate_tokens:
+        if counts.get(token, 0) > 0:
+            counts[token] -= 1
+            overlap += 1
+    return f1(overlap, len(reference_tokens), len(candidate_tokens))
+
+
+def rouge_l(reference, candidate):
+    reference_tokens, candidate_tokens = tokens(reference), tokens(candidate)
+    if not reference_tokens or not candidate_tokens:
+        return 0.0
+    previous = [0] * (len(candidate_tokens) + 1)
+    for reference_token in reference_tokens:
+        current = [0]
+        for index, candidate_token in enumerate(candidate_tokens):
+            if reference_token == candidate_token:
+                current.append(previous[index] + 1)
+            else:
+                current.append(max(previous[index + 1], current[index]))
+        previous = current
+    return f1(previous[-1], len(reference_tokens), len(candidate_tokens))
+
+
+def f1(overlap, reference_length, candidate_length):
+    if overlap == 0:
+        return 0.0
+    precision, recall = overlap / candidate_length, overlap / reference_length
+    return 2 * precision * recall / (precision + recall)
+
+
+def run_worker(backend, repeat):
+    # Selected before the model modules are imported, which read it at import time
+    os.environ["INFERENCE_BACKEND"] = backend
+    import torch
+    torch.manual_seed(0)  # identical random classification head for every backend
+
+    start = time.perf_counter()
+    from dataprocessing import bart_summary
+    from dataprocessing.data_cleansing import get_chitchat_classifier
+    from model_registry import model_registry
+    model_registry.get("bart")
+    classifier = get_chitchat_classifier()
+    load_seconds = time.perf_counter() - start
+
+    model_registry.warm_up("bart")
+    latencies = []
+    for _ in range(repeat):
+        for note in CORPUS:
+            note_start = time.perf_counter()
+            bart_summary.generate_summary_batch([note])
+            latencies.append(time.perf_counter() - note_start)
+
+    batch_start = time.perf_counter()
+    summaries = bart_summary.generate_summary_batch(CORPUS)
+    batch_seconds = time.perf_counter() - batch_start
+
+    lines = [sentence for note in CORPUS for sentence in note.split(". ")]
+    classify_start = time.perf_counter()
+    labels = classifier.is_chitchat(lines)
+    classify_seconds = time.perf_counter() - classify_start
+
+    return {
+        "backend": backend,
+        "load_seconds": round(load_seconds, 2),
+        "bart_p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "bart_batch_notes_per_second": round(len(CORPUS) / batch_seconds, 2),
+        "bert_lines_per_second": round(len(lines) / classify_seconds, 1),
+        "rss_mb": round(rss_mb(), 1),
+        "summaries": summaries,
+        "labels": labels,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["pytorch", "quantized", "onnx"])
+    parser.add_argument("--repeat", type=int, default=2)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.repeat)))
+        return
+
+    results = []
+    for backend in ["pytorch"] + [backend for backend in args.backends if backend != "pytorch"]:
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_inference_backends", "--worker", backend,
+             "--repeat", str(args.repeat)],
+            capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"{backend}: failed\n{completed.stderr[-2000:]}")
+            continue
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    baseline = results[0]
+    print(f"{'backend':<10} {'load s':>7} {'p50 ms':>8} {'notes/s':>8} {'lines/s':>8} {'RSS MB':>8} "
+          f"{'ROUGE-1':>8} {'ROUGE-L':>8} {'labels':>7}")
+    for result in results:
+        rouge_1_scores = [rouge_1(reference, candidate)
+                          for reference, candidate in zip(baseline["summaries"], result["summaries"])]
+        rouge_l_scores = [rouge_l(reference, candidate)
+                          for reference, candidate in zip(baseline["summaries"], result["summaries"])]
+        agreement = sum(a == b for a, b in zip(baseline["labels"], result["labels"])) / len(baseline["labels"])
+        print(f"{result['backend']:<10} {result['load_seconds']:>7} {result['bart_p50_ms']:>8} "
+              f"{result['bart_batch_notes_per_second']:>8} {result['bert_lines_per_second']:>8} "
+              f"{result['rss_mb']:>8} {statistics.mean(rouge_1_scores):>8.3f} "
+              f"{statistics.mean(rouge_l_scores):>8.3f} {agreement:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
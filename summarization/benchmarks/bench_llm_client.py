@@ -0,0 +1,123 @@
+'''
+Throughput benchmark for the async LLM client against the local stub LLM server.
+
+Starts benchmarks.stub_llm_server in a subprocess and sends the same concurrent load twice:
+once the previous way (one blocking call per request from a 40-thread pool, a new connection
+per call) and once through AsyncLLMClient with the pooled HTTPIntegration, token bucket and
+coalescing. Run from the summarization directory:
+
+    python -m benchmarks.bench_llm_client --requests 400 --concurrency 200 --duplicates 0.2
+'''
+import sys
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import platform_config
+import response_cache
+import llm_client as llm_client_module
+from http_integration import HTTPIntegration
+from llm_client import AsyncLLMClient, TokenBucket
+from benchmarks.stub_integration import StubPromptBuilders
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+def make_prompts(count, duplicates, seed=5):
+    rng = random.Random(seed)
+    prompts = []
+    for index in range(count):
+        if prompts and rng.random() < duplicates:
+            prompts.append(rng.choice(prompts))
+        else:
+            prompts.append(f"[long_summary]\nincident {index}")
+    return prompts
+
+
+def run_legacy(base_url, prompts, params):
+    latencies = []
+
+    def call(prompt):
+        start = time.perf_counter()
+        with httpx.Client(base_url=base_url, timeout=120) as client:
+            response = client.post("/v1/generate", json={"inputs": [prompt], "parameters": params})
+        latencies.append(time.perf_counter() - start)
+        return response.status_code
+
+    # FastAPI's default threadpool has 40 workers
+    with ThreadPoolExecutor(max_workers=40) as executor:
+        rejected = sum(1 for status in executor.map(call, prompts) if status == 429)
+    return latencies, rejected
+
+
+async def run_client(client, prompts, params, concurrency):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(prompt):
+        async with semaphore:
+            start = time.perf_counter()
+            await client.agenerate("long_summary", [prompt], params)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(call(prompt) for prompt in prompts))
+    return latencies
+
+
+def report(name, latencies, elapsed, extra):
+    print(f"{name:>12} {len(latencies) / elapsed:>9.1f} {percentile(latencies, 0.5):>8.2f} "
+          f"{percentile(latencies, 0.95):>8.2f} {percentile(latencies, 0.99):>8.2f}  {extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=200, help="concurrent callers")
+    parser.add_argument("--duplicates", type=float, default=0.2, help="fraction of repeated prompts")
+    parser.add_argument("--latency", type=float, default=0.5, help="stub server latency in seconds")
+    parser.add_argument("--rate", type=float, default=50.0, help="stub server rate limit per second")
+    parser.add_argument("--port", type=int, default=8085)
+    args = parser.parse_args()
+
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.stub_llm_server", "--port", str(args.port),
+                               "--latency", str(args.latency), "--rate", str(args.rate),
+                               "--burst", str(int(args.rate))])
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(f"{base_url}/stats")
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+
+        prompts = make_prompts(args.requests, args.duplicates)
+        params = {"decoding_method": "greedy", "max_new_tokens": 500}
+        print(f"{'client':>12} {'req/s':>9} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8}")
+
+        start = time.perf_counter()
+        latencies, rejected = run_legacy(base_url, prompts, params)
+        report("legacy", latencies, time.perf_counter() - start, f"429s={rejected}")
+
+        # The cache would hide the duplicates, so only in-flight coalescing is measured
+        response_cache.response_cache = None
+        llm_client_module.response_cache = None
+        platform_config.integration = HTTPIntegration(base_url=base_url)
+        platform_config.promptbuilders = StubPromptBuilders()
+        client = AsyncLLMClient(bucket=TokenBucket(rate=args.rate, burst=int(args.rate)))
+        start = time.perf_counter()
+        latencies = asyncio.run(run_client(client, prompts, params, args.concurrency))
+        report("async", latencies, time.perf_counter() - start, str(client.stats()))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
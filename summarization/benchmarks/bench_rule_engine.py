@@ -0,0 +1,101 @@
+'''
+Micro-benchmark for the precompiled cleansing rules in dataprocessing/rule_engine.py.
+
+Compares the previous implementations (patterns recompiled from strings and applied line by
+line, four split/join passes for email stripping) with the rule engine on typical and
+adversarial inputs, and checks that both produce identical output. Run from the summarization directory:
+
+    python -m benchmarks.bench_rule_engine --repeat 5
+'''
+import argparse
+import re
+import time
+from dataprocessing.rule_engine import generic_info_rules, email_line_filter
+
+LEGACY_PATTERNS = [
+    r"\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}",
+    r"\(\d+\)",
+    r"\[.*?\]",
+    r"[-*]+",
+    r"(\b[A-Z][a-z]*\b\s*)+\s*,",
+    r"(@|c|\+[\d-]+|\(at\))\s*:\s*[a-zA-Z0-9_.]+@[a-zA-Z0-9_.]+",
+]
+
+NOTE = (
+    "2024-03-01 10:15:22 John Smith, (1234) [Work notes] Restarted the payment gateway pods ---\n"
+    "Jane Doe, the TLS certificate on the internal load balancer expired *** @: jane.doe@example.com\n"
+    "Latency back to normal, monitoring for another hour [ticket INC0012345]\n"
+)
+
+EMAIL = (
+    "Subject: Major incident - payment outage\n"
+    "Dear all,\n"
+    "The payment gateway returned HTTP 502 for 12 minutes.\n"
+    "The root cause was an expired certificate.\n"
+    "Best regards,\n"
+    "Your Name\n"
+)
+
+
+def legacy_clean_note(text):
+    cleaned_lines = []
+    for line in text.strip().split("\n"):
+        if line.strip():
+            line = re.sub(r"\s+", " ", line.strip())
+            for pattern in LEGACY_PATTERNS:
+                line = re.sub(pattern, "", line)
+            line = line.strip()
+            if line:
+                cleaned_lines.append(line)
+    return cleaned_lines
+
+
+def engine_clean_note(text):
+    lines = [re.sub(r"\s+", " ", line.strip()) for line in text.strip().split("\n") if line.strip()]
+    cleaned_lines = [line.strip() for line in generic_info_rules.apply("\n".join(lines)).split("\n")]
+    return [line for line in cleaned_lines if line]
+
+
+def legacy_remove_email_parts(email_text):
+    for fragment in ["Subject:", "Dear", "Best regards", "Your Name"]:
+        pattern = rf".*{re.escape(fragment)}.*"
+        email_text = "\n".join(line for line in email_text.split("\n") if not re.search(pattern, line))
+    return email_text
+
+
+def best_of(fn, text, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--words", type=int, default=1000,
+                        help="length of the adversarial runs of capitalized words")
+    args = parser.parse_args()
+
+    cases = [
+        ("note", legacy_clean_note, engine_clean_note, NOTE * 200),
+        # Long runs of capitalized words without a comma make the old rule retry from every word
+        ("capitalized run", legacy_clean_note, engine_clean_note, "Foo " * args.words + "bar"),
+        ("spaced run", legacy_clean_note, engine_clean_note, ("A" + "\t" * 20) * args.words + "x"),
+        ("unclosed bracket", legacy_clean_note, engine_clean_note, "[" + "x " * args.words),
+        ("email", legacy_remove_email_parts, email_line_filter.apply, EMAIL * 200),
+    ]
+
+    print(f"{'case':>18} {'legacy ms':>10} {'engine ms':>10} {'speedup':>8} {'identical':>10}")
+    for name, legacy_fn, engine_fn, text in cases:
+        identical = legacy_fn(text) == engine_fn(text)
+        legacy_seconds = best_of(legacy_fn, text, args.repeat)
+        engine_seconds = best_of(engine_fn, text, args.repeat)
+        print(f"{name:>18} {legacy_seconds * 1000:>10.2f} {engine_seconds * 1000:>10.2f} "
+              f"{legacy_seconds / engine_seconds:>7.1f}x {str(identical):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+'''
+Load test of the multi-process serving mode: how request throughput scales with the number of workers.
+
+For each worker count, starts the service with gunicorn.conf.py (models preloaded before the fork,
+one CPU pool per worker, torch threads split over the CPUs), sends the same concurrent load of
+distinct work notes and reports requests per second, speed-up over one worker and latency
+percentiles. short-summary (spaCy and BART) is CPU-bound; long-summary cleans the notes with
+spaCy and calls benchmarks.stub_llm_server, started here, as the LLM. Run from the summarization
+directory:
+
+    python -m benchmarks.bench_serving --workers 1 2 4 8 --endpoint short-summary --requests 200
+    python -m benchmarks.bench_serving --endpoint long-summary --tokens 4000 --latency 0.2 --output serving.json
+'''
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+import httpx
+from benchmarks import corpora
+from serving import available_cpus
+
+API_KEY = "bench-serving"
+PRELOAD = {
+    "short-summary": "spacy,bart",
+    "long-summary": "spacy,token_engine,llm_platform",
+}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+def default_worker_counts() -> list:
+    cpus = available_cpus()
+    counts = [1]
+    while counts[-1] * 2 <= cpus:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cpus:
+        counts.append(cpus)
+    return counts
+
+
+def wait_until(url, timeout, process=None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            if httpx.get(url, timeout=5).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def start_server(workers, args, env):
+    env = dict(env, WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{args.port}", APP_API_KEY=API_KEY,
+               PRELOAD_MODELS=PRELOAD[args.endpoint])
+    if args.cpu_pool_workers is not None:
+        env["CPU_POOL_WORKERS"] = str(args.cpu_pool_workers)
+    process = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app",
+                                "--log-level", "warning"], env=env)
+    try:
+        # Readiness is answered by any one worker; the warm-up requests below reach the others
+        wait_until(f"http://127.0.0.1:{args.port}/health/ready", args.startup_timeout, process)
+    except Exception:
+        stop_server(process)
+        raise
+    return process
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def send_load(args, notes, concurrency) -> dict:
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", headers={"api-key": API_KEY},
+                                 timeout=args.request_timeout, limits=limits) as client:
+
+        async def call(note):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(f"/text-tools/{args.endpoint}", json={"work_note": note})
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(call(note) for note in notes))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "requests": len(notes),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(notes) / elapsed, 3),
+        "p50_seconds": round(percentile(latencies, 0.50), 4),
+        "p95_seconds": round(percentile(latencies, 0.95), 4),
+        "p99_seconds": round(percentile(latencies, 0.99), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=default_worker_counts(),
+                        help="worker counts to compare (default: powers of two up to the available CPUs)")
+    parser.add_argument("--endpoint", choices=list(PRELOAD), default="short-summary")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=0,
+                        help="concurrent clients, 0 for four per worker of the largest worker count")
+    parser.add_argument("--tokens", type=int, default=800, help="approximate size of each work note in tokens")
+    parser.add_argument("--cpu-pool-workers", type=int, help="CPU pool processes per worker (SERVING.CPU_POOL_WORKERS)")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub LLM latency per call in seconds")
+    parser.add_argument("--port", type=int, default=4100)
+    parser.add_argument("--llm-port", type=int, default=8086)
+    parser.add_argument("--startup-timeout", type=float, default=600)
+    parser.add_argument("--request-timeout", type=float, default=600)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    concurrency = args.concurrency or 4 * max(args.workers)
+    # Distinct notes, so neither the response cache nor request coalescing hides the work
+    notes = [corpora.work_note(args.tokens, seed=index) for index in range(args.requests)]
+    warm_up_notes = [corpora.work_note(args.tokens, seed=-1 - index) for index in range(2 * max(args.workers))]
+
+    env = dict(os.environ)
+    llm_server = None
+    if args.endpoint == "long-summary":
+        llm_server = subprocess.Popen([sys.executable, "-m", "benchmarks.stub_llm_server", "--port", str(args.llm_port),
+                                       "--latency", str(args.latency), "--rate", "0"])
+        env.update(PLATFORM="HTTP", LLM_HTTP_BASE_URL=f"http://127.0.0.1:{args.llm_port}")
+        wait_until(f"http://127.0.0.1:{args.llm_port}/stats", 60, llm_server)
+
+    results = []
+    print(f"{'workers':>8} {'req/s':>9} {'speed-up':>9} {'efficiency':>11} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'errors':>7}")
+    try:
+        for workers in args.workers:
+            server = start_server(workers, args, env)
+            try:
+                asyncio.run(send_load(args, warm_up_notes[:2 * workers], concurrency))
+                result = asyncio.run(send_load(args, notes, concurrency))
+            finally:
+                stop_server(server)
+
+            result["workers"] = workers
+            # Speed-up against the first (smallest) worker count, scaled to one worker
+            first = results[0] if results else result
+            per_worker = first["requests_per_second"] / first["workers"]
+            result["speed_up"] = round(result["requests_per_second"] / per_worker, 3) if per_worker else 0.0
+            result["efficiency"] = round(result["speed_up"] / workers, 3)
+            results.append(result)
+            print(f"{workers:>8} {result['requests_per_second']:>9.2f} {result['speed_up']:>9.2f} "
+                  f"{result['efficiency']:>11.1%} {result['p50_seconds']:>8.3f} {result['p95_seconds']:>8.3f} "
+                  f"{result['p99_seconds']:>8.3f} {result['errors']:>7}")
+    finally:
+        if llm_server is not None:
+            llm_server.terminate()
+            llm_server.wait()
+
+    if args.output:
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "available_cpus": available_cpus(),
+                "arguments": {key: value for key, value in vars(args).items() if key != "output"},
+                "concurrency": concurrency,
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
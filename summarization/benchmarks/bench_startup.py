@@ -0,0 +1,53 @@
+'''
+Startup-time benchmark for the FastAPI app.
+
+Measures, in a fresh interpreter per mode, how long `import app` takes and how long it
+takes until the listed models are loaded. Compares lazy loading against preloading
+every model up front. Run from the summarization directory:
+
+    python -m benchmarks.bench_startup --models spacy token_engine bart
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+MEASURE = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+from model_registry import model_registry
+model_registry.preload({models!r})
+loaded = time.perf_counter()
+print(json.dumps({{"import_seconds": imported - start, "ready_seconds": loaded - start,
+                  "models": model_registry.status()}}))
+"""
+
+
+def measure(models):
+    environment = dict(os.environ, PRELOAD_MODELS="")
+    completed = subprocess.run([sys.executable, "-c", MEASURE.format(models=models)],
+                               capture_output=True, text=True, env=environment)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr[-2000:])
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", nargs="+", default=["spacy", "token_engine", "bart"])
+    args = parser.parse_args()
+
+    lazy = measure([])
+    eager = measure(args.models)
+    print(f"import app (lazy):          {lazy['import_seconds']:.2f} s")
+    print(f"import app + preload:       {eager['ready_seconds']:.2f} s")
+    for name, status in eager["models"].items():
+        if status["load_seconds"] is not None:
+            print(f"  {name:<20} {status['load_seconds']:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
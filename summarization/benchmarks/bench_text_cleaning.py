@@ -0,0 +1,71 @@
+'''
+Throughput benchmark for Utils.clean_text in chunks per second.
+
+Compares the previous per-chunk call of the full en_core_web_sm pipeline against the
+batched TextCleaningService with the parser and with the rule-based sentencizer.
+Run from the summarization directory:
+
+    python -m benchmarks.bench_text_cleaning --chunks 64
+'''
+import argparse
+import re
+import time
+import spacy
+from utils import Utils
+from dataprocessing import text_cleaning
+
+CHUNK = (
+    "From: Jane Doe Sent: Monday To: Ops Subject: Payment outage\n"
+    "(Work notes (internal)) The payment gateway returned HTTP 502 for 12 minutes. "
+    "The on-call engineer restarted the gateway pods in the east cluster. "
+    "Ms-Team Chat-------------------------- Latency is back to normal, monitoring for an hour. "
+    "Root cause is an expired TLS certificate on the internal load balancer. "
+    "Sent from my iPhone\n"
+) * 20
+
+
+def legacy_clean_text(nlp, worknote_list):
+    # Previous implementation: full pipeline, one chunk at a time
+    cleaned_chunks = []
+    for worknote in worknote_list:
+        worknote = re.sub(r"(?i)From:.*?Subject:", "Subject:", worknote, flags=re.DOTALL)
+        sentences = []
+        for sent in nlp(worknote).sents:
+            sent = sent.text.replace('(Work notes (internal))', '')
+            sent = sent.replace('Ms-Team Chat--------------------------', '')
+            sent = sent.replace('Sent from my iPhone', '')
+            sentences.append(sent.strip())
+        cleaned_chunks.append("\n".join(sentences))
+    return cleaned_chunks
+
+
+def throughput(fn, chunks, repeat):
+    best = min(timed(fn, chunks) for _ in range(repeat))
+    return len(chunks) / best
+
+
+def timed(fn, chunks):
+    start = time.perf_counter()
+    fn(chunks)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    chunks = [CHUNK] * args.chunks
+
+    legacy_nlp = spacy.load(text_cleaning.SPACY_MODEL_NAME)
+    legacy = throughput(lambda texts: legacy_clean_text(legacy_nlp, texts), chunks, args.repeat)
+    print(f"legacy per-chunk pipeline:  {legacy:8.1f} chunks/s")
+
+    for segmenter in ("parser", "sentencizer"):
+        text_cleaning._text_cleaning_service = text_cleaning.TextCleaningService(sentence_segmenter=segmenter)
+        batched = throughput(Utils.clean_text, chunks, args.repeat)
+        print(f"batched ({segmenter:<11}):     {batched:8.1f} chunks/s ({batched / legacy:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
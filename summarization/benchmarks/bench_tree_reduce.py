@@ -0,0 +1,55 @@
+'''
+Benchmark for hierarchical map-reduce summarization in Chunk.summarize.
+
+Uses the offline stub integration and reports LLM calls and wall time
+for growing build logs. Run from the summarization directory:
+
+    python -m benchmarks.bench_tree_reduce --sizes 10000 50000 200000 --latency 0.2
+'''
+import argparse
+import random
+import time
+from benchmarks import stub_integration
+from dataprocessing.chunking import Chunk
+
+LOG_LINES = [
+    "[INFO] Downloading artifact com.example:service-core:{n}.jar",
+    "[INFO] Compiling {n} source files to /workspace/target/classes",
+    "[WARNING] Deprecated API used in module payments-{n}",
+    "[ERROR] Test OrderServiceTest.testCheckout{n} failed: expected 200 but was 500",
+    "Step {n}/42 : RUN npm ci --prefer-offline",
+]
+
+
+def build_log(approx_tokens, seed=11):
+    rng = random.Random(seed)
+    lines = []
+    tokens = 0
+    while tokens < approx_tokens:
+        line = rng.choice(LOG_LINES).format(n=rng.randint(1, 99999))
+        lines.append(line)
+        # Rough BERT token estimate, good enough to size the corpus
+        tokens += len(line) // 4
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 200000],
+                        help="approximate input sizes in tokens")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub LLM latency per call in seconds")
+    parser.add_argument("--summary-words", type=int, default=120)
+    args = parser.parse_args()
+
+    print(f"{'tokens':>10} {'llm calls':>10} {'wall s':>8}")
+    for size in args.sizes:
+        integration = stub_integration.install(latency=args.latency, summary_words=args.summary_words)
+        log = build_log(size)
+        start = time.perf_counter()
+        Chunk().summarize(log, summary_type='build_summary_structured')
+        elapsed = time.perf_counter() - start
+        print(f"{size:>10} {integration.calls:>10} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+'''
+Synthetic, reproducible inputs for the benchmarks: incident work notes, CI build logs and
+telemetry, each generated up to an approximate size in BERT tokens.
+'''
+import random
+
+NOTE_AUTHORS = ["Priya Sharma", "John Miller", "Chen Wei", "Maria Garcia", "Ahmed Khan"]
+NOTE_LINES = [
+    "Checked the {service} pods, {n} of them are in CrashLoopBackOff after the last deployment.",
+    "Restarted {service} on node worker-{n}, latency back to normal for now.",
+    "Customer reports checkout failing with HTTP 500 for the last {n} minutes.",
+    "DB connection pool exhausted on {service}, max connections {n} reached.",
+    "Rolled back {service} to release 2024.{n}, monitoring error rate.",
+    "Root cause appears to be an expired TLS certificate on the {service} ingress.",
+    "Engaged the network team, they see packet loss of {n}% on the core switch.",
+    "Raised change CHG00{n} to increase the heap size of {service}.",
+]
+CHITCHAT_LINES = [
+    "Hi team, joining the bridge now.",
+    "Thanks for the update!",
+    "Ok, will check and get back.",
+    "Good morning all.",
+    "Sure, thanks.",
+]
+SERVICES = ["payments-api", "order-service", "inventory-db", "auth-gateway", "search-indexer"]
+
+BUILD_LINES = [
+    "\x1b[1mINFO\x1b[0m Downloading https://repo.example.com/maven2/com/example/lib-{n}/{n}.0/lib-{n}.jar",
+    "[INFO] Compiling {n} source files to /workspace/target/classes",
+    "#{n} [stage-{n} 3/9] RUN npm ci --prefer-offline  {n}.{n}s",
+    "[INFO] Tests run: {n}, Failures: 0, Errors: 0, Skipped: 0, Time elapsed: {n}.{n} s",
+    "[WARNING] Deprecated API used in module payments-{n}",
+]
+BUILD_FAILURE_LINES = [
+    "[ERROR] Tests run: 12, Failures: 1, Errors: 0, Skipped: 0 <<< FAILURE! - in com.example.OrderServiceTest",
+    "java.lang.AssertionError: expected:<200> but was:<500>",
+    "\tat com.example.OrderServiceTest.testCheckout(OrderServiceTest.java:87)",
+    "[ERROR] Failed to execute goal org.apache.maven.plugins:maven-surefire-plugin:3.0.0:test",
+    "Finished: FAILURE (exit code 1)",
+]
+TELEMETRY_ERROR_LINES = [
+    "{service} ERROR java.net.SocketTimeoutException: Read timed out after {n} ms",
+    "{service} WARN GC pause of {n} ms exceeded threshold",
+    "{service} ERROR Connection refused: inventory-db:5432 (attempt {n})",
+]
+
+
+def _fill(rng, approx_tokens, make_line):
+    lines = []
+    tokens = 0
+    while tokens < approx_tokens:
+        line = make_line(rng, len(lines))
+        lines.append(line)
+        # Rough BERT token estimate, good enough to size the corpus
+        tokens += len(line) // 4
+    return lines
+
+
+def work_note(approx_tokens: int, seed: int = 3) -> str:
+    '''
+    Incident work notes: timestamped entries by several people, with chit-chat and email addresses
+    '''
+    def make_line(rng, index):
+        timestamp = f"2024-05-{1 + index // 500:02d} {index // 60 % 24:02d}:{index % 60:02d}:00"
+        if rng.random() < 0.2:
+            text = rng.choice(CHITCHAT_LINES)
+        else:
+            text = rng.choice(NOTE_LINES).format(service=rng.choice(SERVICES), n=rng.randint(1, 99))
+        author = rng.choice(NOTE_AUTHORS)
+        return f"{timestamp} - {author} (Work notes) [{author.split()[0].lower()}@example.com]\n{text}"
+
+    return "\n".join(_fill(random.Random(seed), approx_tokens, make_line))
+
+
+def build_log(approx_tokens: int, seed: int = 7) -> str:
+    '''
+    CI console output: timestamped progress noise followed by a failing test and the build result
+    '''
+    def make_line(rng, index):
+        line = rng.choice(BUILD_LINES).format(n=rng.randint(1, 9999))
+        return f"2024-05-01T10:{index // 60 % 60:02d}:{index % 60:02d}.{rng.randint(0, 999):03d}Z {line}"
+
+    lines = _fill(random.Random(seed), approx_tokens, make_line)
+    lines.extend(f"2024-05-01T11:00:00.000Z {line}" for line in BUILD_FAILURE_LINES)
+    return "\n".join(lines)
+
+
+def telemetry(approx_tokens: int, seed: int = 5) -> dict:
+    '''
+    Fields of a telemetry summary request; the error log makes up the requested size
+    '''
+    def make_line(rng, index):
+        return rng.choice(TELEMETRY_ERROR_LINES).format(service=rng.choice(SERVICES), n=rng.randint(1, 9999))
+
+    return {
+        "anomaly": "p99 latency of checkout increased from 300 ms to 4.2 s",
+        "metric": "http_server_request_duration_seconds{service=\"payments-api\",quantile=\"0.99\"} 4.2",
+        "error": "\n".join(_fill(random.Random(seed), approx_tokens, make_line)),
+    }
@@ -0,0 +1,69 @@
+'''
+Offline stand-in for the watsonx integration used by the benchmarks.
+
+install() replaces platform_config.integration and platform_config.promptbuilders
+with stubs that answer after a configurable latency and count every LLM call. The answer is
+a fixed text (output) or generated filler of summary_words words, JSON for structured types.
+'''
+import json
+import time
+import random
+import threading
+import platform_config
+
+STRUCTURED_SUMMARY_TYPES = ("structured_summary", "build_summary_structured")
+
+
+class StubPromptBuilders:
+
+    def generate_prompts(self, summary_type, texts):
+        return [f"[{summary_type}]\n{text}" for text in texts]
+
+    def generate_prompt(self, summary_type, text):
+        return [f"[{summary_type}]\n{text}"]
+
+    def generate_telemetry_prompt(self, summary_type, anomaly, metric, error):
+        return [f"[{summary_type}]\nanomaly: {anomaly}\nmetric: {metric}\nerror: {error}"]
+
+
+class StubIntegration:
+
+    def __init__(self, latency=0.2, summary_words=120, output=None, jitter=0.0):
+        self.latency = latency
+        self.summary_words = summary_words
+        self.output = output
+        # Each call sleeps latency +- jitter seconds
+        self.jitter = jitter
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def fetch_default_params(self):
+        return {"decoding_method": "greedy", "max_new_tokens": 500}
+
+    def fetch_params_telemetry_summary(self):
+        return {"decoding_method": "greedy", "max_new_tokens": 300}
+
+    def fetch_params_major_incident_communication(self):
+        return {"decoding_method": "greedy", "max_new_tokens": 700}
+
+    def _respond(self, prompt):
+        if self.output is not None:
+            return self.output
+        summary_type = prompt[1:prompt.index("]")] if prompt.startswith("[") else ""
+        words = " ".join(f"word{i}" for i in range(self.summary_words))
+        if summary_type in STRUCTURED_SUMMARY_TYPES:
+            return json.dumps({"issue_title": "Build failed", "description": words, "root_cause": words})
+        return words
+
+    def generate_text(self, prompts, params):
+        with self._lock:
+            self.calls += len(prompts)
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        return [self._respond(prompt) for prompt in prompts]
+
+
+def install(latency=0.2, summary_words=120, output=None, jitter=0.0):
+    integration = StubIntegration(latency=latency, summary_words=summary_words, output=output, jitter=jitter)
+    platform_config.integration = integration
+    platform_config.promptbuilders = StubPromptBuilders()
+    return integration
@@ -0,0 +1,70 @@
+'''
+Local stand-in for an LLM text generation endpoint, speaking the protocol of HTTPIntegration.
+
+Answers POST /v1/generate after a fixed latency and enforces its own token-bucket rate limit,
+returning 429 with Retry-After and x-ratelimit-* headers like a hosted platform. Run from the
+summarization directory:
+
+    python -m benchmarks.stub_llm_server --port 8085 --latency 0.5 --rate 20
+'''
+import time
+import asyncio
+import argparse
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI()
+settings = {"latency": 0.5, "rate": 20.0, "burst": 20, "summary_words": 120}
+bucket = {"tokens": 20.0, "updated": time.monotonic()}
+counters = {"requests": 0, "rejected": 0}
+
+
+def take_token():
+    now = time.monotonic()
+    bucket["tokens"] = min(settings["burst"], bucket["tokens"] + (now - bucket["updated"]) * settings["rate"])
+    bucket["updated"] = now
+    if bucket["tokens"] >= 1:
+        bucket["tokens"] -= 1
+        return True, 0.0
+    return False, (1 - bucket["tokens"]) / settings["rate"]
+
+
+@app.post("/v1/generate")
+async def generate(request: Request):
+    body = await request.json()
+    counters["requests"] += 1
+    if settings["rate"] > 0:
+        allowed, wait = take_token()
+        headers = {"x-ratelimit-remaining": str(int(bucket["tokens"])), "x-ratelimit-reset": f"{wait:.3f}"}
+        if not allowed:
+            counters["rejected"] += 1
+            headers["retry-after"] = f"{max(wait, 0.05):.3f}"
+            return JSONResponse(status_code=429, content={"detail": "rate limited"}, headers=headers)
+    else:
+        headers = {}
+
+    await asyncio.sleep(settings["latency"])
+    words = " ".join(f"word{i}" for i in range(settings["summary_words"]))
+    return JSONResponse(content={"results": [{"generated_text": words} for _ in body["inputs"]]}, headers=headers)
+
+
+@app.get("/stats")
+def stats():
+    return counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8085)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per generation call")
+    parser.add_argument("--rate", type=float, default=20.0, help="allowed calls per second, 0 for unlimited")
+    parser.add_argument("--burst", type=int, default=20)
+    args = parser.parse_args()
+    settings.update(latency=args.latency, rate=args.rate, burst=args.burst)
+    bucket["tokens"] = float(args.burst)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,11 +18,3 @@ def get_settings():
 # Set up basic configuration for logging
 
 logging.basicConfig(stream=sys.stdout, level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-def log_entry_exit(func):
-    def wrapper(*args, **kwargs):
-        print(f"Entering {func.__name__} with arguments: {args}, {kwargs}")
-        result = func(*args, **kwargs)
-        print(f"Exiting {func.__name__} with result: {result}")
-        return result
-    return wrapper
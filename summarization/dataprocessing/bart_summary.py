@@ -1,20 +1,63 @@
-import spacy
 import torch
-from transformers import BartTokenizer, BartForConditionalGeneration
-from config import log_entry_exit
+import configparser
+from transformers import BartTokenizer
+from tracing import traced
+from dataprocessing.text_cleaning import get_text_cleaning_service
+from dataprocessing.micro_batcher import MicroBatcher
+from dataprocessing.inference_backend import load_seq2seq_model
+from model_registry import model_registry
+from serving import cpu_pool
 
-# Load the spaCy NER model
-nlp_ner = spacy.load("en_core_web_sm")
+config = configparser.ConfigParser()
+config.read("constants.ini")
+BART_MAX_BATCH_SIZE = int(config.get('BART', 'MAX_BATCH_SIZE'))
+BART_MAX_WAIT_MS = float(config.get('BART', 'MAX_WAIT_MS'))
 
-# Load BART model and tokenizer
 model_name = "facebook/bart-large-cnn"
-tokenizer = BartTokenizer.from_pretrained(model_name)
-model = BartForConditionalGeneration.from_pretrained(model_name)
 
-@log_entry_exit
+
+class BartSummarizer:
+    '''
+    BART model and tokenizer, loaded through the model registry on first use
+    '''
+
+    def __init__(self, model_name=model_name):
+        self.tokenizer = BartTokenizer.from_pretrained(model_name)
+        self.model = load_seq2seq_model(model_name)
+
+    def summarize_batch(self, cleaned_texts: list) -> list:
+        '''
+        Summarizes a batch of cleaned texts with one padded generate call
+        '''
+        inputs = self.tokenizer(
+            cleaned_texts, max_length=1024, return_tensors="pt", truncation=True, padding=True
+        )
+        with torch.inference_mode():
+            summary_ids = self.model.generate(
+                inputs["input_ids"],
+                attention_mask=inputs["attention_mask"],
+                max_length=150,
+                min_length=50,
+                length_penalty=2.0,
+                num_beams=4,
+                early_stopping=True,
+            )
+        return self.tokenizer.batch_decode(summary_ids, skip_special_tokens=True)
+
+    def warm_up(self):
+        '''
+        Runs one generate call so the first request does not pay for lazy initialisation
+        '''
+        self.summarize_batch(["The service was restarted after the deployment failed and the incident was resolved."])
+
+
+model_registry.register("bart", BartSummarizer, warm_up=BartSummarizer.warm_up)
+
+
+@traced
 def clean_text_with_ner(text):
-    # Process the text using spaCy NER
-    doc = nlp_ner(text)
+    # Process the text using the shared spaCy pipeline (NER included)
+    doc = next(get_text_cleaning_service().pipe([text]))
 
     # Create a list to store cleaned sentences
     cleaned_sentences = []
@@ -42,28 +85,33 @@ def clean_text_with_ner(text):
 
     return cleaned_text
 
-@log_entry_exit
+def generate_summary_batch(cleaned_texts: list) -> list:
+    '''
+    Summarizes a batch of cleaned texts with the registry's BART model
+    '''
+    return model_registry.get("bart").summarize_batch(cleaned_texts)
+
+
+def run_summary_batch(cleaned_texts: list) -> list:
+    # Batches are generated in the CPU pool when the server runs one
+    return cpu_pool.call(generate_summary_batch, cleaned_texts)
+
+
+# Concurrent short-summary requests share generate calls
+bart_batcher = MicroBatcher(run_summary_batch, max_batch_size=BART_MAX_BATCH_SIZE,
+                            max_wait_ms=BART_MAX_WAIT_MS, name="bart-batcher")
+
+
+@traced
 def generate_summaries(worknote):
-    cleaned_data_ner = clean_text_with_ner(worknote)
-
-    inputs = tokenizer(
-        cleaned_data_ner, max_length=1024, return_tensors="pt", truncation=True
-    )
-    summary_ids = model.generate(
-        inputs["input_ids"],
-        max_length=150,
-        min_length=50,
-        length_penalty=2.0,
-        num_beams=4,
-        early_stopping=True,
-    )
-    cleaned_summary = tokenizer.decode(
-        summary_ids[0], skip_special_tokens=True)
+    cleaned_data_ner = cpu_pool.call(clean_text_with_ner, worknote)
+
+    cleaned_summary = bart_batcher.submit(cleaned_data_ner)
 
     return cleaned_summary
 
 
-@log_entry_exit
+@traced
 def bart_summarization(worknote: str):
     cleaned_summary = generate_summaries(worknote)
     return cleaned_summary
@@ -0,0 +1,178 @@
+import json
+import time
+import logging
+import configparser
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+import platform_config
+from utils import Utils
+from dataprocessing.summary import Summary
+from dataprocessing.chunking import Chunk, CHUNKING_THRESHOLD
+from dataprocessing.map_executor import MapExecutor
+from serving import cpu_pool
+from model_classes import BatchItem, BatchItemResult, Job, StatusEnum, ExceptionMessageEnum, CustomException
+from job_store import JobStore
+
+config = configparser.ConfigParser()
+config.read("constants.ini")
+BATCH_MAX_ITEMS = int(config.get('BATCH', 'MAX_ITEMS'))
+BATCH_MAX_CONCURRENT_JOBS = int(config.get('BATCH', 'MAX_CONCURRENT_JOBS'))
+BATCH_LLM_CONCURRENCY = int(config.get('BATCH', 'LLM_CONCURRENCY'))
+
+# Batch jobs mostly wait on the LLM, so they run on threads of the API process
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_CONCURRENT_JOBS, thread_name_prefix="batch-job")
+# Short notes of a batch get their own LLM pool, so a large batch does not starve live requests
+# on chunk_map_executor; each job keeps at most BATCH_LLM_CONCURRENCY prompts in flight
+batch_map_executor = MapExecutor(max_concurrency=BATCH_LLM_CONCURRENCY, name="batch-map")
+
+
+def check_batch_size(items: list):
+    if len(items) > BATCH_MAX_ITEMS:
+        raise CustomException(
+            error_code=413,
+            message=ExceptionMessageEnum.BATCH_TOO_LARGE.value.format(max_items=BATCH_MAX_ITEMS, items=len(items)))
+
+
+def parse_ndjson(body: bytes) -> list:
+    '''
+    Parses an NDJSON upload: one {"id": ..., "text": ...} object or one JSON string per line
+    '''
+    items = []
+    for line_number, line in enumerate(body.decode("utf-8").splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            value = json.loads(line)
+            items.append(BatchItem(text=value) if isinstance(value, str) else BatchItem(**value))
+        except (ValueError, TypeError, ValidationError) as e:
+            raise CustomException(
+                error_code=400,
+                message=ExceptionMessageEnum.INVALID_NDJSON_LINE.value.format(line=line_number, error=e))
+    return items
+
+
+class BatchSummarizer:
+    '''
+    Summarizes many notes of one summary type together. Identical texts are summarized once,
+    notes that fit into one prompt are cleaned in a single batched spaCy pass and sent to the LLM
+    through the batch map executor, a bounded window at a time with per-prompt retries.
+    '''
+
+    def __init__(self, summary_type: str):
+        self.summary_type = summary_type
+        self.chunk = Chunk()
+
+    def _summarize_short(self, texts: list):
+        '''
+        Yields (index, summary or exception) pairs, in completion order, for texts that need no chunking
+        '''
+        try:
+            cleaned_texts = cpu_pool.call(Utils.clean_text, texts, stage="clean_text")
+            generated_prompt_list = platform_config.promptbuilders.generate_prompts(self.summary_type, cleaned_texts)
+            params = platform_config.integration.fetch_default_params()
+        except Exception as e:
+            for index in range(len(texts)):
+                yield index, e
+            return
+
+        def summarize_prompt(prompt):
+            return Summary.generate_text(self.summary_type, [prompt], params)
+
+        for index, llm_response in batch_map_executor.imap(summarize_prompt, generated_prompt_list,
+                                                           return_exceptions=True):
+            if not isinstance(llm_response, Exception):
+                try:
+                    llm_response = Summary.finish_summary(llm_response, self.summary_type)
+                except Exception as e:
+                    llm_response = e
+            yield index, llm_response
+
+    def _summarize_long(self, text: str):
+        try:
+            return self.chunk.summarize(text, self.summary_type)
+        except Exception as e:
+            return e
+
+    def _results(self, ids: list, outcome) -> list:
+        if isinstance(outcome, HTTPException):
+            fields = dict(status=StatusEnum.ERROR, error_code=outcome.status_code, error=str(outcome.detail))
+        elif isinstance(outcome, CustomException):
+            fields = dict(status=StatusEnum.ERROR, error_code=outcome.error_code, error=str(outcome))
+        elif isinstance(outcome, Exception):
+            fields = dict(status=StatusEnum.ERROR, error_code=500,
+                          error=ExceptionMessageEnum.ERROR_RESPONSE.value.format(outcome))
+        else:
+            fields = dict(status=StatusEnum.SUCCESS,
+                          result=outcome.dict() if isinstance(outcome, BaseModel) else outcome)
+        return [BatchItemResult(id=item_id, **fields) for item_id in ids]
+
+    def iter_results(self, items: list):
+        '''
+        Yields one BatchItemResult per item as results become available. Items without an id
+        are identified by their position in the batch.
+        '''
+        ids_by_text = OrderedDict()
+        for position, item in enumerate(items):
+            ids_by_text.setdefault(item.text, []).append(item.id if item.id is not None else str(position))
+        texts = list(ids_by_text)
+        logging.info(f"Batch {self.summary_type}: {len(items)} items, {len(texts)} unique")
+
+        short_texts, long_texts = [], []
+        for text in texts:
+            # Build logs are split by their size after pre-reduction, which is what gets summarized
+            reduced_text = self.chunk.preprocess(text, self.summary_type)
+            if self.chunk.exceeds_tokens(reduced_text, CHUNKING_THRESHOLD):
+                long_texts.append((text, reduced_text))
+            else:
+                short_texts.append((text, reduced_text))
+
+        if short_texts:
+            # Near-duplicates of earlier inputs come from the semantic cache, embedded in one batch
+            lookups = self.chunk.semantic_lookup_many([reduced_text for _, reduced_text in short_texts],
+                                                      self.summary_type)
+            pending = []
+            for position, (_, cached_summary) in enumerate(lookups):
+                if cached_summary is not None:
+                    yield from self._results(ids_by_text[short_texts[position][0]], cached_summary)
+                else:
+                    pending.append(position)
+            for index, outcome in self._summarize_short([short_texts[position][1] for position in pending]):
+                position = pending[index]
+                self.chunk.semantic_store(lookups[position][0], outcome)
+                yield from self._results(ids_by_text[short_texts[position][0]], outcome)
+
+        # Long notes are chunked one at a time; their chunks already fill the map executor.
+        # Chunk.summarize runs the pre-reduction itself, so it gets the original text
+        for text, _ in long_texts:
+            yield from self._results(ids_by_text[text], self._summarize_long(text))
+
+
+def run_batch_job(job_store: JobStore, job_uuid: str, summary_type: str, items: list, enqueued_at: float):
+    '''
+    Runs a batch and stores the per-item results as NDJSON in the job's result
+    '''
+    start = time.perf_counter()
+    queue_wait_ms = round((start - enqueued_at) * 1000, 3)
+    try:
+        lines = [result.json() for result in BatchSummarizer(summary_type).iter_results(items)]
+        fields = dict(status=StatusEnum.SUCCESS, result="\n".join(lines))
+    except Exception as e:
+        logging.error(ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
+        fields = dict(status=StatusEnum.ERROR, result=ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
+    fields["queue_wait_ms"] = queue_wait_ms
+    fields["run_time_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    job_store.update(job_uuid, **fields)
+
+
+def submit_batch_job(job_store: JobStore, summary_type: str, items: list) -> Job:
+    job = Job()
+    job_store.add(job)
+    batch_executor.submit(run_batch_job, job_store, job.job_uuid.__str__(), summary_type, items,
+                          time.perf_counter())
+    return job
+
+
+def parse_batch_result(result: str) -> list:
+    return [BatchItemResult.parse_raw(line) for line in result.splitlines() if line]
@@ -0,0 +1,193 @@
+import io
+import re
+import configparser
+from collections import deque
+from dataprocessing.tokenization import get_token_engine
+
+config = configparser.ConfigParser()
+config.read("constants.ini")
+BUILD_LOG_REDUCER_ENABLED = config.getboolean('BUILD_LOG_REDUCER', 'ENABLED')
+BUILD_LOG_TARGET_TOKENS = int(config.get('BUILD_LOG_REDUCER', 'TARGET_TOKENS'))
+BUILD_LOG_CONTEXT_BEFORE = int(config.get('BUILD_LOG_REDUCER', 'CONTEXT_BEFORE'))
+BUILD_LOG_CONTEXT_AFTER = int(config.get('BUILD_LOG_REDUCER', 'CONTEXT_AFTER'))
+BUILD_LOG_ERROR_MARKERS = [marker.strip() for marker in config.get('BUILD_LOG_REDUCER', 'ERROR_MARKERS').split(",")
+                           if marker.strip()]
+
+ANSI_PATTERN = re.compile(r"\x1b\[[0-9;?]*[ -/]*[@-~]|\x1b[@-Z\\-_]")
+# ISO dates with time, bracketed clock times and syslog-style "Mon dd hh:mm:ss" at the start of a line
+TIMESTAMP_PATTERN = re.compile(
+    r"^\s*\[?(?:\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?"
+    r"|\d{2}:\d{2}:\d{2}(?:[.,]\d+)?"
+    r"|[A-Z][a-z]{2} +\d{1,2} \d{2}:\d{2}:\d{2})\]? ?")
+# Variable parts of otherwise identical lines: uuids, hex ids, numbers, sizes and progress bars
+TEMPLATE_PATTERN = re.compile(
+    r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"
+    r"|\b0x[0-9a-fA-F]+\b|\b[0-9a-f]{7,}\b"
+    r"|\d+(?:[.,:]\d+)*"
+    r"|[=#>.\-|*]{3,}")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def error_marker_pattern(markers: list = BUILD_LOG_ERROR_MARKERS):
+    return re.compile(r"(?i)\b(?:" + "|".join(re.escape(marker) for marker in markers) + r")\b")
+
+
+def clean_line(line: str) -> str:
+    '''
+    Removes ANSI escape codes, progress redraws (carriage returns) and a leading timestamp
+    '''
+    line = line.rstrip("\r\n")
+    if "\r" in line:
+        line = line.rsplit("\r", 1)[-1]
+    if "\x1b" in line:
+        line = ANSI_PATTERN.sub("", line)
+    return TIMESTAMP_PATTERN.sub("", line, count=1).rstrip()
+
+
+def line_template(line: str) -> str:
+    return WHITESPACE_PATTERN.sub(" ", TEMPLATE_PATTERN.sub("<*>", line)).strip()
+
+
+class _Entry:
+    __slots__ = ("text", "last", "count", "keep")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.last = text
+        self.count = 1
+        self.keep = False
+
+    def render(self) -> str:
+        if self.count == 1:
+            return self.text
+        if self.last == self.text:
+            return f"{self.text} [repeated {self.count}x]"
+        # The last line of a run is the one right before whatever ended it, often the failing step
+        return f"{self.text} [repeated {self.count}x, last: {self.last}]"
+
+
+class BuildLogReducer:
+    '''
+    Deterministic pre-reduction of CI build logs before summarization. In one pass over the lines
+    it strips ANSI codes and timestamps, collapses runs of consecutive lines that only differ in
+    numbers, ids or progress bars into one entry with a count, and marks a window of entries around
+    every error, failure or exit-code marker. Unmarked lines are then dropped, oldest first,
+    until the log fits the target token budget.
+    '''
+
+    def __init__(self, target_tokens: int = BUILD_LOG_TARGET_TOKENS, context_before: int = BUILD_LOG_CONTEXT_BEFORE,
+                 context_after: int = BUILD_LOG_CONTEXT_AFTER, markers: list = BUILD_LOG_ERROR_MARKERS,
+                 count_tokens=None):
+        self.target_tokens = target_tokens
+        self.context_before = context_before
+        self.context_after = context_after
+        self.error_pattern = error_marker_pattern(markers)
+        self.count_tokens = count_tokens
+
+    def _count_tokens(self, text: str) -> int:
+        if self.count_tokens is not None:
+            return self.count_tokens(text)
+        return get_token_engine().count(text)
+
+    def _collapse(self, lines):
+        '''
+        Single pass over the lines: returns the entries in log order and statistics. Only consecutive
+        lines with the same template are merged, so every entry keeps its position around the errors.
+        '''
+        entries = []
+        template = None
+        recent = deque(maxlen=self.context_before)
+        after = 0
+        stats = {"input_lines": 0, "error_lines": 0}
+
+        for line in lines:
+            stats["input_lines"] += 1
+            line = clean_line(line)
+            if not line:
+                continue
+
+            previous_template, template = template, line_template(line)
+            if entries and template == previous_template:
+                entry = entries[-1]
+                entry.count += 1
+                entry.last = line
+            else:
+                if entries:
+                    recent.append(entries[-1])
+                entry = _Entry(line)
+                entries.append(entry)
+                # The context windows count entries, so a long run takes one line of context
+                if after > 0:
+                    entry.keep = True
+                    after -= 1
+
+            if self.error_pattern.search(line):
+                stats["error_lines"] += 1
+                entry.keep = True
+                for previous in recent:
+                    previous.keep = True
+                after = self.context_after
+
+        stats["unique_lines"] = len(entries)
+        return entries, stats
+
+    def _fit(self, entries: list) -> list:
+        '''
+        Drops unmarked entries, oldest first, until the rendered log fits the token budget.
+        Marked entries are only dropped (again oldest first) when they alone exceed it.
+        '''
+        sizes = [self._count_tokens(entry.render()) + 1 for entry in entries]
+        total = sum(sizes)
+        dropped = [False] * len(entries)
+        for keep_marked in (True, False):
+            for index, entry in enumerate(entries):
+                if total <= self.target_tokens:
+                    return dropped
+                if not dropped[index] and (not keep_marked or not entry.keep):
+                    dropped[index] = True
+                    total -= sizes[index]
+        return dropped
+
+    def reduce_with_stats(self, text: str):
+        '''
+        Returns the reduced log and statistics about the reduction
+        '''
+        # StringIO splits on "\n" only, so progress redraws separated by "\r" stay on one line
+        entries, stats = self._collapse(io.StringIO(text))
+        dropped = self._fit(entries)
+
+        output = []
+        omitted = 0
+        for entry, is_dropped in zip(entries, dropped):
+            if is_dropped:
+                omitted += entry.count
+                continue
+            if omitted:
+                output.append(f"... {omitted} lines omitted ...")
+                omitted = 0
+            output.append(entry.render())
+        if omitted:
+            output.append(f"... {omitted} lines omitted ...")
+
+        stats["output_lines"] = len(output)
+        stats["dropped_lines"] = sum(entry.count for entry, is_dropped in zip(entries, dropped) if is_dropped)
+        return "\n".join(output), stats
+
+    def reduce(self, text: str) -> str:
+        return self.reduce_with_stats(text)[0]
+
+    def error_window(self, text: str) -> list:
+        '''
+        The cleaned lines around errors, in order, without the rest of the log; empty when nothing failed
+        '''
+        entries, _ = self._collapse(io.StringIO(text))
+        window = []
+        for entry in entries:
+            if entry.keep:
+                window.append(entry.text)
+                if entry.last != entry.text:
+                    window.append(entry.last)
+        return window
+
+
+build_log_reducer = BuildLogReducer()
@@ -1,71 +1,275 @@
-# Assuming text is a long string that you wish to split
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from dataprocessing.summary import Summary
-from transformers import BertTokenizer
+from dataprocessing.tokenization import get_token_engine
+from dataprocessing.build_log_reducer import build_log_reducer, BUILD_LOG_REDUCER_ENABLED
 from model_classes import ExceptionMessageEnum,CustomException
+from incremental_store import incremental_store, chunk_digest
+from semantic_cache import semantic_cache
+from dataprocessing.json_parser import SUMMARY_MODELS
+from pydantic import BaseModel
 from fastapi import HTTPException
-from config import log_entry_exit
+from tracing import traced
+from metrics import timed, observe_stage, observe_input
+from itertools import islice
+from functools import partial
+from dataprocessing.pipeline import Step, blocking, iter_events, run_steps, arun_steps
 import configparser
-
-tokenizer = BertTokenizer.from_pretrained('bert-base-uncased')
+import time
 
 config = configparser.ConfigParser()
 config.read("constants.ini")
 INPUT_LIMIT = int(config.get('SUMMARIZATION','INPUT_LIMIT'))
 CHUNKING_THRESHOLD = int(config.get('SUMMARIZATION','CHUNKING_THRESHOLD'))
+CHUNK_SIZE_TOKENS = int(config.get('SUMMARIZATION','CHUNK_SIZE_TOKENS'))
+CHUNK_OVERLAP_TOKENS = int(config.get('SUMMARIZATION','CHUNK_OVERLAP_TOKENS'))
+TREE_REDUCE = config.getboolean('MAP_REDUCE','TREE_REDUCE')
+REDUCE_FAN_IN = int(config.get('MAP_REDUCE','FAN_IN'))
+REDUCE_MAX_DEPTH = int(config.get('MAP_REDUCE','MAX_DEPTH'))
+MAP_WINDOW_SIZE = int(config.get('MAP_REDUCE','MAP_WINDOW_SIZE'))
 
 class Chunk:
 
-    @log_entry_exit
-    def token_count(self, text):
-        tokens = tokenizer.tokenize(text)
-        token_count = len(tokens)
-        return token_count
-
-    @log_entry_exit
-    def create_chunks(self, text):
-        custom_text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=7000,
-            chunk_overlap=150,
-            length_function=len
-        )
-
-        texts = custom_text_splitter.create_documents([text])
-        return texts
+    @traced
+    @timed("token_count")
+    def token_count(self, text, limit=None):
+        '''
+        Counts tokens with the fast tokenizer; with a limit, counting stops once it is exceeded
+        '''
+        return get_token_engine().count(text, limit=limit)
 
-    @log_entry_exit
-    def summarize_chunks(self,chunks,summary_type):
+    @traced
+    @timed("token_count")
+    def exceeds_tokens(self, text, limit):
+        '''
+        Whether text has more than limit tokens; short texts are decided by their length alone
+        '''
+        return get_token_engine().exceeds(text, limit)
+
+    @traced
+    @timed("create_chunks", iterator=True)
+    def create_chunks(self, text, counts=None):
+        '''
+        Lazily yields chunks of CHUNK_SIZE_TOKENS tokens overlapping by CHUNK_OVERLAP_TOKENS
+        '''
+        return get_token_engine().iter_chunks(text, CHUNK_SIZE_TOKENS, CHUNK_OVERLAP_TOKENS, counts=counts)
 
+    @traced
+    @timed("create_chunks", iterator=True)
+    def create_chunk_spans(self, text, start=0, counts=None):
+        '''
+        Lazily yields the (start, end) offsets of the chunks of text[start:]
+        '''
+        return get_token_engine().iter_chunk_spans(text, CHUNK_SIZE_TOKENS, CHUNK_OVERLAP_TOKENS,
+                                                   start=start, counts=counts)
+
+    @traced
+    @timed("preprocess")
+    def preprocess(self, texts, summary_type):
+        '''
+        Pre-reduces build logs (dedup, ANSI/timestamp stripping, error windows) before they are chunked
+        '''
+        if summary_type == 'build_summary_structured' and BUILD_LOG_REDUCER_ENABLED:
+            return build_log_reducer.reduce(texts)
+        return texts
+
+    def chunk_summary_type(self, summary_type):
         if summary_type == 'build_summary_structured':
-            summary_type = 'build_summary_chunk'
+            return 'build_summary_chunk'
         else:
-            summary_type = 'long_summary'
+            return 'long_summary'
+
+    @traced
+    def summarize_chunks(self,chunks,summary_type):
 
-        long_summary = Summary.generate_summary(chunks, summary_type)
-        
-        return long_summary
+        chunk_summaries = Summary.generate_chunk_summaries(chunks, self.chunk_summary_type(summary_type))
 
-    @log_entry_exit
-    def summarize(self,texts,summary_type):
-        
-        token_count = self.token_count(texts)
-        if token_count < INPUT_LIMIT:
-            if token_count > CHUNKING_THRESHOLD:
-                texts = self.create_chunks(texts)
+        return chunk_summaries
 
-                chunks = [text_doc.page_content for text_doc in texts]
+    def map_window_events(self, window, chunk_summary_type, first=0, done=0, total=None):
+        '''
+        Summarizes one window of chunks, yielding partial summary and progress events as chunks
+        complete (chunks numbered from first, done chunks counted from done). Returns the summaries in order.
+        '''
+        summaries = [None] * len(window)
+        for index, summary in Summary.iter_chunk_summaries(window, chunk_summary_type):
+            summaries[index] = summary
+            done += 1
+            yield "partial", {"chunk": first + index, "summary": summary}
+            yield "progress", {"stage": "map", "done": done, "total": total}
+        return summaries
 
-                summaries = self.summarize_chunks(chunks,summary_type)
+    def reduce_level_events(self, groups, chunk_summary_type, clean=False, level=1):
+        '''
+        Summarizes one level of reduce groups, yielding progress events as groups complete
+        '''
+        summaries = [None] * len(groups)
+        for done, (index, summary) in enumerate(
+                Summary.iter_chunk_summaries(groups, chunk_summary_type, clean=clean), start=1):
+            summaries[index] = summary
+            yield "progress", {"stage": "reduce", "level": level, "done": done, "total": len(groups)}
+        return summaries
 
-                aggregate_summary = ''.join(summaries)
-            else:
-                aggregate_summary = texts
-        else:
-            #  token_count*1.25 is used here because BAM Token Counts is always 1.25 times greater than tokens generated by BERT,GPT2...         
+    def count_chunks(self, texts):
+        return sum(1 for _ in self.create_chunks(texts))
+
+    def next_window(self, chunks):
+        return list(islice(chunks, MAP_WINDOW_SIZE))
+
+    def map_steps(self, chunks, summary_type, total=None, first=0):
+        '''
+        Summarizes chunks window by window so only MAP_WINDOW_SIZE chunk texts are held at a time.
+        Returns the summaries in chunk order.
+        '''
+        chunk_summary_type = self.chunk_summary_type(summary_type)
+        summaries = []
+        while True:
+            # Tokenizing the next window is CPU work, so async callers run it in the threadpool
+            window = yield blocking(self.next_window, chunks)
+            if not window:
+                break
+            events_fn = partial(self.map_window_events, first=first + len(summaries), done=len(summaries), total=total)
+            summaries.extend((yield Step(None, Summary.agenerate_chunk_summaries, window, chunk_summary_type,
+                                         events_fn=events_fn)))
+        return summaries
+
+    @traced
+    def plan_incremental(self, texts, summary_type, incident_id, counts=None):
+        '''
+        Compares texts with the chunks stored for the incident. Returns the store key, the chunks
+        whose summaries are reused and the spans of the chunks that have to be summarized.
+        '''
+        key = incremental_store.make_key(incident_id, self.chunk_summary_type(summary_type))
+        reused, resume_at = incremental_store.reusable_chunks(texts, incremental_store.get(key))
+        spans = list(self.create_chunk_spans(texts, start=resume_at, counts=counts))
+        return key, reused, spans
+
+    def store_incremental(self, key, texts, reused, spans, summaries):
+        '''
+        Stores the reused and the new chunks of the incident; returns all chunk summaries in order
+        '''
+        chunks = reused + [{"start": start, "end": end, "digest": chunk_digest(texts[start:end]), "summary": summary}
+                           for (start, end), summary in zip(spans, summaries)]
+        incremental_store.set(key, chunks, reused=len(reused))
+        return [chunk["summary"] for chunk in chunks]
+
+    def incremental_map_steps(self, texts, summary_type, incident_id, counts=None):
+        '''
+        Map phase for an incident whose notes only grow: chunks up to the unchanged prefix keep their
+        stored summaries and only the tail is cleaned and summarized. Returns all chunk summaries.
+        '''
+        key, reused, spans = yield blocking(self.plan_incremental, texts, summary_type, incident_id, counts)
+        new_summaries = yield from self.map_steps(
+            (texts[start:end] for start, end in spans), summary_type, len(spans), first=len(reused))
+        return self.store_incremental(key, texts, reused, spans, new_summaries)
+
+    def reduce_steps(self, summaries, summary_type):
+        '''
+        Summarizes groups of REDUCE_FAN_IN summaries level by level until their concatenation
+        fits into a single reduce prompt (CHUNKING_THRESHOLD tokens). Returns the aggregate summary.
+        '''
+        chunk_summary_type = self.chunk_summary_type(summary_type)
+        aggregate_summary = ' '.join(summaries)
+        depth = 0
+
+        while len(summaries) > 1 and (yield blocking(self.exceeds_tokens, aggregate_summary, CHUNKING_THRESHOLD)):
+            if depth >= REDUCE_MAX_DEPTH:
+                raise CustomException(
+                    error_code=422,
+                    message=ExceptionMessageEnum.REDUCE_DEPTH_EXCEEDED.value.format(depth=depth))
+
+            groups = [' '.join(summaries[i:i + REDUCE_FAN_IN]) for i in range(0, len(summaries), REDUCE_FAN_IN)]
+            depth += 1
+            # Summaries are LLM output already, so they skip the spaCy cleaning pass
+            summaries = yield Step(None, Summary.agenerate_chunk_summaries, groups, chunk_summary_type, clean=False,
+                                   events_fn=partial(self.reduce_level_events, level=depth))
+            aggregate_summary = ' '.join(summaries)
+
+        return aggregate_summary
+
+    def semantic_lookup_many(self, texts: list, summary_type, incident_id=None) -> list:
+        '''
+        (query, cached summary or None) per text from the semantic cache. Growing incident notes are
+        not looked up, since an earlier version of the same notes would match them.
+        '''
+        if semantic_cache is None or incident_id is not None or not semantic_cache.handles(summary_type):
+            return [(None, None)] * len(texts)
+        results = []
+        for query, value in semantic_cache.lookup_many(texts, summary_type):
+            if isinstance(value, dict) and summary_type in SUMMARY_MODELS:
+                value = SUMMARY_MODELS[summary_type](**value)
+            results.append((query, value))
+        return results
+
+    def semantic_lookup(self, texts, summary_type, incident_id=None):
+        return self.semantic_lookup_many([texts], summary_type, incident_id)[0]
+
+    def semantic_store(self, query, summary):
+        # Structured summaries that failed to parse come back as an HTTPException and are not cached
+        if query is not None and isinstance(summary, (BaseModel, str)):
+            semantic_cache.store(query, summary.dict() if isinstance(summary, BaseModel) else summary)
+
+    def summarize_steps(self, texts, summary_type, stream=False, incident_id=None):
+        '''
+        The map-reduce summarization, planned once for the sync and the async entry points
+        (see dataprocessing.pipeline). With an incident_id, the map phase is incremental.
+        '''
+        texts = yield blocking(self.preprocess, texts, summary_type)
+        query, cached_summary = yield blocking(self.semantic_lookup, texts, summary_type, incident_id)
+        if cached_summary is not None:
+            return cached_summary
+
+        # Only the thresholds matter, so counting stops early once the relevant one is exceeded
+        token_count = yield blocking(self.token_count, texts, limit=CHUNKING_THRESHOLD if TREE_REDUCE else INPUT_LIMIT)
+        if token_count >= INPUT_LIMIT and not TREE_REDUCE:
+            #  token_count*1.25 is used here because BAM Token Counts is always 1.25 times greater than tokens generated by BERT,GPT2...
             raise CustomException(
                 error_code=422,
                 message=ExceptionMessageEnum.INPUT_LIMIT_REACHED.value.format(token = int(token_count*1.25)))
 
-        return Summary.generate_summary([aggregate_summary], summary_type)
+        if token_count > CHUNKING_THRESHOLD:
+            map_start = time.perf_counter()
+            counts = {"tokens": 0}
+            if incident_id is not None and incremental_store is not None:
+                summaries = yield from self.incremental_map_steps(texts, summary_type, incident_id, counts)
+            else:
+                # Counting the chunks costs an extra tokenizer pass, so it is only done when streaming progress
+                total = (yield blocking(self.count_chunks, texts)) if stream else None
+                summaries = yield from self.map_steps(self.create_chunks(texts, counts), summary_type, total)
+            observe_stage("map", time.perf_counter() - map_start)
+            observe_input(summary_type, counts["tokens"], len(summaries))
+
+            reduce_start = time.perf_counter()
+            if TREE_REDUCE:
+                aggregate_summary = yield from self.reduce_steps(summaries, summary_type)
+            else:
+                # Map results come back in chunk order and are reduced in a single prompt
+                aggregate_summary = ' '.join(summaries)
+            observe_stage("reduce", time.perf_counter() - reduce_start)
+        else:
+            observe_input(summary_type, token_count, 1)
+            aggregate_summary = texts
+
+        summary = yield Step(Summary.generate_summary, Summary.agenerate_summary, [aggregate_summary], summary_type)
+        if query is not None:
+            yield blocking(self.semantic_store, query, summary)
+        return summary
+
+    def summarize_events(self, texts, summary_type, stream=False, incident_id=None):
+        '''
+        Runs the map-reduce summarization as a sequence of (event, data) pairs: "progress" and
+        "partial" events during the map and reduce phases, and a final "result" event.
+        '''
+        summary = yield from iter_events(self.summarize_steps(texts, summary_type, stream, incident_id))
+        yield "result", summary
+
+    @traced
+    async def asummarize(self, texts, summary_type, incident_id=None):
+        '''
+        Async counterpart of summarize for async routes: tokenizing and spaCy cleaning run in the
+        threadpool, while the event loop waits on the LLM calls without holding a thread.
+        '''
+        return await arun_steps(self.summarize_steps(texts, summary_type, incident_id=incident_id))
 
+    @traced
+    def summarize(self,texts,summary_type,incident_id=None):
 
+        return run_steps(self.summarize_steps(texts, summary_type, incident_id=incident_id))
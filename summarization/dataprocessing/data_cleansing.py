@@ -1,6 +1,18 @@
 import re
-from transformers import BertTokenizer, BertForSequenceClassification
+import configparser
+import torch
+from transformers import BertTokenizer
 from torch.nn.functional import softmax
+from dataprocessing.inference_backend import load_sequence_classifier
+from model_registry import model_registry
+from dataprocessing.rule_engine import generic_info_rules
+from tracing import traced
+
+config = configparser.ConfigParser()
+config.read("constants.ini")
+CHITCHAT_MODEL_NAME = config.get('CLEANSING', 'CHITCHAT_MODEL_NAME')
+CHITCHAT_BATCH_SIZE = int(config.get('CLEANSING', 'CHITCHAT_BATCH_SIZE'))
+WHITESPACE_PATTERN = re.compile(r"\s+")
 
 
 # Preprocess text
@@ -10,36 +22,89 @@ def preprocess_text(text):
     """
     try:
         text = text.strip()
-        text = re.sub(r"\s+", " ", text)
+        text = WHITESPACE_PATTERN.sub(" ", text)
         return text
     except Exception as e:
         # Handle exceptions during text preprocessing
         raise Exception(f"Error during text preprocessing: {e}")
 
 
+class ChitchatClassifier:
+    """
+    Resident BERT binary classifier that labels lines as chitchat or non-chitchat.
+    The model is loaded once and lines are classified in padded mini-batches.
+    """
+    labels = ["non-chitchat", "chitchat"]
+
+    def __init__(self, model_name=CHITCHAT_MODEL_NAME, batch_size=CHITCHAT_BATCH_SIZE):
+        self.tokenizer = BertTokenizer.from_pretrained(model_name)
+        self.model = load_sequence_classifier(model_name, num_labels=2)
+        self.batch_size = batch_size
+
+    def is_chitchat(self, texts):
+        """
+        Returns one boolean per input text, True when the text is classified as chitchat.
+        """
+        # Sort by length so every mini-batch pads to a similar length
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        predictions = [False] * len(texts)
+
+        with torch.inference_mode():
+            for start in range(0, len(order), self.batch_size):
+                batch_indices = order[start:start + self.batch_size]
+                inputs = self.tokenizer([texts[i] for i in batch_indices], return_tensors="pt",
+                                        padding=True, truncation=True)
+                logits = self.model(**inputs).logits
+                predicted_labels = softmax(logits, dim=1).argmax(dim=1).tolist()
+                for index, label in zip(batch_indices, predicted_labels):
+                    predictions[index] = self.labels[label] == "chitchat"
+
+        return predictions
+
+    def warm_up(self):
+        self.is_chitchat(["Thanks team, restarting the service now."])
+
+
+model_registry.register("chitchat_classifier", ChitchatClassifier, warm_up=ChitchatClassifier.warm_up)
+
+
+def get_chitchat_classifier():
+    """
+    Returns the process-wide chitchat classifier, loading it on first use.
+    """
+    return model_registry.get("chitchat_classifier")
+
+
+def warm_up_chitchat_classifier():
+    """
+    Loads the chitchat classifier and runs one batch through it.
+    """
+    model_registry.warm_up("chitchat_classifier")
+
+
 # Chitchat removal using BERT
 def remove_chitchat(text):
     """
     Uses BERT model for binary classification to determine if input text contains chitchat.
     """
     try:
-        model_name = "bert-base-uncased"
-        tokenizer = BertTokenizer.from_pretrained(model_name)
-        model = BertForSequenceClassification.from_pretrained(
-            model_name, num_labels=2)
-
-        labels = ["non-chitchat", "chitchat"]
-        inputs = tokenizer(text, return_tensors="pt",
-                           padding=True, truncation=True)
-        logits = model(**inputs).logits
-        probabilities = softmax(logits, dim=1).detach().cpu().numpy()[0]
-
-        predicted_label = labels[int(probabilities.argmax())]
-
-        if predicted_label == "non-chitchat":
-            return text
-        else:
+        if get_chitchat_classifier().is_chitchat([text])[0]:
             return None
+        return text
+    except Exception as e:
+        # Handle exceptions during chitchat removal
+        raise Exception(f"Error during chitchat removal: {e}")
+
+
+def remove_chitchat_lines(lines):
+    """
+    Classifies all lines in one batched call and returns the non-chitchat lines in their original order.
+    """
+    try:
+        if not lines:
+            return []
+        chitchat_flags = get_chitchat_classifier().is_chitchat(lines)
+        return [line for line, is_chitchat in zip(lines, chitchat_flags) if not is_chitchat]
     except Exception as e:
         # Handle exceptions during chitchat removal
         raise Exception(f"Error during chitchat removal: {e}")
@@ -48,28 +113,16 @@ def remove_chitchat(text):
 # Remove generic information
 def remove_generic_info(text):
     """
-    Removes generic information patterns from the input text using regular expressions.
+    Removes generic information patterns (CLEANSING_RULES.GENERIC_INFO) from the input text.
     """
     try:
-        # Customize the regex patterns to match different types of generic information
-        patterns_to_remove = [
-            r"\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}",
-            r"\(\d+\)",
-            r"\[.*?\]",
-            r"[-*]+",
-            r"(\b[A-Z][a-z]*\b\s*)+\s*,",
-            r"(@|c|\+[\d-]+|\(at\))\s*:\s*[a-zA-Z0-9_.]+@[a-zA-Z0-9_.]+",
-        ]
-
-        for pattern in patterns_to_remove:
-            text = re.sub(pattern, "", text)
-
-        return text.strip()
+        return generic_info_rules.apply(text).strip()
     except Exception as e:
         # Handle exceptions during generic information removal
         raise Exception(f"Error during generic information removal: {e}")
 
 
+@traced
 def process_conversation_notes(text):
     """
     Processes conversation notes by preprocessing, removing generic information, and chitchat detection.
@@ -77,15 +130,15 @@ def process_conversation_notes(text):
     try:
         # Process conversation notes
         notes_lines = text.strip().split("\n")
-        cleaned_notes = []
-
-        for line in notes_lines:
-            if line.strip():  # Ignore empty lines
-                cleaned_line = preprocess_text(line)
-                cleaned_line = remove_generic_info(cleaned_line)
-                cleaned_chitchat_removed = remove_chitchat(cleaned_line)
-                if cleaned_chitchat_removed:
-                    cleaned_notes.append(cleaned_chitchat_removed)
+        # Ignore empty lines
+        preprocessed_lines = [preprocess_text(line) for line in notes_lines if line.strip()]
+
+        # The rules never cross a line break, so they run once over the whole note
+        cleaned_lines = [line.strip() for line in generic_info_rules.apply("\n".join(preprocessed_lines)).split("\n")]
+        cleaned_lines = [line for line in cleaned_lines if line]
+
+        # Classify every line of the note in one batched call
+        cleaned_notes = remove_chitchat_lines(cleaned_lines)
 
         # Create a cleaned text document
         cleaned_text = "\n".join(cleaned_notes)
@@ -0,0 +1,71 @@
+import os
+import logging
+import configparser
+import torch
+from transformers import BartForConditionalGeneration, BertForSequenceClassification
+
+config = configparser.ConfigParser()
+config.read("constants.ini")
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", config.get('INFERENCE', 'BACKEND'))
+ONNX_CACHE_DIR = config.get('INFERENCE', 'ONNX_CACHE_DIR')
+INFERENCE_WARM_UP = config.getboolean('INFERENCE', 'WARM_UP')
+
+INFERENCE_BACKENDS = ("pytorch", "quantized", "onnx")
+
+
+def _check_backend(backend: str):
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}, expected one of {INFERENCE_BACKENDS}")
+
+
+def _quantize(model):
+    # Dynamic int8 quantization of the Linear layers, activations stay fp32
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _load_onnx(ort_model_class, model_name: str, **kwargs):
+    '''
+    Loads an ONNX Runtime model, exporting it once into ONNX_CACHE_DIR
+    '''
+    export_dir = os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "--"))
+    if os.path.isdir(export_dir):
+        return ort_model_class.from_pretrained(export_dir)
+
+    logging.info(f"Exporting {model_name} to ONNX in {export_dir}")
+    model = ort_model_class.from_pretrained(model_name, export=True, **kwargs)
+    model.save_pretrained(export_dir)
+    return model
+
+
+def load_seq2seq_model(model_name: str, backend: str = INFERENCE_BACKEND):
+    '''
+    Loads a seq2seq model (BART) for CPU inference with the configured backend
+    '''
+    _check_backend(backend)
+    if backend == "onnx":
+        try:
+            from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        except ImportError as e:
+            raise ImportError("The onnx inference backend needs optimum[onnxruntime] installed") from e
+        return _load_onnx(ORTModelForSeq2SeqLM, model_name)
+
+    model = BartForConditionalGeneration.from_pretrained(model_name)
+    model.eval()
+    return _quantize(model) if backend == "quantized" else model
+
+
+def load_sequence_classifier(model_name: str, num_labels: int, backend: str = INFERENCE_BACKEND):
+    '''
+    Loads a sequence classification model (BERT) for CPU inference with the configured backend
+    '''
+    _check_backend(backend)
+    if backend == "onnx":
+        try:
+            from optimum.onnxruntime import ORTModelForSequenceClassification
+        except ImportError as e:
+            raise ImportError("The onnx inference backend needs optimum[onnxruntime] installed") from e
+        return _load_onnx(ORTModelForSequenceClassification, model_name, num_labels=num_labels)
+
+    model = BertForSequenceClassification.from_pretrained(model_name, num_labels=num_labels)
+    model.eval()
+    return _quantize(model) if backend == "quantized" else model
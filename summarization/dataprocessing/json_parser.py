@@ -0,0 +1,287 @@
+import json
+import time
+import threading
+from tracing import traced
+from model_classes import StructuredSummary, BuildSummary
+
+SUMMARY_MODELS = {
+    "structured_summary": StructuredSummary,
+    "build_summary_structured": BuildSummary,
+}
+CLOSERS = {"{": "}", "[": "]"}
+BARE_WORDS = {"True": "true", "False": "false", "None": "null"}
+CONTROL_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+JSON_ESCAPES = set('"\\/bfnrtu')
+
+
+class TolerantJSONParser:
+    '''
+    Extracts JSON objects from LLM output in a single pass. Text outside objects (prose, code
+    fences) is skipped, and the common defects of generated JSON are repaired on the way:
+    single-quoted strings, raw line breaks in strings, Python literals, trailing commas,
+    mismatched closing brackets and a truncated tail. Text can be fed piece by piece as it
+    is generated; close() ends the input.
+    '''
+
+    def __init__(self):
+        self.objects = []
+        self.repairs = 0
+        self._buffer = []
+        self._stack = []
+        self._quote = None
+        self._escape = False
+        self._word = []
+        # (buffer length, stack) before the last comma, to cut a truncated tail back to
+        self._safe_point = None
+
+    def feed(self, text: str):
+        for char in text:
+            if not self._stack:
+                if char == "{":
+                    self._buffer = ["{"]
+                    self._stack = ["{"]
+                    self._safe_point = None
+            elif self._quote is not None:
+                self._string_char(char)
+            else:
+                self._structure_char(char)
+
+    def _string_char(self, char):
+        buffer = self._buffer
+        if self._escape:
+            self._escape = False
+            if char == "'":
+                # Not a JSON escape, but an apostrophe whatever the quote of the string
+                buffer.append("'")
+                if self._quote == '"':
+                    self.repairs += 1
+            elif char in JSON_ESCAPES:
+                buffer.append("\\" + char)
+            else:
+                # Not a JSON escape, so the backslash is kept as a character
+                buffer.append("\\\\" + char)
+                self.repairs += 1
+        elif char == "\\":
+            self._escape = True
+        elif char == self._quote:
+            buffer.append('"')
+            self._quote = None
+        elif char == '"':
+            buffer.append('\\"')
+        elif char < " ":
+            buffer.append(CONTROL_ESCAPES.get(char) or "\\u%04x" % ord(char))
+            self.repairs += 1
+        else:
+            buffer.append(char)
+
+    def _flush_word(self):
+        word = "".join(self._word)
+        self._word = []
+        if word in BARE_WORDS:
+            word = BARE_WORDS[word]
+            self.repairs += 1
+        self._buffer.append(word)
+
+    def _strip_trailing_comma(self):
+        buffer = self._buffer
+        while buffer and buffer[-1].isspace():
+            buffer.pop()
+        if buffer and buffer[-1] == ",":
+            buffer.pop()
+            self.repairs += 1
+
+    def _structure_char(self, char):
+        if char.isalnum() or char in "_.-+":
+            self._word.append(char)
+            return
+        if self._word:
+            self._flush_word()
+
+        buffer = self._buffer
+        if char in "\"'":
+            if char == "'":
+                self.repairs += 1
+            buffer.append('"')
+            self._quote = char
+        elif char in "{[":
+            buffer.append(char)
+            self._stack.append(char)
+        elif char in "}]":
+            opener = "{" if char == "}" else "["
+            if opener not in self._stack:
+                # A stray closing bracket
+                self.repairs += 1
+                return
+            # Brackets left open inside this one are closed first
+            while True:
+                self._strip_trailing_comma()
+                top = self._stack.pop()
+                buffer.append(CLOSERS[top])
+                if top == opener:
+                    break
+                self.repairs += 1
+            if not self._stack:
+                self.objects.append("".join(buffer))
+                self._buffer = []
+        elif char == ",":
+            self._safe_point = (len(buffer), list(self._stack))
+            buffer.append(char)
+        else:
+            buffer.append(char)
+
+    def _closed_tail(self, buffer: list, stack: list) -> str:
+        return "".join(buffer) + "".join(CLOSERS[opener] for opener in reversed(stack))
+
+    def close(self):
+        '''
+        Ends the input; an object cut off by the end of the text is closed and kept if it can be repaired
+        '''
+        if not self._stack:
+            return
+        self.repairs += 1
+        if self._word:
+            self._flush_word()
+        if self._quote is not None:
+            self._buffer.append('"')
+            self._quote = None
+        self._strip_trailing_comma()
+        if self._buffer and self._buffer[-1] == ":":
+            # A key whose value was cut off
+            self._buffer.append('""')
+
+        candidates = [self._closed_tail(self._buffer, self._stack)]
+        if self._safe_point is not None:
+            length, stack = self._safe_point
+            candidates.append(self._closed_tail(self._buffer[:length], stack))
+        for candidate in candidates:
+            try:
+                json.loads(candidate)
+            except json.JSONDecodeError:
+                continue
+            self.objects.append(candidate)
+            break
+        self._buffer = []
+        self._stack = []
+
+    def parsed_objects(self) -> list:
+        '''
+        The extracted objects that are valid JSON, as dicts
+        '''
+        parsed = []
+        for text in self.objects:
+            try:
+                value = json.loads(text)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(value, dict):
+                parsed.append(value)
+        return parsed
+
+
+def parse_json_objects(text: str) -> list:
+    parser = TolerantJSONParser()
+    parser.feed(text)
+    parser.close()
+    return parser.parsed_objects()
+
+
+def field_name(key: str) -> str:
+    return key.strip().lower().replace(" ", "_").replace("-", "_")
+
+
+def field_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return ", ".join(field_text(item) for item in value)
+    if isinstance(value, dict):
+        return ", ".join(f"{key}: {field_text(item)}" for key, item in value.items())
+    return value if isinstance(value, str) else str(value)
+
+
+def collect_fields(data: dict, fields, values: dict):
+    '''
+    Copies the keys of data that name a field into values; objects nested under other keys are
+    searched too, and the first non-empty value of a field wins
+    '''
+    for key, value in data.items():
+        name = field_name(key)
+        if name in fields:
+            if not values.get(name):
+                values[name] = field_text(value)
+        elif isinstance(value, dict):
+            collect_fields(value, fields, values)
+
+
+class StructuredOutputMetrics:
+    '''
+    Parse outcomes and latencies of structured summaries, including "fix JSON" retries
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.parsed = 0
+        self.repaired = 0
+        self.parse_failures = 0
+        self.parse_seconds = 0.0
+        self.fix_attempts = 0
+        self.fix_succeeded = 0
+        self.fix_seconds = 0.0
+        self.failed = 0
+
+    def record_parse(self, seconds: float, succeeded: bool, repaired: bool):
+        with self._lock:
+            self.parsed += 1
+            self.parse_seconds += seconds
+            self.repaired += 1 if succeeded and repaired else 0
+            self.parse_failures += 0 if succeeded else 1
+
+    def record_fix(self, seconds: float, succeeded: bool):
+        with self._lock:
+            self.fix_attempts += 1
+            self.fix_seconds += seconds
+            self.fix_succeeded += 1 if succeeded else 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failed += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            summaries = self.parsed - self.fix_attempts
+            return {
+                "parsed": self.parsed,
+                "repaired": self.repaired,
+                "parse_failures": self.parse_failures,
+                "fix_attempts": self.fix_attempts,
+                "fix_succeeded": self.fix_succeeded,
+                "failed": self.failed,
+                "parse_failure_rate": round(self.parse_failures / self.parsed, 4) if self.parsed else 0.0,
+                "failure_rate": round(self.failed / summaries, 4) if summaries > 0 else 0.0,
+                "average_parse_ms": round(self.parse_seconds / self.parsed * 1000, 3) if self.parsed else 0.0,
+                "average_fix_ms": round(self.fix_seconds / self.fix_attempts * 1000, 3) if self.fix_attempts else 0.0,
+            }
+
+
+structured_output_metrics = StructuredOutputMetrics()
+
+
+@traced
+def parse_summary_model(text: str, summary_type: str):
+    '''
+    Parses LLM output into the StructuredSummary or BuildSummary of summary_type.
+    Returns None when no JSON object with at least one non-empty field can be recovered.
+    '''
+    start = time.perf_counter()
+    parser = TolerantJSONParser()
+    parser.feed(text)
+    parser.close()
+    model = SUMMARY_MODELS[summary_type]
+    values = {}
+    # Several objects (one per section, or a repeated answer) are merged
+    for data in parser.parsed_objects():
+        collect_fields(data, model.__fields__, values)
+
+    succeeded = any(values.values())
+    structured_output_metrics.record_parse(time.perf_counter() - start, succeeded, parser.repairs > 0)
+    return model(**values) if succeeded else None
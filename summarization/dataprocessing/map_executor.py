@@ -0,0 +1,175 @@
+import time
+import asyncio
+import random
+import logging
+import contextvars
+import configparser
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+config = configparser.ConfigParser()
+config.read("constants.ini")
+MAP_MAX_CONCURRENCY = int(config.get('MAP_REDUCE', 'MAX_CONCURRENCY'))
+MAP_CHUNK_TIMEOUT_SECONDS = float(config.get('MAP_REDUCE', 'CHUNK_TIMEOUT_SECONDS'))
+MAP_MAX_RETRIES = int(config.get('MAP_REDUCE', 'MAX_RETRIES'))
+MAP_RETRY_BACKOFF_SECONDS = float(config.get('MAP_REDUCE', 'RETRY_BACKOFF_SECONDS'))
+
+
+# How often imap checks whether queued attempts have started, so their deadlines can be set
+QUEUED_POLL_SECONDS = 0.1
+# Timeouts and transport errors (socket errors, requests' errors and the HTTP integration's are OSErrors) are
+# retried. Anything else, such as the LLM client's circuit-open and rate-limited CustomExceptions, is raised
+# at once: retrying would only add load to a platform that is down or throttling.
+TRANSIENT_ERRORS = (TimeoutError, asyncio.TimeoutError, OSError)
+
+
+def is_transient(error: Exception) -> bool:
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+class _Attempt:
+    '''
+    One submitted try of an item. started is set by the worker thread when the attempt begins running,
+    so time spent queued behind other work on the pool does not count against the timeout.
+    '''
+    __slots__ = ("index", "delay", "started")
+
+    def __init__(self, index: int, delay: float):
+        self.index = index
+        self.delay = delay
+        self.started = None
+
+    def deadline(self, timeout: float):
+        return None if self.started is None else self.started + self.delay + timeout
+
+
+def _delayed_call(fn, item, attempt):
+    attempt.started = time.monotonic()
+    if attempt.delay > 0:
+        time.sleep(attempt.delay)
+    return fn(item)
+
+
+class MapExecutor:
+    '''
+    Applies a function to many items on a shared thread pool with a concurrency limit,
+    a per-item timeout and retries of transient errors with exponential backoff and full jitter.
+    '''
+
+    def __init__(self, max_concurrency: int = MAP_MAX_CONCURRENCY, timeout: float = MAP_CHUNK_TIMEOUT_SECONDS,
+                 max_retries: int = MAP_MAX_RETRIES, backoff: float = MAP_RETRY_BACKOFF_SECONDS,
+                 name: str = "chunk-map"):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=name)
+
+    def _retry_delay(self, attempt: int) -> float:
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    def _submit(self, fn, item, attempt):
+        # Run in a copy of the caller's context so tracing spans keep their parent
+        return self._executor.submit(contextvars.copy_context().run, _delayed_call, fn, item, attempt)
+
+    def imap(self, fn, items, return_exceptions: bool = False, window: int = None):
+        '''
+        Yields (index, result) pairs as items complete. At most window items (max_concurrency by
+        default) of this call are on the pool at a time, and an attempt's timeout starts when it
+        starts running. Raises the last error of an item once it has failed max_retries + 1 times,
+        or at once when it is not transient, or yields it as the item's result when return_exceptions is set.
+        '''
+        items = list(items)
+        window = max(1, window or self.max_concurrency)
+        attempts = [0] * len(items)
+        waiting = deque((index, 0.0) for index in range(len(items)))
+        pending = {}
+
+        try:
+            while waiting or pending:
+                while waiting and len(pending) < window:
+                    index, delay = waiting.popleft()
+                    attempt = _Attempt(index, delay)
+                    pending[self._submit(fn, items[index], attempt)] = attempt
+
+                deadlines = [attempt.deadline(self.timeout) for attempt in pending.values()]
+                started = [deadline for deadline in deadlines if deadline is not None]
+                wait_timeout = max(0, min(started) - time.monotonic()) if started else None
+                if len(started) < len(deadlines):
+                    wait_timeout = min(wait_timeout, QUEUED_POLL_SECONDS) if wait_timeout is not None \
+                        else QUEUED_POLL_SECONDS
+                done, _ = wait(pending, timeout=wait_timeout, return_when=FIRST_COMPLETED)
+
+                failed = []
+                for future in done:
+                    index = pending.pop(future).index
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        failed.append((index, e))
+                        continue
+                    yield index, result
+
+                # Attempts still running past their deadline are abandoned and retried
+                now = time.monotonic()
+                for future, attempt in list(pending.items()):
+                    deadline = attempt.deadline(self.timeout)
+                    if deadline is not None and deadline <= now:
+                        del pending[future]
+                        future.cancel()
+                        failed.append((attempt.index,
+                                       TimeoutError(f"chunk {attempt.index} timed out after {self.timeout}s")))
+
+                for index, error in failed:
+                    attempts[index] += 1
+                    if attempts[index] > self.max_retries or not is_transient(error):
+                        if return_exceptions:
+                            yield index, error
+                            continue
+                        raise error
+                    delay = self._retry_delay(attempts[index] - 1)
+                    logging.warning(f"Retrying chunk {index} in {delay:.2f}s after error: {error}")
+                    waiting.appendleft((index, delay))
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def map(self, fn, items) -> list:
+        '''
+        Applies fn to every item concurrently and returns the results in input order
+        '''
+        items = list(items)
+        results = [None] * len(items)
+        for index, result in self.imap(fn, items):
+            results[index] = result
+        return results
+
+    async def amap(self, fn, items) -> list:
+        '''
+        Async counterpart of map for a coroutine function: awaits fn(item) for every item with at most
+        max_concurrency in flight and the same per-item timeout and retries. Results are in input order.
+        '''
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(index, item):
+            for attempt in range(self.max_retries + 1):
+                try:
+                    async with semaphore:
+                        return await asyncio.wait_for(fn(item), self.timeout)
+                except Exception as e:
+                    if attempt >= self.max_retries or not is_transient(e):
+                        raise
+                    delay = self._retry_delay(attempt)
+                    logging.warning(f"Retrying chunk {index} in {delay:.2f}s after error: {e!r}")
+                    await asyncio.sleep(delay)
+
+        tasks = [asyncio.ensure_future(run(index, item)) for index, item in enumerate(items)]
+        try:
+            return await asyncio.gather(*tasks)
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            raise
+
+
+chunk_map_executor = MapExecutor()
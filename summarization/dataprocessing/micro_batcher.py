@@ -0,0 +1,97 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+
+
+class BatchMetrics:
+    '''
+    Batch size and queue delay statistics of a MicroBatcher
+    '''
+
+    def __init__(self, max_batch_size: int):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.batch_size_counts = [0] * (max_batch_size + 1)
+        self.queue_delay_total = 0.0
+        self.queue_delay_max = 0.0
+
+    def record(self, batch_size: int, queue_delays: list):
+        with self._lock:
+            self.batches += 1
+            self.items += batch_size
+            self.batch_size_counts[batch_size] += 1
+            self.queue_delay_total += sum(queue_delays)
+            self.queue_delay_max = max(self.queue_delay_max, max(queue_delays))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "average_batch_size": round(self.items / self.batches, 3) if self.batches else 0.0,
+                "batch_size_counts": {size: count for size, count in enumerate(self.batch_size_counts) if count},
+                "average_queue_delay_ms": round(self.queue_delay_total / self.items * 1000, 3) if self.items else 0.0,
+                "max_queue_delay_ms": round(self.queue_delay_max * 1000, 3),
+            }
+
+
+class MicroBatcher:
+    '''
+    Collects concurrent requests for up to max_wait_ms (or until max_batch_size requests are waiting),
+    runs batch_fn once on the whole batch on a background thread and hands each caller its own result.
+    batch_fn takes a list of items and returns a list of results in the same order.
+    '''
+
+    def __init__(self, batch_fn, max_batch_size: int, max_wait_ms: float, name: str = "micro-batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self.metrics = BatchMetrics(max_batch_size)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def submit(self, item):
+        '''
+        Queues item for the next batch and blocks until its result is ready
+        '''
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future.result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            self.metrics.record(len(batch), [started - enqueued for _, _, enqueued in batch])
+            try:
+                results = self.batch_fn([item for item, _, _ in batch])
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                logging.error(f"Error while running batch in {self.name}: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
@@ -0,0 +1,71 @@
+from fastapi.concurrency import run_in_threadpool
+
+
+class Step:
+    '''
+    One unit of work yielded by a pipeline generator. The pipeline itself only decides what to do next;
+    the sync driver runs the step with fn and the async driver awaits afn, so both share one plan.
+    events_fn, when given, replaces fn in the sync driver: a generator that yields (event, data) pairs
+    (progress or partial events) and returns the step's result.
+    '''
+
+    def __init__(self, fn, afn, *args, events_fn=None, **kwargs):
+        self.fn = fn
+        self.afn = afn
+        self.events_fn = events_fn
+        self.args = args
+        self.kwargs = kwargs
+
+    def run_events(self):
+        if self.events_fn is not None:
+            return (yield from self.events_fn(*self.args, **self.kwargs))
+        return self.fn(*self.args, **self.kwargs)
+
+    async def arun(self):
+        return await self.afn(*self.args, **self.kwargs)
+
+
+def blocking(fn, *args, **kwargs) -> Step:
+    '''
+    Step for CPU work (tokenizing, pre-reduction, cache lookups): inline when sync, in the threadpool when async
+    '''
+    return Step(fn, lambda *a, **k: run_in_threadpool(fn, *a, **k), *args, **kwargs)
+
+
+def iter_events(steps):
+    '''
+    Sync driver: runs the steps of a pipeline in the calling thread and yields the (event, data)
+    pairs they report. Returns the pipeline's result.
+    '''
+    value = None
+    while True:
+        try:
+            step = steps.send(value)
+        except StopIteration as stop:
+            return stop.value
+        value = yield from step.run_events()
+
+
+def run_steps(steps):
+    '''
+    Sync driver without events: returns the pipeline's result
+    '''
+    events = iter_events(steps)
+    while True:
+        try:
+            next(events)
+        except StopIteration as stop:
+            return stop.value
+
+
+async def arun_steps(steps):
+    '''
+    Async driver: awaits every step of the pipeline on the caller's event loop and returns the result
+    '''
+    value = None
+    while True:
+        try:
+            step = steps.send(value)
+        except StopIteration as stop:
+            return stop.value
+        value = await step.arun()
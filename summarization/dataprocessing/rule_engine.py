@@ -0,0 +1,57 @@
+import re
+import configparser
+
+config = configparser.ConfigParser()
+config.read("constants.ini")
+
+
+def config_lines(section: str, option: str) -> list:
+    '''
+    Reads a multi-line option (one rule per line) without interpolation, so regexes can use "%"
+    '''
+    return [line.strip() for line in config.get(section, option, raw=True).splitlines() if line.strip()]
+
+
+def _remove_if_required(match):
+    return "" if match.group("require") is not None else match.group(0)
+
+
+class RuleEngine:
+    '''
+    Removal rules compiled once and applied in their configured order. A rule whose pattern
+    defines a group named "require" only removes matches in which that group participated;
+    other matches are left in place. This lets a rule consume a whole candidate run once
+    instead of the regex engine retrying it from every position inside the run.
+    '''
+
+    def __init__(self, patterns: list, flags: int = 0):
+        self.rules = []
+        for pattern in patterns:
+            rule = re.compile(pattern, flags)
+            self.rules.append((rule, _remove_if_required if "require" in rule.groupindex else ""))
+
+    def apply(self, text: str) -> str:
+        for rule, replacement in self.rules:
+            text = rule.sub(replacement, text)
+        return text
+
+
+class LineFilter:
+    '''
+    Drops every line that contains one of the fragments, using a single alternation
+    '''
+
+    def __init__(self, fragments: list):
+        self.pattern = re.compile("|".join(re.escape(fragment) for fragment in fragments))
+
+    def apply(self, text: str) -> str:
+        search = self.pattern.search
+        return "\n".join(line for line in text.split("\n") if not search(line))
+
+
+# Rules never match a line break, so they can run once over a whole document of single-line notes
+generic_info_rules = RuleEngine(config_lines('CLEANSING_RULES', 'GENERIC_INFO'))
+email_line_filter = LineFilter(config_lines('CLEANSING_RULES', 'EMAIL_LINES'))
+email_header_rule = re.compile(config.get('CLEANSING_RULES', 'EMAIL_HEADER', raw=True), re.DOTALL)
+boilerplate_rule = re.compile("|".join(re.escape(fragment)
+                                       for fragment in config_lines('CLEANSING_RULES', 'BOILERPLATE')))
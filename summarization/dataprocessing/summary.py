@@ -1,153 +1,224 @@
 import os
-import re
+import logging
 from utils import Utils
-from model_classes import StructuredSummary,BuildSummary
 from fastapi import HTTPException
-import json
 import platform_config
-from config import log_entry_exit
+from tracing import traced
+from metrics import timed
+from dataprocessing.map_executor import chunk_map_executor
+from dataprocessing.pipeline import Step, run_steps, arun_steps
+from llm_client import llm_client
+from serving import cpu_pool
+from dataprocessing.rule_engine import email_line_filter
+from dataprocessing.json_parser import parse_summary_model, structured_output_metrics, SUMMARY_MODELS
+import configparser
+import time
+
+config = configparser.ConfigParser()
+config.read("constants.ini")
+FIX_JSON_ENABLED = config.getboolean('STRUCTURED_OUTPUT', 'FIX_JSON_RETRY')
+FIX_JSON_PROMPT = config.get('STRUCTURED_OUTPUT', 'FIX_JSON_PROMPT').strip()
 
 class Summary:  
 
-    @log_entry_exit
+    @traced
+    @timed("generate_text")
+    def generate_text(summary_type: str, prompts: list, params) -> list:
+        """
+        Calls the LLM integration through the shared client (response cache, coalescing, rate limiting).
+        """
+        return llm_client.generate(summary_type, prompts, params)
+
+    @traced
+    @timed("generate_text")
+    async def agenerate_text(summary_type: str, prompts: list, params) -> list:
+        """
+        Async counterpart of generate_text; the event loop is not blocked while the LLM works.
+        """
+        return await llm_client.agenerate(summary_type, prompts, params)
+
+    # Each operation below is planned once, as a generator of steps (dataprocessing.pipeline); the
+    # sync method runs the plan with run_steps and its async counterpart awaits it with arun_steps
+
+    def llm_step(summary_type: str, prompts, params) -> Step:
+        return Step(Summary.generate_text, Summary.agenerate_text, summary_type, prompts, params)
+
+    def clean_step(texts: list) -> Step:
+        return Step(cpu_pool.call, cpu_pool.acall, Utils.clean_text, texts, stage="clean_text")
+
+    def finish_summary_steps(llm_response: list, summary_type: str):
+        summary = Utils.process_response(llm_response)
+
+        if summary_type == "structured_summary" or summary_type == "build_summary_structured":
+            return (yield from Summary.structured_summary_steps(summary, summary_type))
+        else:
+            return summary
+
+    def finish_summary(llm_response: list, summary_type: str):
+        return run_steps(Summary.finish_summary_steps(llm_response, summary_type))
+
+    def generate_summary_steps(worknotes: list, summary_type: str):
+        cleaned_worknotes = yield Summary.clean_step(worknotes)
+
+        generated_prompt_list = platform_config.promptbuilders.generate_prompts(summary_type, cleaned_worknotes)
+        params = platform_config.integration.fetch_default_params()
+        llm_response = yield Summary.llm_step(summary_type, generated_prompt_list, params)
+
+        return (yield from Summary.finish_summary_steps(llm_response, summary_type))
+
+    @traced
     def generate_summary(worknotes : list, summary_type: str) -> str :
         """
         Generates a summary of the input worknote using Llama summarization.
         """
+        return run_steps(Summary.generate_summary_steps(worknotes, summary_type))
 
-        try:
-            cleaned_worknotes = Utils.clean_text(worknotes)
+    @traced
+    async def agenerate_summary(worknotes: list, summary_type: str):
+        """
+        Async counterpart of generate_summary: spaCy cleaning runs in the CPU pool (or the threadpool), the LLM call on the event loop.
+        """
+        return await arun_steps(Summary.generate_summary_steps(worknotes, summary_type))
+
+    def iter_chunk_summaries(chunks: list, summary_type: str, clean: bool = True):
+        """
+        Generates one summary per chunk (map phase), with the LLM calls for all chunks running concurrently.
+        Yields (chunk index, summary) pairs as chunks complete.
+        """
+        cleaned_chunks = cpu_pool.call(Utils.clean_text, chunks, stage="clean_text") if clean else chunks
+
+        generated_prompt_list = platform_config.promptbuilders.generate_prompts(summary_type, cleaned_chunks)
+        params = platform_config.integration.fetch_default_params()
 
-            generated_prompt_list = platform_config.promptbuilders.generate_prompts(summary_type, cleaned_worknotes)
-            params = platform_config.integration.fetch_default_params()
-            llm_response = platform_config.integration.generate_text(
-                generated_prompt_list,  params
-                )
-            
-            summary = Utils.process_response(llm_response)
+        def summarize_prompt(prompt):
+            return Summary.generate_text(summary_type, [prompt], params)
 
-            if summary_type == "structured_summary" or summary_type == "build_summary_structured":
-                return Summary.structured_summary(summary, summary_type)
-            else:
-                return summary
+        for index, llm_response in chunk_map_executor.imap(summarize_prompt, generated_prompt_list):
+            yield index, Utils.process_response(llm_response)
+
+    @traced
+    def generate_chunk_summaries(chunks: list, summary_type: str, clean: bool = True) -> list:
+        """
+        Generates one summary per chunk (map phase). Summaries are returned in chunk order.
+        """
+
+        try:
+            summaries = [None] * len(chunks)
+            for index, summary in Summary.iter_chunk_summaries(chunks, summary_type, clean):
+                summaries[index] = summary
+            return summaries
 
         except Exception as e:
             raise e
-        
-    @log_entry_exit
-    def summarize_rootcause_from_telemetry(anomaly: str, metric: str, error: str, summary_type: str) -> str:
+
+    @traced
+    async def agenerate_chunk_summaries(chunks: list, summary_type: str, clean: bool = True) -> list:
         """
-        Generates a summary of the root cause from telemetry data
+        Async counterpart of generate_chunk_summaries. Summaries are returned in chunk order.
         """
+        cleaned_chunks = await cpu_pool.acall(Utils.clean_text, chunks, stage="clean_text") if clean else chunks
 
-        try:
+        generated_prompt_list = platform_config.promptbuilders.generate_prompts(summary_type, cleaned_chunks)
+        params = platform_config.integration.fetch_default_params()
 
-            generated_prompt = platform_config.promptbuilders.generate_telemetry_prompt(summary_type=summary_type,anomaly=anomaly,metric=metric,error=error)
+        async def summarize_prompt(prompt):
+            return Utils.process_response(await Summary.agenerate_text(summary_type, [prompt], params))
 
-            params = platform_config.integration.fetch_params_telemetry_summary()
+        return await chunk_map_executor.amap(summarize_prompt, generated_prompt_list)
 
-            bam_response = platform_config.integration.generate_text(
-                generated_prompt, params
-            )
+    def rootcause_from_telemetry_steps(anomaly: str, metric: str, error: str, summary_type: str):
+        generated_prompt = platform_config.promptbuilders.generate_telemetry_prompt(summary_type=summary_type,anomaly=anomaly,metric=metric,error=error)
 
-            summary = bam_response[0]
+        params = platform_config.integration.fetch_params_telemetry_summary()
 
-            if summary_type == "structured_summary":
-                return Summary.structured_summary(summary)
+        bam_response = yield Summary.llm_step(summary_type, generated_prompt, params)
 
-            else:
-                return summary
+        summary = bam_response[0]
 
-        except Exception as e:
-            raise e
+        if summary_type == "structured_summary":
+            return (yield from Summary.structured_summary_steps(summary, summary_type))
 
-    @log_entry_exit
+        else:
+            return summary
+
+    @traced
+    def summarize_rootcause_from_telemetry(anomaly: str, metric: str, error: str, summary_type: str) -> str:
+        """
+        Generates a summary of the root cause from telemetry data
+        """
+        return run_steps(Summary.rootcause_from_telemetry_steps(anomaly, metric, error, summary_type))
+
+    @traced
+    async def asummarize_rootcause_from_telemetry(anomaly: str, metric: str, error: str, summary_type: str) -> str:
+        """
+        Async counterpart of summarize_rootcause_from_telemetry
+        """
+        return await arun_steps(Summary.rootcause_from_telemetry_steps(anomaly, metric, error, summary_type))
+
+    @traced
     def remove_email_parts(email_text):
-        subject_pattern = rf".*{re.escape('Subject:')}.*"
-        greeting_pattern = rf".*{re.escape('Dear')}.*"
-        signature_pattern_1 = rf".*{re.escape('Best regards')}.*"
-        signature_pattern_2 = rf".*{re.escape('Your Name')}.*"
-
-        # Split the input text into lines
-        lines = email_text.split("\n")
-        filtered_lines = [
-            line for line in lines if not re.search(subject_pattern, line)]
-        output_text = "\n".join(filtered_lines)
-
-        lines = output_text.split("\n")
-        filtered_lines = [
-            line for line in lines if not re.search(greeting_pattern, line)]
-        output_text = "\n".join(filtered_lines)
-
-        lines = output_text.split("\n")
-        filtered_lines = [
-            line for line in lines if not re.search(signature_pattern_1, line)
-        ]
-        output_text = "\n".join(filtered_lines)
-
-        lines = output_text.split("\n")
-        filtered_lines = [
-            line for line in lines if not re.search(signature_pattern_2, line)
-        ]
-        output_text = "\n".join(filtered_lines)
-
-        # Print the modified text
-        print(output_text)
-
-        # Print the modified text
-        # print(output_text)
-        return output_text
-
-    @log_entry_exit
+        # Drops subject, greeting and signature lines (CLEANSING_RULES.EMAIL_LINES) in one pass
+        return email_line_filter.apply(email_text)
+
+    def major_incident_communication_steps(worknote: str):
+        generated_prompt = platform_config.promptbuilders.generate_prompt(
+            "major_incident_communication", worknote
+        )
+
+        params = platform_config.integration.fetch_params_major_incident_communication()
+
+        bam_response = yield Summary.llm_step("major_incident_communication", generated_prompt, params)
+
+        email_body = bam_response[0]
+        email_body = Summary.remove_email_parts(email_body)
+        return email_body
+
+    @traced
     def major_incident_communication(worknote: str):
         """
         major incident communication of the input worknote using Llama.
         """
+        return run_steps(Summary.major_incident_communication_steps(worknote))
 
-        try:
-            generated_prompt = platform_config.promptbuilders.generate_prompt(
-                "major_incident_communication", worknote
-            )
-
-            params = platform_config.integration.fetch_params_major_incident_communication()
-
-            bam_response = platform_config.integration.generate_text(
-                generated_prompt, params
-            )
+    @traced
+    async def amajor_incident_communication(worknote: str):
+        """
+        Async counterpart of major_incident_communication
+        """
+        return await arun_steps(Summary.major_incident_communication_steps(worknote))
 
-            email_body = bam_response[0]
-            email_body = Summary.remove_email_parts(email_body)
-            return email_body
+    def fix_json_request(summary: str, summary_type: str):
+        """
+        Prompt and params of the "fix JSON" call, which only rewrites an unparsable response
+        """
+        fields = ", ".join(SUMMARY_MODELS[summary_type].__fields__)
+        prompt = FIX_JSON_PROMPT.format(fields=fields, response=summary)
+        return [prompt], platform_config.integration.fetch_default_params()
+
+    def invalid_structured_summary(summary: str):
+        structured_output_metrics.record_failure()
+        msg = "The watsonx model failed to generate a valid response."
+        error_response = {"detail": msg}
+        logging.warning(f"{msg} Response: {summary}")
+        return HTTPException(status_code=500, detail=error_response)
+
+    @traced
+    @timed("structured_summary")
+    def structured_summary_steps(summary: str, summary_type: str):
+        """
+        Parses the LLM response into a StructuredSummary or BuildSummary. When no JSON can be
+        recovered, only the response is sent back for a "fix JSON" rewrite, not the whole prompt.
+        """
+        structured_summary = parse_summary_model(summary, summary_type)
 
-        except Exception as e:
-            raise e
+        if structured_summary is None and FIX_JSON_ENABLED:
+            start = time.perf_counter()
+            prompts, params = Summary.fix_json_request(summary, summary_type)
+            fixed_response = yield Summary.llm_step("fix_json", prompts, params)
+            structured_summary = parse_summary_model(Utils.process_response(fixed_response), summary_type)
+            structured_output_metrics.record_fix(time.perf_counter() - start, structured_summary is not None)
 
-    @log_entry_exit
-    def structured_summary(summary: str, summary_type:str) :
-        json_summary = Utils.convert_to_valid_json(summary)
-
-        json_summary = json.loads(json_summary)
-
-        if summary_type == 'structured_summary':
-            structured_summary = StructuredSummary()
-        elif summary_type == "build_summary_structured":
-            structured_summary = BuildSummary()
-
-        for key, value in json_summary.items():
-            key_normalized = key.lower().replace(" ", "_")
-            if isinstance(value, list):
-                value = ", ".join(value)
-            if hasattr(structured_summary, key_normalized):
-                setattr(structured_summary, key_normalized, value)
-
-        all_empty = all(
-            value == "" for value in structured_summary.__dict__.values())
-
-        if all_empty:
-            msg = "The watsonx model failed to generate a valid response."
-            error_response = {"detail": msg}
-            print(msg, json_summary)
-            return HTTPException(status_code=500, detail=error_response)
-        # JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content=error_response)
+        if structured_summary is None:
+            return Summary.invalid_structured_summary(summary)
 
         return structured_summary
@@ -0,0 +1,426 @@
+import os
+import re
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+import configparser
+from datetime import datetime, timezone
+from collections import Counter
+from tracing import traced
+from response_cache import ResponseCache
+from dataprocessing.summary import Summary
+from dataprocessing.map_executor import chunk_map_executor
+from dataprocessing.build_log_reducer import line_template
+from pydantic import ValidationError
+from model_classes import TelemetryEvent, TelemetryGroupSummary, StatusEnum, CustomException, ExceptionMessageEnum
+
+config = configparser.ConfigParser()
+config.read("constants.ini")
+TELEMETRY_WINDOW_SECONDS = int(config.get('TELEMETRY_GROUPS', 'WINDOW_SECONDS'))
+TELEMETRY_QUIET_SECONDS = float(config.get('TELEMETRY_GROUPS', 'QUIET_SECONDS'))
+TELEMETRY_METRIC_SIMILARITY = float(config.get('TELEMETRY_GROUPS', 'METRIC_SIMILARITY'))
+TELEMETRY_MAX_TEMPLATES = int(config.get('TELEMETRY_GROUPS', 'MAX_TEMPLATES'))
+TELEMETRY_PROMPT_LINES = int(config.get('TELEMETRY_GROUPS', 'PROMPT_LINES'))
+TELEMETRY_MAX_GROUPS = int(config.get('TELEMETRY_GROUPS', 'MAX_GROUPS'))
+TELEMETRY_MAX_OPEN_GROUPS_PER_WINDOW = int(config.get('TELEMETRY_GROUPS', 'MAX_OPEN_GROUPS_PER_WINDOW'))
+TELEMETRY_RETENTION_SECONDS = int(config.get('TELEMETRY_GROUPS', 'RETENTION_SECONDS'))
+TELEMETRY_FLUSH_INTERVAL_SECONDS = float(config.get('TELEMETRY_GROUPS', 'FLUSH_INTERVAL_SECONDS'))
+TELEMETRY_CACHE_MAX_ENTRIES = int(config.get('TELEMETRY_GROUPS', 'CACHE_MAX_ENTRIES'))
+TELEMETRY_CACHE_TTL_SECONDS = int(config.get('TELEMETRY_GROUPS', 'CACHE_TTL_SECONDS'))
+TELEMETRY_CACHE_DISK_PATH = os.getenv("TELEMETRY_CACHE_DISK_PATH", config.get('TELEMETRY_GROUPS', 'CACHE_DISK_PATH'))
+TELEMETRY_SUMMARY_TYPE = "llama_telemetry_summary"
+
+METRIC_LABEL_PATTERN = re.compile(r'(\w+)\s*=\s*"([^"]*)"')
+METRIC_NAME_SEPARATORS = re.compile(r"[_.:/\-]+")
+SERVICE_LABELS = ("service", "service_name", "app", "job")
+OTHER_TEMPLATES = "<other>"
+
+
+def metric_name(metric: str) -> str:
+    return metric.split("{", 1)[0].strip().split(" ", 1)[0]
+
+
+def metric_tokens(name: str) -> frozenset:
+    return frozenset(token for token in METRIC_NAME_SEPARATORS.split(name.lower()) if token)
+
+
+def similarity(tokens: frozenset, other: frozenset) -> float:
+    if not tokens and not other:
+        return 1.0
+    return len(tokens & other) / len(tokens | other)
+
+
+def event_service(event: TelemetryEvent) -> str:
+    '''
+    The service of an event, else the service (or app, job) label of its metric
+    '''
+    if event.service:
+        return event.service.strip().lower()
+    labels = dict(METRIC_LABEL_PATTERN.findall(event.metric))
+    for label in SERVICE_LABELS:
+        if labels.get(label):
+            return labels[label].strip().lower()
+    return "unknown"
+
+
+def parse_event_line(line: bytes, line_number: int):
+    if not line.strip():
+        return None
+    try:
+        return TelemetryEvent(**json.loads(line))
+    except (ValueError, TypeError, ValidationError) as e:
+        raise CustomException(
+            error_code=400, message=ExceptionMessageEnum.INVALID_NDJSON_LINE.value.format(line=line_number, error=e))
+
+
+async def parse_event_stream(chunks):
+    '''
+    Parses an NDJSON upload of TelemetryEvent objects line by line as the chunks of the body arrive
+    '''
+    buffer = b""
+    line_number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            event = parse_event_line(line, line_number)
+            if event is not None:
+                yield event
+    event = parse_event_line(buffer, line_number + 1)
+    if event is not None:
+        yield event
+
+
+def iso_time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class Templates:
+    '''
+    Lines counted by template (numbers and ids masked), with the first line seen of each template
+    as its example. Beyond max_templates, new templates are counted together.
+    '''
+
+    def __init__(self, max_templates: int = TELEMETRY_MAX_TEMPLATES):
+        self.max_templates = max_templates
+        self.counts = Counter()
+        self.examples = {}
+
+    def add(self, text: str, template: str = None):
+        text = text.strip()
+        if not text:
+            return
+        template = template or line_template(text)
+        if template not in self.counts and len(self.counts) >= self.max_templates:
+            template = OTHER_TEMPLATES
+        self.counts[template] += 1
+        self.examples.setdefault(template, text)
+
+    def signature(self, limit: int) -> list:
+        return sorted(template for template, _ in self.counts.most_common(limit))
+
+    def render(self, limit: int, counts: bool = True) -> str:
+        lines = []
+        for template, count in self.counts.most_common(limit):
+            example = "other lines" if template == OTHER_TEMPLATES else self.examples[template]
+            lines.append(example if count == 1 or not counts else f"{example} [x{count}]")
+        return "\n".join(lines)
+
+
+class TelemetryGroup:
+    '''
+    Anomaly events of one service within one time window whose metrics are similar
+    '''
+
+    def __init__(self, service: str, window_start: float, window_seconds: int, tokens: frozenset):
+        self.group_id = str(uuid.uuid4())
+        self.service = service
+        self.window_start = window_start
+        self.window_end = window_start + window_seconds
+        self.tokens = tokens
+        self.anomalies = Templates()
+        self.metrics = Templates()
+        self.errors = Templates()
+        self.event_count = 0
+        self.first_event = None
+        self.last_event = None
+        self.last_received = time.monotonic()
+        self.closed_at = None
+        self.status = StatusEnum.IN_PROGRESS
+        self.summary = None
+        self.cached = False
+        self.signature = None
+
+    def add(self, event: TelemetryEvent, timestamp: float):
+        self.anomalies.add(event.anomaly)
+        # Metric lines of one series only differ in their value, so the series name is the template
+        self.metrics.add(event.metric, metric_name(event.metric))
+        self.errors.add(event.error)
+        self.event_count += 1
+        self.first_event = timestamp if self.first_event is None else min(self.first_event, timestamp)
+        self.last_event = timestamp if self.last_event is None else max(self.last_event, timestamp)
+        self.last_received = time.monotonic()
+
+    def make_signature(self, limit: int = TELEMETRY_PROMPT_LINES) -> str:
+        '''
+        Hash of the service and the most frequent anomaly, metric and error templates. Counts and
+        times are left out, so the same failure recurring in later windows has the same signature.
+        '''
+        payload = json.dumps([self.service, self.anomalies.signature(limit), self.metrics.signature(limit),
+                              self.errors.signature(limit)])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def prompt_fields(self, limit: int = TELEMETRY_PROMPT_LINES) -> tuple:
+        '''
+        (anomaly, metric, error) of the telemetry prompt, describing the whole group. Counts and times
+        are left out, as they are from the signature, so the summary holds for any group of that signature.
+        '''
+        anomaly = f"Anomalies on {self.service}:\n{self.anomalies.render(limit, counts=False)}"
+        return anomaly, self.metrics.render(limit, counts=False), self.errors.render(limit, counts=False)
+
+    def with_counts(self, summary: str) -> str:
+        '''
+        The summary of the signature, headed by this group's event count and duration
+        '''
+        duration = round(self.last_event - self.first_event)
+        return f"{self.event_count} anomalies on {self.service} over {duration}s\n{summary}"
+
+    def to_summary(self) -> TelemetryGroupSummary:
+        return TelemetryGroupSummary(group_id=self.group_id, service=self.service, window_start=self.window_start,
+                                     window_end=self.window_end, event_count=self.event_count,
+                                     metrics=list(self.metrics.counts), status=self.status, signature=self.signature,
+                                     summary=self.summary, cached=self.cached)
+
+
+class TelemetryGrouper:
+    '''
+    Streaming grouping of anomaly events. An event joins the open group of its service and time
+    window whose metric name is similar enough (Jaccard similarity of the name tokens), or opens a
+    new one; a service has at most max_open_per_window open groups per window, beyond which events
+    join the most similar one. A group is closed once its window has ended and no event has arrived
+    for it for quiet_seconds; it is then summarized with one LLM call. Summaries are cached by group
+    signature, so a failure that keeps recurring, or groups with the same signature, cost one call.
+    '''
+
+    def __init__(self, window_seconds: int = TELEMETRY_WINDOW_SECONDS, quiet_seconds: float = TELEMETRY_QUIET_SECONDS,
+                 metric_similarity: float = TELEMETRY_METRIC_SIMILARITY, max_groups: int = TELEMETRY_MAX_GROUPS,
+                 retention_seconds: int = TELEMETRY_RETENTION_SECONDS, cache: ResponseCache = None,
+                 max_open_per_window: int = TELEMETRY_MAX_OPEN_GROUPS_PER_WINDOW):
+        self.window_seconds = window_seconds
+        self.quiet_seconds = quiet_seconds
+        self.metric_similarity = metric_similarity
+        self.max_groups = max_groups
+        self.max_open_per_window = max_open_per_window
+        self.retention_seconds = retention_seconds
+        self.cache = cache if cache is not None else ResponseCache(
+            TELEMETRY_CACHE_MAX_ENTRIES, TELEMETRY_CACHE_TTL_SECONDS, TELEMETRY_CACHE_DISK_PATH)
+        # group_id -> group, oldest first
+        self._groups = {}
+        # (service, window start) -> open groups
+        self._open = {}
+        self._lock = threading.Lock()
+        self._flush_thread = None
+        self.events = 0
+        self.llm_calls = 0
+        self.summarized = 0
+        self.cache_hits = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def add(self, event: TelemetryEvent) -> str:
+        '''
+        Adds one event to its group; returns the group id
+        '''
+        timestamp = event.timestamp if event.timestamp is not None else time.time()
+        service = event_service(event)
+        window_start = timestamp - timestamp % self.window_seconds
+        tokens = metric_tokens(metric_name(event.metric))
+        with self._lock:
+            self.events += 1
+            candidates = self._open.setdefault((service, window_start), [])
+            group = max(candidates, key=lambda candidate: similarity(tokens, candidate.tokens), default=None)
+            if group is None or (similarity(tokens, group.tokens) < self.metric_similarity
+                                 and len(candidates) < self.max_open_per_window):
+                group = TelemetryGroup(service, window_start, self.window_seconds, tokens)
+                candidates.append(group)
+                self._groups[group.group_id] = group
+            group.add(event, timestamp)
+            return group.group_id
+
+    def get(self, group_id: str):
+        with self._lock:
+            group = self._groups.get(group_id)
+            return group.to_summary() if group is not None else None
+
+    def groups(self, status: StatusEnum = None) -> list:
+        '''
+        Summaries of the retained groups, newest window first
+        '''
+        with self._lock:
+            groups = [group.to_summary() for group in self._groups.values() if status is None or group.status == status]
+        return sorted(groups, key=lambda group: group.window_start, reverse=True)
+
+    def _close(self, groups: list):
+        # Must hold the lock; closed groups take no more events
+        now = time.time()
+        for group in groups:
+            candidates = self._open.get((group.service, group.window_start), [])
+            if group in candidates:
+                candidates.remove(group)
+                if not candidates:
+                    del self._open[(group.service, group.window_start)]
+            group.closed_at = now
+            group.signature = group.make_signature()
+
+    def _ready_groups(self) -> list:
+        now, now_monotonic = time.time(), time.monotonic()
+        with self._lock:
+            ready = [group for candidates in self._open.values() for group in candidates
+                     if group.window_end <= now and now_monotonic - group.last_received >= self.quiet_seconds]
+            self._close(ready)
+        return ready
+
+    @traced
+    def summarize(self, groups: list):
+        '''
+        Summarizes closed groups: cached signatures are answered from the cache, and groups sharing
+        a signature are summarized with one LLM call. Each group's counts are added to the summary after.
+        '''
+        by_signature = {}
+        for group in groups:
+            summary = self.cache.get(group.signature)
+            if summary is not None:
+                self._finish([group], summary, cached=True)
+            else:
+                by_signature.setdefault(group.signature, []).append(group)
+        if not by_signature:
+            return
+
+        signatures = list(by_signature)
+
+        def summarize_group(signature):
+            # The largest group of a signature has the most representative example lines
+            group = max(by_signature[signature], key=lambda candidate: candidate.event_count)
+            return Summary.summarize_rootcause_from_telemetry(*group.prompt_fields(), TELEMETRY_SUMMARY_TYPE)
+
+        with self._lock:
+            self.llm_calls += len(signatures)
+        for index, summary in chunk_map_executor.imap(summarize_group, signatures, return_exceptions=True):
+            signature = signatures[index]
+            if isinstance(summary, Exception):
+                logging.error(f"Error while summarizing telemetry group {signature}: {summary}")
+                self._finish(by_signature[signature], str(summary), status=StatusEnum.ERROR)
+            else:
+                self.cache.set(signature, summary)
+                self._finish(by_signature[signature], summary)
+
+    def _finish(self, groups: list, summary: str, cached: bool = False, status: StatusEnum = StatusEnum.SUCCESS):
+        with self._lock:
+            for group in groups:
+                group.summary = group.with_counts(summary) if status == StatusEnum.SUCCESS else summary
+                group.cached = cached
+                group.status = status
+            if status == StatusEnum.SUCCESS:
+                self.summarized += len(groups)
+                self.cache_hits += len(groups) if cached else 0
+            else:
+                self.failed += len(groups)
+
+    def flush(self, group_ids: list = None) -> list:
+        '''
+        Closes and summarizes the given open groups, or all open groups, without waiting for
+        their window to end; returns their summaries
+        '''
+        with self._lock:
+            if group_ids is None:
+                groups = [group for candidates in self._open.values() for group in candidates]
+            else:
+                groups = [self._groups[group_id] for group_id in dict.fromkeys(group_ids) if group_id in self._groups]
+            open_groups = [group for group in groups if group.closed_at is None]
+            self._close(open_groups)
+        self.summarize(open_groups)
+        with self._lock:
+            return [group.to_summary() for group in groups]
+
+    def purge(self) -> int:
+        '''
+        Removes summarized groups after retention_seconds. Beyond max_groups, the oldest finished
+        groups are removed first, then the oldest open groups, whose events are dropped.
+        '''
+        now = time.time()
+        with self._lock:
+            expired = [group_id for group_id, group in self._groups.items()
+                       if group.status != StatusEnum.IN_PROGRESS and now - group.closed_at > self.retention_seconds]
+            for group_id in expired:
+                del self._groups[group_id]
+            surplus = len(self._groups) - self.max_groups
+            if surplus > 0:
+                oldest = [group_id for group_id, group in self._groups.items()
+                          if group.status != StatusEnum.IN_PROGRESS][:surplus]
+                # Groups being summarized (closed, still in progress) are left to finish
+                oldest += [group_id for group_id, group in self._groups.items()
+                           if group.closed_at is None][:surplus - len(oldest)]
+                for group_id in oldest:
+                    group = self._groups.pop(group_id)
+                    if group.closed_at is None:
+                        self._drop_open(group)
+                expired.extend(oldest)
+        return len(expired)
+
+    def _drop_open(self, group: TelemetryGroup):
+        # Must hold the lock
+        candidates = self._open.get((group.service, group.window_start), [])
+        if group in candidates:
+            candidates.remove(group)
+            if not candidates:
+                del self._open[(group.service, group.window_start)]
+        self.dropped += 1
+        logging.warning(f"Dropped open telemetry group {group.group_id} of {group.service} "
+                        f"({group.event_count} events): more than {self.max_groups} groups")
+
+    def flush_ready(self):
+        groups = self._ready_groups()
+        if groups:
+            self.summarize(groups)
+        self.purge()
+
+    def start_flush_thread(self, interval_seconds: float = TELEMETRY_FLUSH_INTERVAL_SECONDS):
+        '''
+        Starts a daemon thread that summarizes the groups that are ready every interval_seconds
+        '''
+        if self._flush_thread is not None:
+            return
+
+        def flush_loop():
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    self.flush_ready()
+                except Exception as e:
+                    logging.error(f"Error while summarizing telemetry groups: {e}")
+
+        self._flush_thread = threading.Thread(target=flush_loop, name="telemetry-flush", daemon=True)
+        self._flush_thread.start()
+
+    def stats(self) -> dict:
+        with self._lock:
+            open_groups = sum(len(candidates) for candidates in self._open.values())
+            return {
+                "events": self.events,
+                "groups": len(self._groups),
+                "open_groups": open_groups,
+                "summarized_groups": self.summarized,
+                "failed_groups": self.failed,
+                "dropped_groups": self.dropped,
+                "llm_calls": self.llm_calls,
+                "cache_hits": self.cache_hits,
+                "events_per_llm_call": round(self.events / self.llm_calls, 3) if self.llm_calls else 0.0,
+                "cache": self.cache.stats(),
+            }
+
+
+telemetry_grouper = TelemetryGrouper()
@@ -0,0 +1,67 @@
+import configparser
+import spacy
+from model_registry import model_registry
+
+config = configparser.ConfigParser()
+config.read("constants.ini")
+SPACY_MODEL_NAME = config.get('TEXT_CLEANING', 'SPACY_MODEL_NAME')
+SENTENCE_SEGMENTER = config.get('TEXT_CLEANING', 'SENTENCE_SEGMENTER')
+SPACY_BATCH_SIZE = int(config.get('TEXT_CLEANING', 'BATCH_SIZE'))
+SPACY_N_PROCESS = int(config.get('TEXT_CLEANING', 'N_PROCESS'))
+
+# Sentence splitting with the dependency parser needs only tok2vec and parser
+SENTENCE_DISABLED_COMPONENTS = ["tagger", "attribute_ruler", "lemmatizer", "ner"]
+
+
+class TextCleaningService:
+    '''
+    Holds the single spaCy pipeline of the process and runs texts through it in batches.
+    '''
+
+    def __init__(self, model_name: str = SPACY_MODEL_NAME, sentence_segmenter: str = SENTENCE_SEGMENTER,
+                 batch_size: int = SPACY_BATCH_SIZE, n_process: int = SPACY_N_PROCESS):
+        self.nlp = spacy.load(model_name)
+        self.batch_size = batch_size
+        self.n_process = n_process
+        if sentence_segmenter == "sentencizer":
+            # Rule-based sentence boundaries, much cheaper than the parser
+            self.sentence_nlp = spacy.blank(self.nlp.lang)
+            self.sentence_nlp.add_pipe("sentencizer")
+            self.sentence_disabled = []
+        elif sentence_segmenter == "parser":
+            self.sentence_nlp = self.nlp
+            self.sentence_disabled = [name for name in SENTENCE_DISABLED_COMPONENTS if name in self.nlp.pipe_names]
+        else:
+            raise ValueError(f"Unknown sentence segmenter: {sentence_segmenter}")
+
+    def split_sentences(self, texts: list) -> list:
+        '''
+        Returns the sentence texts of every input text, one list per text
+        '''
+        docs = self.sentence_nlp.pipe(texts, batch_size=self.batch_size, n_process=self.n_process,
+                                      disable=self.sentence_disabled)
+        return [[sent.text for sent in doc.sents] for doc in docs]
+
+    def pipe(self, texts: list):
+        '''
+        Runs texts through the full pipeline (NER included)
+        '''
+        return self.nlp.pipe(texts, batch_size=self.batch_size, n_process=self.n_process)
+
+    def warm_up(self):
+        '''
+        Runs both pipelines once so the first request does not pay for lazy initialisation
+        '''
+        text = "The service was restarted after the deployment failed. The incident was resolved by John."
+        self.split_sentences([text])
+        list(self.pipe([text]))
+
+
+model_registry.register("spacy", TextCleaningService, warm_up=TextCleaningService.warm_up)
+
+
+def get_text_cleaning_service():
+    '''
+    Returns the process-wide text cleaning service, loading spaCy on first use.
+    '''
+    return model_registry.get("spacy")
@@ -0,0 +1,112 @@
+import configparser
+from transformers import BertTokenizerFast
+from model_registry import model_registry
+
+config = configparser.ConfigParser()
+config.read("constants.ini")
+TOKENIZER_NAME = config.get('SUMMARIZATION', 'TOKENIZER_NAME')
+TOKENIZE_SEGMENT_CHARS = int(config.get('SUMMARIZATION', 'TOKENIZE_SEGMENT_CHARS'))
+
+
+def iter_segments(text: str, segment_chars: int = TOKENIZE_SEGMENT_CHARS):
+    '''
+    Yields (offset, segment) pairs that cover the text, cut at whitespace so that
+    tokenizing the segments one by one gives the same tokens as tokenizing the whole text
+    '''
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + segment_chars, length)
+        if end < length:
+            cut = text.rfind("\n", start, end)
+            if cut <= start:
+                cut = text.rfind(" ", start, end)
+            if cut > start:
+                end = cut
+        yield start, text[start:end]
+        start = end
+
+
+class TokenEngine:
+    '''
+    Token counting and token-sized chunking on top of the Rust-backed fast BERT tokenizer.
+    Text is tokenized segment by segment, so counts can stop early and huge inputs are
+    never held as one token list.
+    '''
+
+    def __init__(self, tokenizer_name: str = TOKENIZER_NAME):
+        self.tokenizer = BertTokenizerFast.from_pretrained(tokenizer_name).backend_tokenizer
+
+    def count(self, text: str, limit: int = None) -> int:
+        '''
+        Counts tokens in text. When limit is given, counting stops as soon as the count
+        exceeds it and the partial count (> limit) is returned.
+        '''
+        token_count = 0
+        for _, segment in iter_segments(text):
+            token_count += len(self.tokenizer.encode(segment, add_special_tokens=False))
+            if limit is not None and token_count > limit:
+                break
+        return token_count
+
+    def exceeds(self, text: str, limit: int) -> bool:
+        '''
+        Whether text has more than limit tokens. Every BERT token covers at least one character,
+        so texts of at most limit characters are not tokenized at all.
+        '''
+        if len(text) <= limit:
+            return False
+        return self.count(text, limit=limit) > limit
+
+    def iter_chunk_spans(self, text: str, chunk_tokens: int, overlap_tokens: int, start: int = 0,
+                         counts: dict = None):
+        '''
+        Yields the (start, end) character offsets of chunks of at most chunk_tokens tokens in a
+        single pass over text[start:]. Consecutive chunks share overlap_tokens tokens, and a chunk
+        ends at a line break when one falls within the last tenth of the chunk.
+        When counts is given, counts["tokens"] is increased by the number of tokens read.
+        '''
+        overlap_tokens = min(overlap_tokens, chunk_tokens // 2)
+        lookback = max(1, chunk_tokens // 10)
+        # Absolute (start, end) character offsets of the tokens in the current chunk
+        spans = []
+
+        for offset, segment in iter_segments(text[start:] if start else text):
+            offset += start
+            encoding = self.tokenizer.encode(segment, add_special_tokens=False)
+            if counts is not None:
+                counts["tokens"] = counts.get("tokens", 0) + len(encoding.offsets)
+            for token_start, token_end in encoding.offsets:
+                spans.append((offset + token_start, offset + token_end))
+                if len(spans) <= chunk_tokens:
+                    continue
+
+                # The chunk is full: cut after the last token followed by a line break, if any
+                cut = chunk_tokens
+                for index in range(chunk_tokens - 1, chunk_tokens - 1 - lookback, -1):
+                    if "\n" in text[spans[index][1]:spans[index + 1][0]]:
+                        cut = index + 1
+                        break
+
+                yield spans[0][0], spans[cut - 1][1]
+                spans = spans[max(cut - overlap_tokens, 1):]
+
+        if spans:
+            yield spans[0][0], spans[-1][1]
+
+    def iter_chunks(self, text: str, chunk_tokens: int, overlap_tokens: int, counts: dict = None):
+        '''
+        Yields the texts of the chunks described by iter_chunk_spans
+        '''
+        for start, end in self.iter_chunk_spans(text, chunk_tokens, overlap_tokens, counts=counts):
+            yield text[start:end]
+
+
+model_registry.register("token_engine", TokenEngine)
+
+
+def get_token_engine():
+    '''
+    Returns the process-wide token engine, loading the tokenizer on first use.
+    '''
+    return model_registry.get("token_engine")
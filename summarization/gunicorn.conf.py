@@ -0,0 +1,43 @@
+# Production server settings: gunicorn -c gunicorn.conf.py app:app
+import gc
+import os
+from serving import worker_count, torch_thread_count, configure_torch_threads, cpu_pool
+
+bind = os.getenv("BIND", "0.0.0.0:4000")
+workers = worker_count()
+worker_class = "uvicorn.workers.UvicornWorker"
+# Import the app in the master process so models loaded below are inherited by forked workers
+preload_app = True
+
+# Every worker and CPU pool process gets its share of the CPUs, so torch does not oversubscribe them.
+# OpenMP and MKL read these when torch is imported with the app.
+torch_threads = torch_thread_count(workers, cpu_pool.max_workers)
+os.environ.setdefault("OMP_NUM_THREADS", str(torch_threads))
+os.environ.setdefault("MKL_NUM_THREADS", str(torch_threads))
+
+from model_registry import model_registry, PRELOAD_MODELS
+
+# Models used by spaCy cleaning and BART generation, which run in the CPU pool processes
+CPU_POOL_MODELS = ("spacy", "bart")
+
+
+def when_ready(server):
+    # Load model weights once, before the workers are forked, so they share the pages copy-on-write.
+    # Warm-up inference runs in each worker at startup and in each CPU pool process, after the fork.
+    model_registry.preload([name for name in PRELOAD_MODELS if name != "chitchat_classifier"])
+    # Keep the garbage collector from touching (and so copying) the preloaded objects in the workers
+    gc.freeze()
+
+
+def warm_up_cpu_pool_process():
+    # The worker warms up its models at app startup, after its pool is forked, so every pool process
+    # warms up its own copies before taking calls
+    from dataprocessing.inference_backend import INFERENCE_WARM_UP
+    if INFERENCE_WARM_UP:
+        model_registry.preload([name for name in PRELOAD_MODELS if name in CPU_POOL_MODELS], warm_up=True)
+
+
+def post_fork(server, worker):
+    configure_torch_threads(torch_threads)
+    # Forked from the worker before it starts any thread; spaCy and BART calls of the worker run there
+    cpu_pool.start(torch_threads, warm_up=warm_up_cpu_pool_process)
@@ -0,0 +1,74 @@
+import os
+import configparser
+import httpx
+from llm_client import RateLimitedError, parse_retry_after
+
+config = configparser.ConfigParser()
+config.read("constants.ini")
+LLM_HTTP_BASE_URL = os.getenv("LLM_HTTP_BASE_URL", config.get('LLM_HTTP', 'BASE_URL'))
+LLM_HTTP_MAX_CONNECTIONS = int(config.get('LLM_HTTP', 'MAX_CONNECTIONS'))
+LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(config.get('LLM_HTTP', 'MAX_KEEPALIVE_CONNECTIONS'))
+LLM_HTTP_TIMEOUT_SECONDS = float(config.get('LLM_HTTP', 'TIMEOUT_SECONDS'))
+LLM_HTTP_DEFAULT_MAX_NEW_TOKENS = int(config.get('LLM_HTTP', 'DEFAULT_MAX_NEW_TOKENS'))
+LLM_HTTP_TELEMETRY_MAX_NEW_TOKENS = int(config.get('LLM_HTTP', 'TELEMETRY_MAX_NEW_TOKENS'))
+LLM_HTTP_MAJOR_INCIDENT_MAX_NEW_TOKENS = int(config.get('LLM_HTTP', 'MAJOR_INCIDENT_MAX_NEW_TOKENS'))
+# Gateway errors of a platform that is restarting or overloaded
+TRANSIENT_STATUS_CODES = (502, 503, 504)
+
+
+class HTTPIntegration:
+    '''
+    LLM integration for a plain HTTP text generation endpoint (POST {base_url}/v1/generate with
+    {"inputs": [...], "parameters": {...}}, answering {"results": [{"generated_text": ...}]}).
+    All requests share one pooled, keep-alive async connection pool.
+    '''
+
+    def __init__(self, base_url: str = LLM_HTTP_BASE_URL, max_connections: int = LLM_HTTP_MAX_CONNECTIONS,
+                 max_keepalive_connections: int = LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                 timeout: float = LLM_HTTP_TIMEOUT_SECONDS):
+        self.base_url = base_url
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive_connections)
+        self.timeout = timeout
+        self._client = None
+
+    def fetch_default_params(self):
+        return {"decoding_method": "greedy", "max_new_tokens": LLM_HTTP_DEFAULT_MAX_NEW_TOKENS}
+
+    def fetch_params_telemetry_summary(self):
+        return {"decoding_method": "greedy", "max_new_tokens": LLM_HTTP_TELEMETRY_MAX_NEW_TOKENS}
+
+    def fetch_params_major_incident_communication(self):
+        return {"decoding_method": "greedy", "max_new_tokens": LLM_HTTP_MAJOR_INCIDENT_MAX_NEW_TOKENS}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Created on first use so the pool belongs to the event loop of the LLM client
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=self.base_url, limits=self.limits, timeout=self.timeout)
+        return self._client
+
+    async def agenerate_text(self, prompts: list, params, on_response=None) -> list:
+        '''
+        Generates one text per prompt. on_response(headers) is called with the headers of every
+        response so callers can follow the provider's rate-limit headers.
+        '''
+        # Transport failures are raised as the builtin errors the map executor retries
+        try:
+            response = await self._get_client().post("/v1/generate", json={"inputs": prompts, "parameters": params})
+        except httpx.TimeoutException as e:
+            raise TimeoutError(f"LLM request timed out: {e!r}") from e
+        except httpx.TransportError as e:
+            raise ConnectionError(f"LLM request failed: {e!r}") from e
+        if on_response is not None:
+            on_response(response.headers)
+        if response.status_code == 429:
+            raise RateLimitedError(parse_retry_after(response.headers, default=1.0))
+        if response.status_code in TRANSIENT_STATUS_CODES:
+            raise ConnectionError(f"LLM platform answered {response.status_code}")
+        response.raise_for_status()
+        return [result["generated_text"] for result in response.json()["results"]]
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,109 @@
+import os
+import time
+import hashlib
+import threading
+import configparser
+from collections import OrderedDict
+from response_cache import DiskCache
+
+config = configparser.ConfigParser()
+config.read("constants.ini")
+INCREMENTAL_ENABLED = config.getboolean('INCREMENTAL', 'ENABLED')
+INCREMENTAL_MAX_INCIDENTS = int(config.get('INCREMENTAL', 'MAX_INCIDENTS'))
+INCREMENTAL_TTL_SECONDS = int(config.get('INCREMENTAL', 'TTL_SECONDS'))
+INCREMENTAL_DISK_PATH = os.getenv("INCREMENTAL_DISK_PATH", config.get('INCREMENTAL', 'DISK_PATH'))
+INCREMENTAL_DISK_MAX_ENTRIES = int(config.get('INCREMENTAL', 'DISK_MAX_ENTRIES'))
+
+
+def chunk_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IncrementalStore:
+    '''
+    Per-incident state of incremental summarization: the chunk boundaries of the last version of
+    an incident's text, with the hash and the summary of every chunk. An in-process LRU tier sits
+    in front of an optional SQLite tier on disk shared by the workers.
+    '''
+
+    def __init__(self, max_incidents: int = INCREMENTAL_MAX_INCIDENTS, ttl_seconds: int = INCREMENTAL_TTL_SECONDS,
+                 disk_path: str = INCREMENTAL_DISK_PATH, disk_max_entries: int = INCREMENTAL_DISK_MAX_ENTRIES):
+        self.max_incidents = max_incidents
+        self.ttl_seconds = ttl_seconds
+        self.disk = DiskCache(disk_path, disk_max_entries, ttl_seconds) if disk_path else None
+        # key -> (expires_at, chunk records)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.updates = 0
+        self.reused_chunks = 0
+        self.new_chunks = 0
+
+    def make_key(self, incident_id: str, chunk_summary_type: str) -> str:
+        # Long and structured summaries share their map step, so they share the chunk summaries too
+        return f"{chunk_summary_type}:{incident_id}"
+
+    def get(self, key: str) -> list:
+        '''
+        Chunk records ({"start", "end", "digest", "summary"}) stored for key, in text order
+        '''
+        with self._lock:
+            record = self._memory.get(key)
+            if record is not None:
+                if record[0] > time.time():
+                    self._memory.move_to_end(key)
+                    return record[1]
+                del self._memory[key]
+
+        chunks = self.disk.get(key) if self.disk is not None else None
+        if chunks is None:
+            return []
+        with self._lock:
+            self._set_memory(key, chunks)
+        return chunks
+
+    def _set_memory(self, key: str, chunks: list):
+        self._memory[key] = (time.time() + self.ttl_seconds, chunks)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_incidents:
+            self._memory.popitem(last=False)
+
+    def set(self, key: str, chunks: list, reused: int):
+        with self._lock:
+            self._set_memory(key, chunks)
+            self.updates += 1
+            self.reused_chunks += reused
+            self.new_chunks += len(chunks) - reused
+        if self.disk is not None:
+            self.disk.set(key, chunks)
+
+    def reusable_chunks(self, text: str, chunks: list):
+        '''
+        Splits the stored chunks of an incident against its new text. Returns the leading chunks
+        whose text is unchanged, which keep their summaries, and the offset from which the rest of
+        the text has to be chunked again. The last stored chunk ran to the end of the previous text,
+        so it is only kept when the text has not changed at all.
+        '''
+        reused = []
+        for record in chunks:
+            if chunk_digest(text[record["start"]:record["end"]]) != record["digest"]:
+                break
+            if record is chunks[-1] and record["end"] != len(text):
+                break
+            reused.append(record)
+        if len(reused) == len(chunks):
+            return reused, len(text) if chunks else 0
+        # Chunks overlap, so the first changed chunk starts inside the last reused one
+        return reused, chunks[len(reused)]["start"]
+
+    def stats(self) -> dict:
+        chunks = self.reused_chunks + self.new_chunks
+        return {
+            "incidents": len(self._memory),
+            "updates": self.updates,
+            "reused_chunks": self.reused_chunks,
+            "new_chunks": self.new_chunks,
+            "reuse_rate": round(self.reused_chunks / chunks, 4) if chunks else 0.0,
+        }
+
+
+incremental_store = IncrementalStore() if INCREMENTAL_ENABLED else None
@@ -0,0 +1,201 @@
+import math
+import time
+import logging
+import threading
+import configparser
+import multiprocessing
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from model_classes import Job, StatusEnum, ExceptionMessageEnum, JobQueueFullException
+from job_store import JobStore
+
+config = configparser.ConfigParser()
+config.read("constants.ini")
+JOB_SCHEDULER_MAX_WORKERS = int(config.get('JOB_SCHEDULER', 'MAX_WORKERS'))
+JOB_SCHEDULER_MAX_QUEUE_SIZE = int(config.get('JOB_SCHEDULER', 'MAX_QUEUE_SIZE'))
+JOB_SCHEDULER_START_METHOD = config.get('JOB_SCHEDULER', 'START_METHOD')
+JOB_SCHEDULER_MIN_RETRY_AFTER_SECONDS = int(config.get('JOB_SCHEDULER', 'MIN_RETRY_AFTER_SECONDS'))
+
+
+def run_job(fn, enqueued_at, *args):
+    '''
+    Runs fn inside a pool process and reports wall-clock start and end times with the outcome
+    '''
+    started_at = time.time()
+    try:
+        return {"result": fn(*args), "error": None, "enqueued_at": enqueued_at,
+                "started_at": started_at, "finished_at": time.time()}
+    except Exception as e:
+        return {"result": None, "error": str(e), "enqueued_at": enqueued_at,
+                "started_at": started_at, "finished_at": time.time()}
+
+
+class JobScheduler:
+    '''
+    Runs CPU-heavy jobs in a dedicated process pool behind a bounded FIFO queue.
+    Jobs beyond max_workers + max_queue_size are rejected with JobQueueFullException.
+    '''
+
+    def __init__(self, job_store: JobStore, max_workers: int = JOB_SCHEDULER_MAX_WORKERS,
+                 max_queue_size: int = JOB_SCHEDULER_MAX_QUEUE_SIZE,
+                 error_message: str = ExceptionMessageEnum.DATA_CLEANSING_ERROR.value):
+        self.job_store = job_store
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.error_message = error_message
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue_size)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = 0
+        self._average_run_time = None
+        # dedup key -> uuid of the queued or running job for that input
+        self._in_flight = {}
+        self.submitted = 0
+        self.deduplicated = 0
+
+    @property
+    def depth(self) -> int:
+        '''
+        Number of jobs queued or running
+        '''
+        return self._pending
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(JOB_SCHEDULER_START_METHOD))
+            return self._executor
+
+    def _reset_executor(self, executor: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def warm_up(self, fn):
+        '''
+        Starts the pool processes and runs fn once per worker, e.g. to load models before the first job
+        '''
+        executor = self._get_executor()
+        for _ in range(self.max_workers):
+            executor.submit(fn)
+
+    def retry_after(self) -> int:
+        '''
+        Estimates how many seconds a rejected client should wait before retrying
+        '''
+        if self._average_run_time is None:
+            return JOB_SCHEDULER_MIN_RETRY_AFTER_SECONDS
+        waves = max(1, self._pending - self.max_workers + 1) / self.max_workers
+        return max(JOB_SCHEDULER_MIN_RETRY_AFTER_SECONDS, math.ceil(self._average_run_time * waves))
+
+    def submit(self, job: Job, fn, *args, dedup_key: str = None) -> str:
+        '''
+        Stores the job and queues fn(*args); the job is updated with the result when fn finishes.
+        When a job with the same dedup_key is still queued or running, nothing is queued and the
+        uuid of that job is returned instead of the uuid of job.
+        '''
+        job_uuid = job.job_uuid.__str__()
+        with self._lock:
+            if dedup_key is not None:
+                existing_uuid = self._in_flight.get(dedup_key)
+                if existing_uuid is not None:
+                    self.deduplicated += 1
+                    return existing_uuid
+                self._in_flight[dedup_key] = job_uuid
+
+        if not self._slots.acquire(blocking=False):
+            self._forget(dedup_key, job_uuid)
+            raise JobQueueFullException(retry_after=self.retry_after())
+
+        with self._lock:
+            self._pending += 1
+            self.submitted += 1
+        try:
+            self.job_store.add(job)
+            executor = self._get_executor()
+            try:
+                future = executor.submit(run_job, fn, time.time(), *args)
+            except BrokenProcessPool:
+                # A pool process died; start a fresh pool and retry once
+                self._reset_executor(executor)
+                future = self._get_executor().submit(run_job, fn, time.time(), *args)
+        except Exception:
+            self._forget(dedup_key, job_uuid)
+            self._release()
+            raise
+
+        future.add_done_callback(partial(self._on_done, job_uuid, dedup_key))
+        return job_uuid
+
+    def _forget(self, dedup_key: str, job_uuid: str):
+        if dedup_key is None:
+            return
+        with self._lock:
+            if self._in_flight.get(dedup_key) == job_uuid:
+                del self._in_flight[dedup_key]
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def _on_done(self, job_uuid: str, dedup_key: str, future):
+        if future.cancelled():
+            # Queued jobs are cancelled by shutdown(); CancelledError is not an Exception, so it is not raised here
+            self._release()
+            self._store(job_uuid, dedup_key, result=ExceptionMessageEnum.JOB_CANCELLED.value,
+                        status=StatusEnum.FAILURE)
+            return
+        try:
+            outcome = future.result()
+        except Exception as e:
+            outcome = {"result": None, "error": str(e), "enqueued_at": None,
+                       "started_at": None, "finished_at": None}
+        finally:
+            self._release()
+
+        fields = {}
+        if outcome["started_at"] is not None:
+            run_time = outcome["finished_at"] - outcome["started_at"]
+            fields["queue_wait_ms"] = round((outcome["started_at"] - outcome["enqueued_at"]) * 1000, 3)
+            fields["run_time_ms"] = round(run_time * 1000, 3)
+            with self._lock:
+                # Exponential moving average feeds the Retry-After estimate
+                if self._average_run_time is None:
+                    self._average_run_time = run_time
+                else:
+                    self._average_run_time = 0.8 * self._average_run_time + 0.2 * run_time
+
+        if outcome["error"] is None:
+            fields.update(result=outcome["result"], status=StatusEnum.SUCCESS)
+        else:
+            logging.error(self.error_message.format(outcome["error"]))
+            fields.update(result=self.error_message.format(outcome["error"]), status=StatusEnum.ERROR)
+        self._store(job_uuid, dedup_key, **fields)
+
+    def _store(self, job_uuid: str, dedup_key: str, **fields):
+        try:
+            self.job_store.update(job_uuid, **fields)
+        except Exception as e:
+            logging.error(f"Error while storing result of job {job_uuid}: {e}")
+        # Identical requests keep getting this job until its result is stored
+        self._forget(dedup_key, job_uuid)
+
+    def stats(self) -> dict:
+        requests = self.submitted + self.deduplicated
+        return {
+            "depth": self._pending,
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "dedup_rate": round(self.deduplicated / requests, 4) if requests else 0.0,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
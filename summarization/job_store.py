@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+import configparser
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+from model_classes import Job
+
+config = configparser.ConfigParser()
+config.read("constants.ini")
+JOB_STORE_BACKEND = os.getenv("JOB_STORE_BACKEND", config.get('JOB_STORE', 'BACKEND'))
+JOB_STORE_MAX_JOBS = int(config.get('JOB_STORE', 'MAX_JOBS'))
+JOB_STORE_TTL_SECONDS = int(config.get('JOB_STORE', 'TTL_SECONDS'))
+JOB_STORE_PURGE_INTERVAL_SECONDS = int(config.get('JOB_STORE', 'PURGE_INTERVAL_SECONDS'))
+JOB_STORE_SQLITE_PATH = os.getenv("JOB_STORE_SQLITE_PATH", config.get('JOB_STORE', 'SQLITE_PATH'))
+
+
+def pack_result(result: str) -> bytes:
+    '''
+    Compresses a job result for storage
+    '''
+    return zlib.compress(result.encode("utf-8"))
+
+
+def unpack_result(packed: bytes) -> str:
+    '''
+    Restores a job result compressed with pack_result
+    '''
+    return zlib.decompress(packed).decode("utf-8")
+
+
+class JobStore(ABC):
+    '''
+    Interface of the cleanse-note job store. Jobs expire ttl_seconds after their last update.
+    A backend missing one of the abstract methods cannot be instantiated.
+    '''
+
+    def __init__(self, max_jobs: int, ttl_seconds: int):
+        self.max_jobs = max_jobs
+        self.ttl_seconds = ttl_seconds
+        self._purge_thread = None
+
+    @abstractmethod
+    def add(self, job: Job):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, job_uuid: str) -> Optional[Job]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def update(self, job_uuid: str, **fields):
+        raise NotImplementedError
+
+    @abstractmethod
+    def purge_expired(self) -> int:
+        raise NotImplementedError
+
+    def start_purge_thread(self, interval_seconds: int = JOB_STORE_PURGE_INTERVAL_SECONDS):
+        '''
+        Starts a daemon thread that removes expired jobs every interval_seconds
+        '''
+        if self._purge_thread is not None:
+            return
+
+        def purge_loop():
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    purged = self.purge_expired()
+                    if purged:
+                        logging.info(f"Purged {purged} expired jobs")
+                except Exception as e:
+                    logging.error(f"Error while purging expired jobs: {e}")
+
+        self._purge_thread = threading.Thread(target=purge_loop, name="job-store-purge", daemon=True)
+        self._purge_thread.start()
+
+
+class InMemoryJobStore(JobStore):
+    '''
+    Process-local job store with LRU eviction beyond max_jobs and TTL expiry.
+    '''
+
+    def __init__(self, max_jobs: int = JOB_STORE_MAX_JOBS, ttl_seconds: int = JOB_STORE_TTL_SECONDS):
+        super().__init__(max_jobs, ttl_seconds)
+        # job_uuid -> (expires_at, job fields without result, compressed result)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _put(self, job: Job):
+        job_uuid = job.job_uuid.__str__()
+        self._jobs[job_uuid] = (time.time() + self.ttl_seconds,
+                                job.dict(exclude={"result"}),
+                                pack_result(job.result))
+        self._jobs.move_to_end(job_uuid)
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+
+    def _load(self, job_uuid: str) -> Optional[Job]:
+        record = self._jobs.get(job_uuid)
+        if record is None:
+            return None
+        expires_at, fields, packed_result = record
+        if expires_at <= time.time():
+            del self._jobs[job_uuid]
+            return None
+        self._jobs.move_to_end(job_uuid)
+        return Job(**fields, result=unpack_result(packed_result))
+
+    def add(self, job: Job):
+        with self._lock:
+            self._put(job)
+
+    def get(self, job_uuid: str) -> Optional[Job]:
+        with self._lock:
+            return self._load(job_uuid)
+
+    def update(self, job_uuid: str, **fields):
+        with self._lock:
+            job = self._load(job_uuid)
+            if job is not None:
+                self._put(job.copy(update=fields))
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [job_uuid for job_uuid, record in self._jobs.items() if record[0] <= now]
+            for job_uuid in expired:
+                del self._jobs[job_uuid]
+        return len(expired)
+
+
+class SQLiteJobStore(JobStore):
+    '''
+    Job store backed by a SQLite file, shared by all workers that point at the same path.
+    '''
+
+    def __init__(self, path: str = JOB_STORE_SQLITE_PATH, max_jobs: int = JOB_STORE_MAX_JOBS,
+                 ttl_seconds: int = JOB_STORE_TTL_SECONDS):
+        super().__init__(max_jobs, ttl_seconds)
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_uuid TEXT PRIMARY KEY, fields TEXT NOT NULL, result BLOB NOT NULL, "
+                "updated_at REAL NOT NULL, expires_at REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_expires_at ON jobs (expires_at)")
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs (updated_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared across threads, so keep one per thread
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _put(self, connection: sqlite3.Connection, job: Job):
+        now = time.time()
+        connection.execute(
+            "INSERT OR REPLACE INTO jobs (job_uuid, fields, result, updated_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (job.job_uuid.__str__(), job.json(exclude={"result"}), pack_result(job.result),
+             now, now + self.ttl_seconds))
+
+    def _load(self, connection: sqlite3.Connection, job_uuid: str) -> Optional[Job]:
+        row = connection.execute(
+            "SELECT fields, result FROM jobs WHERE job_uuid = ? AND expires_at > ?",
+            (job_uuid, time.time())).fetchone()
+        if row is None:
+            return None
+        fields, packed_result = row
+        return Job(**json.loads(fields), result=unpack_result(packed_result))
+
+    def add(self, job: Job):
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            self._put(connection, job)
+            # Enforce the size cap by dropping the least recently updated jobs
+            connection.execute(
+                "DELETE FROM jobs WHERE job_uuid IN "
+                "(SELECT job_uuid FROM jobs ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_jobs,))
+
+    def get(self, job_uuid: str) -> Optional[Job]:
+        return self._load(self._connection(), job_uuid)
+
+    def update(self, job_uuid: str, **fields):
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            job = self._load(connection, job_uuid)
+            if job is not None:
+                self._put(connection, job.copy(update=fields))
+
+    def purge_expired(self) -> int:
+        connection = self._connection()
+        with connection:
+            cursor = connection.execute("DELETE FROM jobs WHERE expires_at <= ?", (time.time(),))
+        return cursor.rowcount
+
+
+def get_job_store(backend: str = JOB_STORE_BACKEND) -> JobStore:
+    '''
+    Builds the job store configured in constants.ini (JOB_STORE.BACKEND)
+    '''
+    if backend == "memory":
+        return InMemoryJobStore()
+    elif backend == "sqlite":
+        return SQLiteJobStore()
+    raise ValueError(f"Unknown job store backend: {backend}")
@@ -0,0 +1,321 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import configparser
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import platform_config
+from response_cache import response_cache, ResponseCache
+from model_classes import LLMUnavailableException, LLMRateLimitedException
+
+config = configparser.ConfigParser()
+config.read("constants.ini")
+LLM_MAX_CONCURRENCY = int(config.get('LLM_CLIENT', 'MAX_CONCURRENCY'))
+LLM_RATE_LIMIT_PER_SECOND = float(config.get('LLM_CLIENT', 'RATE_LIMIT_PER_SECOND'))
+LLM_RATE_LIMIT_BURST = int(config.get('LLM_CLIENT', 'RATE_LIMIT_BURST'))
+LLM_MAX_RATE_LIMIT_RETRIES = int(config.get('LLM_CLIENT', 'MAX_RATE_LIMIT_RETRIES'))
+LLM_DEFAULT_RETRY_AFTER_SECONDS = float(config.get('LLM_CLIENT', 'DEFAULT_RETRY_AFTER_SECONDS'))
+LLM_BREAKER_FAILURE_THRESHOLD = int(config.get('LLM_CLIENT', 'BREAKER_FAILURE_THRESHOLD'))
+LLM_BREAKER_RESET_SECONDS = float(config.get('LLM_CLIENT', 'BREAKER_RESET_SECONDS'))
+LLM_REQUEST_TIMEOUT_SECONDS = float(config.get('LLM_CLIENT', 'REQUEST_TIMEOUT_SECONDS'))
+
+
+class RateLimitedError(Exception):
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"Rate limited, retry after {retry_after}s")
+
+
+def parse_retry_after(headers, default: float = None):
+    value = headers.get("retry-after") or headers.get("x-ratelimit-reset")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def rate_limit_retry_after(error: Exception, default: float = LLM_DEFAULT_RETRY_AFTER_SECONDS):
+    '''
+    Seconds to wait when error is a 429 from the HTTP integration or an SDK integration, None otherwise
+    '''
+    if isinstance(error, RateLimitedError):
+        return error.retry_after
+    response = getattr(error, "response", None)
+    status_code = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status_code == 429:
+        return parse_retry_after(getattr(response, "headers", {}) or {}, default=default)
+    return None
+
+
+class TokenBucket:
+    '''
+    Client-side rate limiter. Follows the provider: x-ratelimit-remaining/x-ratelimit-reset headers
+    and 429 responses pause the bucket, and a 429 also halves the rate, which then recovers
+    additively with every successful call.
+    '''
+
+    def __init__(self, rate: float = LLM_RATE_LIMIT_PER_SECOND, burst: int = LLM_RATE_LIMIT_BURST):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    async def acquire(self):
+        if self.base_rate <= 0:
+            return
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self.tokens = min(self.burst, self.tokens + max(0.0, now - self.updated) * self.rate)
+            self.updated = max(self.updated, now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        # Refill starts when the pause ends; the pause itself earns no tokens
+        self.tokens = 0.0
+        self.updated = max(self.updated, self.paused_until)
+        self.rate = max(self.base_rate / 8, self.rate / 2)
+
+    def observe(self, headers):
+        remaining = headers.get("x-ratelimit-remaining")
+        if remaining is None:
+            return
+        try:
+            remaining = float(remaining)
+        except ValueError:
+            return
+        self.tokens = min(self.tokens, remaining)
+        if remaining <= 0:
+            reset = parse_retry_after(headers, default=LLM_DEFAULT_RETRY_AFTER_SECONDS)
+            self.paused_until = max(self.paused_until, time.monotonic() + reset)
+            self.updated = max(self.updated, self.paused_until)
+
+    def record_success(self):
+        self.rate = min(self.base_rate, self.rate + self.base_rate / 20)
+
+
+class CircuitBreaker:
+    '''
+    Opens after failure_threshold consecutive failed calls and rejects calls for reset_seconds,
+    then lets a single trial call through (half-open) to decide whether to close again
+    '''
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds: float = LLM_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if self.trial_running else "open"
+
+    def before_call(self):
+        if self.opened_at is None:
+            return
+        remaining = self.reset_seconds - (time.monotonic() - self.opened_at)
+        if remaining > 0 or self.trial_running:
+            raise LLMUnavailableException(retry_after=max(1, int(remaining + 0.999)))
+        self.trial_running = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.trial_running or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self.trial_running:
+                logging.warning(f"LLM circuit breaker opened after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+        self.trial_running = False
+
+
+class AsyncLLMClient:
+    '''
+    Process-wide front of the LLM integration. Calls run on a dedicated event loop thread with a
+    concurrency limit, the token bucket and the circuit breaker; identical calls in flight are
+    coalesced into one. Async integrations (agenerate_text) share one connection pool on that loop;
+    synchronous SDK integrations run on the client's own threads, not on FastAPI's threadpool.
+    '''
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, bucket: TokenBucket = None,
+                 breaker: CircuitBreaker = None, max_rate_limit_retries: int = LLM_MAX_RATE_LIMIT_RETRIES,
+                 request_timeout: float = LLM_REQUEST_TIMEOUT_SECONDS):
+        self.max_concurrency = max_concurrency
+        self.request_timeout = request_timeout
+        self.bucket = bucket if bucket is not None else TokenBucket()
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self._lock = threading.Lock()
+        self._loop = None
+        self._pid = None
+        self._semaphore = None
+        self._executor = None
+        self._in_flight = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+        self.rejected = 0
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        # A forked worker inherits the loop object but not its thread, so every process starts its own
+        if self._loop is None or self._pid != os.getpid():
+            with self._lock:
+                if self._loop is None or self._pid != os.getpid():
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name="llm-client", daemon=True).start()
+                    self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                                        thread_name_prefix="llm-call")
+                    self._in_flight = {}
+                    self._pid = os.getpid()
+                    self._loop = loop
+        return self._loop
+
+    async def _call_integration(self, prompts: list, params) -> list:
+        integration = platform_config.integration
+        if hasattr(integration, "agenerate_text"):
+            return await integration.agenerate_text(prompts, params, on_response=self.bucket.observe)
+        return await self._loop.run_in_executor(self._executor, integration.generate_text, prompts, params)
+
+    async def _generate(self, prompts: list, params) -> list:
+        for attempt in range(self.max_rate_limit_retries + 1):
+            try:
+                self.breaker.before_call()
+            except LLMUnavailableException:
+                self.rejected += 1
+                raise
+            await self.bucket.acquire()
+            async with self._semaphore:
+                self.calls += 1
+                try:
+                    llm_response = await self._call_integration(prompts, params)
+                except Exception as e:
+                    retry_after = rate_limit_retry_after(e)
+                    if retry_after is None:
+                        self.breaker.record_failure()
+                        raise
+                    error = e
+                else:
+                    self.breaker.record_success()
+                    self.bucket.record_success()
+                    return llm_response
+
+            # A 429 means the platform is up, so it does not count against the circuit breaker
+            self.rate_limited += 1
+            self.breaker.record_success()
+            self.bucket.pause(retry_after)
+            logging.warning(f"LLM platform rate limited the call (attempt {attempt + 1}), "
+                            f"waiting {retry_after}s: {error}")
+        raise LLMRateLimitedException(retry_after=max(1, int(retry_after + 0.999)))
+
+    async def _coalesced(self, key: str, prompts: list, params) -> list:
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._generate(prompts, params))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # One waiter giving up must not cancel the call the others are waiting for
+        return await asyncio.shield(task)
+
+    def _submit(self, summary_type: str, prompts: list, params):
+        key = ResponseCache.make_key(summary_type, prompts, params)
+        loop = self._get_loop()
+        return asyncio.run_coroutine_threadsafe(self._coalesced(key, prompts, params), loop)
+
+    def _lookup(self, summary_type: str, prompts: list, params):
+        if response_cache is None:
+            return None, [None] * len(prompts), list(range(len(prompts)))
+        keys = [response_cache.make_key(summary_type, prompt, params) for prompt in prompts]
+        responses = [response_cache.get(key) for key in keys]
+        return keys, responses, [index for index, response in enumerate(responses) if response is None]
+
+    def _merge(self, keys, responses: list, missing: list, llm_response: list):
+        '''
+        Fills the missing responses and caches them; None when responses cannot be matched to prompts
+        '''
+        if len(llm_response) != len(missing):
+            return None
+        for index, response in zip(missing, llm_response):
+            if keys is not None:
+                response_cache.set(keys[index], response)
+            responses[index] = response
+        return responses
+
+    def _wait(self, future):
+        '''
+        Result of a submitted call, waiting at most request_timeout (queueing, rate limiting and retries included)
+        '''
+        try:
+            return future.result(timeout=self.request_timeout)
+        except FutureTimeoutError:
+            # Only this waiter gives up; a coalesced call other requests wait for keeps running
+            future.cancel()
+            raise TimeoutError(f"LLM call did not complete within {self.request_timeout}s")
+
+    def generate(self, summary_type: str, prompts, params) -> list:
+        '''
+        Blocking call for synchronous code (worker threads, jobs, batches)
+        '''
+        if isinstance(prompts, str):
+            prompts = [prompts]
+        keys, responses, missing = self._lookup(summary_type, prompts, params)
+        if not missing:
+            return responses
+        llm_response = self._wait(self._submit(summary_type, [prompts[index] for index in missing], params))
+        merged = self._merge(keys, responses, missing, llm_response)
+        if merged is not None:
+            return merged
+        # Responses cannot be matched to prompts one to one, so skip the cache for this call
+        if len(missing) == len(prompts):
+            return llm_response
+        return self._wait(self._submit(summary_type, prompts, params))
+
+    async def agenerate(self, summary_type: str, prompts, params) -> list:
+        '''
+        Awaitable call for async routes; the caller's event loop is never blocked on the platform
+        '''
+        if isinstance(prompts, str):
+            prompts = [prompts]
+        keys, responses, missing = self._lookup(summary_type, prompts, params)
+        if not missing:
+            return responses
+        llm_response = await asyncio.wrap_future(
+            self._submit(summary_type, [prompts[index] for index in missing], params))
+        merged = self._merge(keys, responses, missing, llm_response)
+        if merged is not None:
+            return merged
+        if len(missing) == len(prompts):
+            return llm_response
+        return await asyncio.wrap_future(self._submit(summary_type, prompts, params))
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "rate_limited": self.rate_limited,
+            "rejected": self.rejected,
+            "in_flight": len(self._in_flight),
+            "circuit": self.breaker.state,
+            "rate_per_second": round(self.bucket.rate, 3),
+        }
+
+
+llm_client = AsyncLLMClient()
@@ -0,0 +1,322 @@
+import os
+import time
+import inspect
+import threading
+import configparser
+from bisect import bisect_left
+from functools import wraps
+
+config = configparser.ConfigParser()
+config.read("constants.ini")
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", config.get('METRICS', 'ENABLED')).lower() == "true"
+LATENCY_BUCKETS = [float(bound) for bound in config.get('METRICS', 'LATENCY_BUCKETS').split(",")]
+TOKEN_BUCKETS = [float(bound) for bound in config.get('METRICS', 'TOKEN_BUCKETS').split(",")]
+CHUNK_BUCKETS = [float(bound) for bound in config.get('METRICS', 'CHUNK_BUCKETS').split(",")]
+
+
+class ShardedValues:
+    '''
+    Fixed-size array of numbers with one shard per thread. A thread only ever writes its own
+    shard, so updates take no lock; readers add the shards up. A shard is allocated the first
+    time a thread writes, never per update.
+    '''
+
+    def __init__(self, size: int):
+        self.size = size
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def shard(self) -> list:
+        shard = getattr(self._local, "values", None)
+        if shard is None:
+            shard = [0] * self.size
+            self._local.values = shard
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def totals(self) -> list:
+        with self._lock:
+            shards = list(self._shards)
+        return [sum(values) for values in zip(*shards)] if shards else [0] * self.size
+
+
+def format_labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join('%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                     for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        '''
+        Child for one combination of label values, created once and reused
+        '''
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, names, values, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_labels(names, values)} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return CounterChild()
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield "_total", self.labelnames, values, child.values.totals()[0]
+
+
+class CounterChild:
+
+    def __init__(self):
+        self.values = ShardedValues(1)
+
+    def inc(self, amount=1):
+        self.values.shard()[0] += amount
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = sorted(buckets)
+
+    def _new_child(self):
+        return HistogramChild(self.buckets)
+
+    def samples(self):
+        bucket_names = self.labelnames + ("le",)
+        for values, child in list(self._children.items()):
+            totals = child.values.totals()
+            cumulative = 0
+            for bound, count in zip(self.buckets + [float("inf")], totals):
+                cumulative += count
+                yield "_bucket", bucket_names, values + ("+Inf" if bound == float("inf") else format_value(bound),), cumulative
+            yield "_sum", self.labelnames, values, totals[-1]
+            yield "_count", self.labelnames, values, cumulative
+
+
+class HistogramChild:
+    '''
+    Bucket counts (the last one is +Inf) followed by the sum of the observed values
+    '''
+
+    def __init__(self, buckets: list):
+        self.buckets = buckets
+        self.values = ShardedValues(len(buckets) + 2)
+
+    def observe(self, value: float):
+        shard = self.values.shard()
+        shard[bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+
+class GaugeCallback(Metric):
+    '''
+    Gauge read at scrape time: fn returns (label values, value) pairs
+    '''
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, fn, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self.fn = fn
+
+    def samples(self):
+        for values, value in self.fn():
+            yield "", self.labelnames, values, value
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        '''
+        All metrics in the Prometheus text exposition format
+        '''
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f"# {metric.name} unavailable: {e}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+request_count = registry.register(Counter(
+    "textsummary_requests", "HTTP requests by route, method and status", ("route", "method", "status")))
+request_seconds = registry.register(Histogram(
+    "textsummary_request_duration_seconds", "HTTP request latency by route, until the last body byte",
+    ("route", "method")))
+stage_seconds = registry.register(Histogram(
+    "textsummary_stage_duration_seconds", "Time spent in a pipeline stage per call", ("stage",)))
+input_tokens = registry.register(Histogram(
+    "textsummary_input_tokens",
+    "Tokens summarized per input, by summary type (for incremental updates, the tokens of the changed tail)",
+    ("summary_type",), buckets=TOKEN_BUCKETS))
+chunk_count = registry.register(Histogram(
+    "textsummary_chunks", "Chunks per summarized input, by summary type", ("summary_type",), buckets=CHUNK_BUCKETS))
+
+
+def timed_iterator(iterator, histogram: HistogramChild):
+    # Only the time spent producing items counts, not the time the consumer spends on them
+    elapsed = 0.0
+    iterator = iter(iterator)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            break
+        finally:
+            elapsed += time.perf_counter() - start
+        yield item
+    histogram.observe(elapsed)
+
+
+def timed(stage: str, iterator: bool = False):
+    '''
+    Records the duration of every call of the function in the stage histogram. With iterator,
+    the function returns a lazy iterator and the time spent iterating it is recorded. For a
+    pipeline of steps (a generator function), the time until the pipeline returns is recorded.
+    With metrics disabled the function is returned undecorated.
+    '''
+    def decorate(func):
+        if not METRICS_ENABLED:
+            return func
+        histogram = stage_seconds.labels(stage)
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+            return async_wrapper
+
+        if inspect.isgeneratorfunction(func):
+            @wraps(func)
+            def steps_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return (yield from func(*args, **kwargs))
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+            return steps_wrapper
+
+        if iterator:
+            @wraps(func)
+            def iterator_wrapper(*args, **kwargs):
+                return timed_iterator(func(*args, **kwargs), histogram)
+            return iterator_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def observe_stage(stage: str, seconds: float):
+    if METRICS_ENABLED:
+        stage_seconds.labels(stage).observe(seconds)
+
+
+def observe_input(summary_type: str, tokens: int, chunks: int):
+    if METRICS_ENABLED:
+        input_tokens.labels(summary_type).observe(tokens)
+        chunk_count.labels(summary_type).observe(chunks)
+
+
+class MetricsMiddleware:
+    '''
+    ASGI middleware counting requests and timing them per route template, so that path
+    parameters such as transaction ids do not create new series
+    '''
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths = None
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._route_paths is None:
+            self._route_paths = {route.endpoint: route.path
+                                 for route in scope["app"].routes if hasattr(route, "endpoint")}
+        return self._route_paths.get(endpoint, "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        # [status, recorded]
+        state = [500, False]
+
+        def record():
+            state[1] = True
+            route = self._route(scope)
+            request_seconds.labels(route, scope["method"]).observe(time.perf_counter() - start)
+            request_count.labels(route, scope["method"], state[0]).inc()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state[0] = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                record()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Unhandled errors are answered with a 500 by the server error middleware further out
+            if not state[1]:
+                record()
@@ -1,10 +1,13 @@
 from enum import Enum
 from pydantic import BaseModel, Field
+from typing import List, Optional, Union
 from uuid import UUID, uuid4
 
 
 class Note(BaseModel):
     work_note: str
+    # Set when the note is the growing work notes of an incident, to summarize it incrementally
+    incident_id: Optional[str] = None
 
 class BuildLogs(BaseModel):
     logs: str
@@ -14,6 +17,15 @@ class Telemetry(BaseModel):
     metric: str
     error: str
 
+class TelemetryEvent(BaseModel):
+    anomaly: str
+    metric: str
+    error: str = ""
+    # Taken from the service (app, job) label of the metric when not set
+    service: Optional[str] = None
+    # Epoch seconds of the anomaly; the time it is received when not set
+    timestamp: Optional[float] = None
+
 
 
 class UnstructuredSummary(BaseModel):
@@ -58,6 +70,63 @@ class StatusEnum(Enum):
     ERROR = "Error"
 
 
+class BatchSummaryTypeEnum(Enum):
+    LONG_SUMMARY = "long_summary"
+    STRUCTURED_SUMMARY = "structured_summary"
+    BUILD_SUMMARY = "build_summary_structured"
+
+
+class BatchModeEnum(Enum):
+    STREAM = "stream"
+    JOB = "job"
+
+
+class BatchItem(BaseModel):
+    id: Optional[str] = None
+    text: str
+
+
+class BatchSummaryRequest(BaseModel):
+    summary_type: BatchSummaryTypeEnum = BatchSummaryTypeEnum.LONG_SUMMARY
+    items: List[BatchItem]
+
+
+class BatchItemResult(BaseModel):
+    id: str
+    status: StatusEnum
+    result: Union[dict, str, None] = None
+    error_code: Optional[int] = None
+    error: Optional[str] = None
+
+
+class BatchSummaryResponse(BaseModel):
+    transaction_id: str
+    status: StatusEnum
+    items: List[BatchItemResult] = []
+
+
+class TelemetryGroupSummary(BaseModel):
+    group_id: str
+    service: str
+    window_start: float
+    window_end: float
+    event_count: int
+    metrics: List[str] = []
+    status: StatusEnum
+    signature: Optional[str] = None
+    summary: Optional[str] = None
+    # The summary came from the cache of an earlier group with the same signature
+    cached: bool = False
+
+
+class TelemetryIngestResponse(BaseModel):
+    accepted: int
+    # Groups the events were added to, in order of first use
+    group_ids: List[str]
+    # Filled when the upload is flushed
+    groups: List[TelemetryGroupSummary] = []
+
+
 class CleanseDataResponse(BaseModel):
     transaction_id: str
     status: StatusEnum
@@ -67,21 +136,33 @@ class CleanseDataResponse(BaseModel):
 class CleanseDataStatusResponse(BaseModel):
     transaction_id: str
     status: StatusEnum
+    queue_wait_ms: Optional[float] = None
+    run_time_ms: Optional[float] = None
 
 
 class Job(BaseModel):
     job_uuid: UUID = Field(default_factory=uuid4)
     status: StatusEnum = StatusEnum.IN_PROGRESS
     result: str = "No Data"
+    queue_wait_ms: Optional[float] = None
+    run_time_ms: Optional[float] = None
 
 
 class ExceptionMessageEnum(Enum):
     INPUT_LIMIT_REACHED="Cannot process more than 35000 thousand tokens at one go! Tokens:{token}"
+    REDUCE_DEPTH_EXCEEDED = "Summaries still exceed the reduce limit after {depth} reduce levels"
     LLM_CONNECTION_EXCEPTION = "Exception occured while connecting to LLM Platform{}"
     LLM_GENERATE_TEXT_EXCEPTION = "Exception occured while generating text from LLM Platform{}"
     ERROR_RESPONSE = "Exception Occured while generating API Response:{}"
     VALIDATION_ERROR = "Validation Error Occured:{}"
     DATA_CLEANSING_ERROR = "Error Ocuured While Invoking Cleansing Data API:{}"
+    BATCH_TOO_LARGE = "A batch can hold at most {max_items} items, got {items}"
+    INVALID_NDJSON_LINE = "Invalid NDJSON item on line {line}: {error}"
+    TELEMETRY_GROUP_NOT_FOUND = "No telemetry group {group_id}"
+    LLM_UNAVAILABLE = "LLM platform is unavailable, retry after {retry_after} seconds"
+    LLM_RATE_LIMITED = "LLM platform rate limit exceeded, retry after {retry_after} seconds"
+    JOB_QUEUE_FULL = "Cleansing job queue is full, retry after {retry_after} seconds"
+    JOB_CANCELLED = "Job was cancelled before it ran because the service shut down"
 
 
 class CustomException(Exception):
@@ -89,4 +170,24 @@ class CustomException(Exception):
         self.error_code = error_code
         self.message = message
         super().__init__(self.message)
-    
\ No newline at end of file
+
+
+class JobQueueFullException(CustomException):
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__(error_code=429,
+                         message=ExceptionMessageEnum.JOB_QUEUE_FULL.value.format(retry_after=retry_after))
+
+
+class LLMUnavailableException(CustomException):
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__(error_code=503,
+                         message=ExceptionMessageEnum.LLM_UNAVAILABLE.value.format(retry_after=retry_after))
+
+
+class LLMRateLimitedException(CustomException):
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__(error_code=429,
+                         message=ExceptionMessageEnum.LLM_RATE_LIMITED.value.format(retry_after=retry_after))
@@ -0,0 +1,104 @@
+import os
+import time
+import logging
+import threading
+import configparser
+
+config = configparser.ConfigParser()
+config.read("constants.ini")
+PRELOAD_MODELS = [name.strip() for name in os.getenv("PRELOAD_MODELS", config.get('MODEL_REGISTRY', 'PRELOAD')).split(",")
+                  if name.strip()]
+PRELOAD_IN_BACKGROUND = config.getboolean('MODEL_REGISTRY', 'PRELOAD_IN_BACKGROUND')
+
+
+class ModelRegistry:
+    '''
+    Process-wide registry of models. Each model is loaded lazily on first use, exactly once,
+    and can optionally be warmed up (one inference call) after loading.
+    '''
+
+    def __init__(self):
+        self._loaders = {}
+        self._warm_ups = {}
+        self._models = {}
+        self._locks = {}
+        self._load_seconds = {}
+        self._warm = set()
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader, warm_up=None):
+        '''
+        Registers loader() for name; warm_up(model) is run by preload when warm-up is requested
+        '''
+        with self._lock:
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+            if warm_up is not None:
+                self._warm_ups[name] = warm_up
+
+    def get(self, name: str):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if name not in self._loaders:
+            raise KeyError(f"No model registered under {name}")
+        with self._locks[name]:
+            if name not in self._models:
+                start = time.perf_counter()
+                try:
+                    self._models[name] = self._loaders[name]()
+                except Exception as e:
+                    self._errors[name] = str(e)
+                    raise
+                self._load_seconds[name] = round(time.perf_counter() - start, 3)
+                self._errors.pop(name, None)
+                logging.info(f"Loaded model {name} in {self._load_seconds[name]}s")
+        return self._models[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def warm_up(self, name: str):
+        model = self.get(name)
+        warm_up = self._warm_ups.get(name)
+        with self._locks[name]:
+            if warm_up is not None and name not in self._warm:
+                warm_up(model)
+        self._warm.add(name)
+
+    def _preload(self, names: list, warm_up: bool):
+        for name in names:
+            try:
+                if warm_up:
+                    self.warm_up(name)
+                else:
+                    self.get(name)
+            except Exception as e:
+                logging.error(f"Error while preloading model {name}: {e}")
+
+    def preload(self, names: list, background: bool = False, warm_up: bool = False):
+        '''
+        Loads (and optionally warms up) the named models, on a daemon thread when background is set
+        '''
+        if background:
+            thread = threading.Thread(target=self._preload, args=(names, warm_up), name="model-preload", daemon=True)
+            thread.start()
+            return thread
+        self._preload(names, warm_up)
+
+    def status(self) -> dict:
+        return {
+            name: {
+                "loaded": name in self._models,
+                # Models without a warm-up step are warm as soon as they are loaded
+                "warm": name in self._warm or (name in self._models and name not in self._warm_ups),
+                "load_seconds": self._load_seconds.get(name),
+                "error": self._errors.get(name),
+            }
+            for name in self._loaders
+        }
+
+
+model_registry = ModelRegistry()
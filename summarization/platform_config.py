@@ -1,17 +1,40 @@
 import os
 import configparser
-from integrations.watsonx.bam_integration import BAMIntegration
-from integrations.watsonx.dataplatform_integration import DataplatformIntegration
-from integrations.watsonx.prompt_builder import PromptBuilders as WatsonxPromptBuilders
+from model_registry import model_registry
 
 PLATFORM = os.getenv("PLATFORM", None)
 config = configparser.ConfigParser()
 config.read("constants.ini")
 
 
-if  PLATFORM == config.get('GENAI_PLATFORM','BAM'):
-    integration = BAMIntegration()
-    promptbuilders = WatsonxPromptBuilders()
-elif  PLATFORM == config.get('GENAI_PLATFORM','DATAPLATFORM'):
-    integration = DataplatformIntegration()
-    promptbuilders = WatsonxPromptBuilders()
+def load_platform():
+    '''
+    Builds the LLM integration and prompt builders of the selected platform.
+    Integrations are imported for the selected platform only, so benchmarks can
+    install an offline integration without the watsonx SDKs
+    '''
+    if  PLATFORM == config.get('GENAI_PLATFORM','BAM'):
+        from integrations.watsonx.bam_integration import BAMIntegration
+        from integrations.watsonx.prompt_builder import PromptBuilders as WatsonxPromptBuilders
+        return BAMIntegration(), WatsonxPromptBuilders()
+    elif  PLATFORM == config.get('GENAI_PLATFORM','DATAPLATFORM'):
+        from integrations.watsonx.dataplatform_integration import DataplatformIntegration
+        from integrations.watsonx.prompt_builder import PromptBuilders as WatsonxPromptBuilders
+        return DataplatformIntegration(), WatsonxPromptBuilders()
+    elif  PLATFORM == config.get('GENAI_PLATFORM','HTTP'):
+        from http_integration import HTTPIntegration
+        from integrations.watsonx.prompt_builder import PromptBuilders as WatsonxPromptBuilders
+        return HTTPIntegration(), WatsonxPromptBuilders()
+    raise ValueError(f"No GenAI platform configured for PLATFORM={PLATFORM}")
+
+
+model_registry.register("llm_platform", load_platform)
+
+
+def __getattr__(name):
+    # integration and promptbuilders are built on first access
+    if name == "integration":
+        return model_registry.get("llm_platform")[0]
+    if name == "promptbuilders":
+        return model_registry.get("llm_platform")[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
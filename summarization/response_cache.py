@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+import configparser
+from collections import OrderedDict
+from typing import Optional
+
+config = configparser.ConfigParser()
+config.read("constants.ini")
+RESPONSE_CACHE_ENABLED = config.getboolean('RESPONSE_CACHE', 'ENABLED')
+RESPONSE_CACHE_MAX_ENTRIES = int(config.get('RESPONSE_CACHE', 'MAX_ENTRIES'))
+RESPONSE_CACHE_TTL_SECONDS = int(config.get('RESPONSE_CACHE', 'TTL_SECONDS'))
+RESPONSE_CACHE_DISK_PATH = os.getenv("RESPONSE_CACHE_DISK_PATH", config.get('RESPONSE_CACHE', 'DISK_PATH'))
+RESPONSE_CACHE_DISK_MAX_ENTRIES = int(config.get('RESPONSE_CACHE', 'DISK_MAX_ENTRIES'))
+# Expired and surplus disk entries are trimmed once every this many writes
+DISK_EVICTION_INTERVAL = 100
+
+
+def normalize_params(params):
+    '''
+    Turns generation params (dict, pydantic model or plain object) into JSON-serialisable data
+    '''
+    if params is None or isinstance(params, (str, int, float, bool, list, dict)):
+        return params
+    if hasattr(params, "dict"):
+        return params.dict()
+    if hasattr(params, "__dict__"):
+        return vars(params)
+    return str(params)
+
+
+class DiskCache:
+    '''
+    SQLite tier of the response cache with TTL expiry and a cap on the number of entries
+    '''
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._writes = 0
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, accessed_at REAL NOT NULL, expires_at REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str):
+        connection = self._connection()
+        now = time.time()
+        row = connection.execute(
+            "SELECT value FROM responses WHERE key = ? AND expires_at > ?", (key, now)).fetchone()
+        if row is None:
+            return None
+        connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(zlib.decompress(row[0]))
+
+    def set(self, key: str, value):
+        connection = self._connection()
+        now = time.time()
+        connection.execute(
+            "INSERT OR REPLACE INTO responses (key, value, accessed_at, expires_at) VALUES (?, ?, ?, ?)",
+            (key, zlib.compress(json.dumps(value).encode("utf-8")), now, now + self.ttl_seconds))
+        self._writes += 1
+        if self._writes % DISK_EVICTION_INTERVAL == 0:
+            self.evict()
+
+    def evict(self):
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+            connection.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,))
+
+
+class ResponseCache:
+    '''
+    Content-addressed cache of LLM responses keyed on (summary_type, prompt, generation params).
+    An in-process LRU tier sits in front of an optional SQLite tier on disk.
+    '''
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl_seconds: int = RESPONSE_CACHE_TTL_SECONDS,
+                 disk_path: str = RESPONSE_CACHE_DISK_PATH, disk_max_entries: int = RESPONSE_CACHE_DISK_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk = DiskCache(disk_path, disk_max_entries, ttl_seconds) if disk_path else None
+        # key -> (expires_at, value)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(summary_type: str, prompt, params) -> str:
+        payload = json.dumps([summary_type, prompt, normalize_params(params)], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _set_memory(self, key: str, value):
+        self._memory[key] = (time.time() + self.ttl_seconds, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[object]:
+        with self._lock:
+            record = self._memory.get(key)
+            if record is not None:
+                if record[0] > time.time():
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return record[1]
+                del self._memory[key]
+
+        value = self.disk.get(key) if self.disk is not None else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                # Promote disk hits into the memory tier
+                self.hits += 1
+                self.disk_hits += 1
+                self._set_memory(key, value)
+        return value
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._set_memory(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._memory),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache() if RESPONSE_CACHE_ENABLED else None
@@ -0,0 +1,428 @@
+import os
+import re
+import json
+import time
+import fcntl
+import hashlib
+import logging
+import threading
+import configparser
+import numpy as np
+from model_registry import model_registry
+from metrics import observe_stage
+from dataprocessing.build_log_reducer import build_log_reducer, line_template
+
+config = configparser.ConfigParser()
+config.read("constants.ini")
+SEMANTIC_CACHE_ENABLED = config.getboolean('SEMANTIC_CACHE', 'ENABLED')
+SEMANTIC_CACHE_MODEL_NAME = config.get('SEMANTIC_CACHE', 'MODEL_NAME')
+# Keys are built from the error window of a build log, so only build summaries are cached
+SEMANTIC_CACHE_SUMMARY_TYPES = ['build_summary_structured']
+SEMANTIC_CACHE_THRESHOLD = float(config.get('SEMANTIC_CACHE', 'SIMILARITY_THRESHOLD'))
+SEMANTIC_CACHE_MAX_ENTRIES = int(config.get('SEMANTIC_CACHE', 'MAX_ENTRIES'))
+SEMANTIC_CACHE_TTL_SECONDS = int(config.get('SEMANTIC_CACHE', 'TTL_SECONDS'))
+SEMANTIC_CACHE_WINDOW_CHARS = int(config.get('SEMANTIC_CACHE', 'WINDOW_CHARS'))
+SEMANTIC_CACHE_MAX_CANDIDATES = int(config.get('SEMANTIC_CACHE', 'MAX_CANDIDATES'))
+SEMANTIC_CACHE_BATCH_SIZE = int(config.get('SEMANTIC_CACHE', 'BATCH_SIZE'))
+SEMANTIC_CACHE_INDEX_PATH = os.getenv("SEMANTIC_CACHE_INDEX_PATH", config.get('SEMANTIC_CACHE', 'INDEX_PATH'))
+
+# Host names with a number in their first label (build agents, pods, cloud instances)
+HOST_PATTERN = re.compile(r"\b[a-z0-9-]*\d[a-z0-9-]*(?:\.[a-z0-9-]+)+\b", re.IGNORECASE)
+
+
+class CacheKey:
+    '''
+    What a build log is cached under, all taken from its error window (the lines around errors):
+    the digest of the window as it is, the window with numbers, ids and host names masked (embedded
+    for the similarity search) and a signature, the error line templates and the host names, that a
+    similar entry has to share to be served
+    '''
+    __slots__ = ("digest", "text", "signature")
+
+    def __init__(self, digest: str, text: str, signature: list):
+        self.digest = digest
+        self.text = text
+        self.signature = signature
+
+    @staticmethod
+    def from_text(text: str, window_chars: int = SEMANTIC_CACHE_WINDOW_CHARS):
+        '''
+        The key of a (pre-reduced) build log, None when it has no error window to key on
+        '''
+        window = build_log_reducer.error_window(text)
+        if not window:
+            return None
+        errors = sorted({line_template(line) for line in window if build_log_reducer.error_pattern.search(line)})
+        hosts = sorted({host.lower() for line in window for host in HOST_PATTERN.findall(line)})
+        masked = "\n".join(line_template(HOST_PATTERN.sub("<host>", line)) for line in window)
+        return CacheKey(hashlib.sha256("\n".join(window).encode("utf-8")).hexdigest(), masked[:window_chars],
+                        errors + ["hosts:"] + hosts)
+
+
+class SentenceEncoder:
+    '''
+    Sentence-transformers model, loaded through the model registry on first use
+    '''
+
+    def __init__(self, model_name: str = SEMANTIC_CACHE_MODEL_NAME, batch_size: int = SEMANTIC_CACHE_BATCH_SIZE):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        self.batch_size = batch_size
+
+    def embed(self, texts: list) -> np.ndarray:
+        '''
+        Unit vectors of texts, one row per text, encoded in batches
+        '''
+        vectors = self.model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True,
+                                    normalize_embeddings=True, show_progress_bar=False)
+        return np.asarray(vectors, dtype=np.float32).reshape(len(texts), self.dimension)
+
+    def warm_up(self):
+        self.embed(["Build failed: tests failed in module payments"])
+
+
+model_registry.register("sentence_encoder", SentenceEncoder, warm_up=SentenceEncoder.warm_up)
+
+
+class VectorIndex:
+    '''
+    Fixed number of slots holding a unit vector, its kind (summary type, -1 for a free slot), expiry
+    and last use. Search is one matrix-vector product over all slots. With a path the arrays are
+    memory-mapped .npy files, so every write is persisted; otherwise they live in memory.
+    '''
+
+    def __init__(self, capacity: int, dimension: int, path: str = None, writable: bool = True):
+        self.capacity = capacity
+        self.dimension = dimension
+        self.persistent = path is not None and writable
+        shapes = {
+            "vectors": ((capacity, dimension), np.float32),
+            "kinds": ((capacity,), np.int16),
+            "expires": ((capacity,), np.float64),
+            "last_used": ((capacity,), np.float64),
+        }
+        for name, (shape, dtype) in shapes.items():
+            setattr(self, name, self._array(path, name, shape, dtype, writable))
+
+    def _array(self, path, name, shape, dtype, writable):
+        file_name = os.path.join(path, f"{name}.npy") if path else None
+        if file_name is not None and os.path.exists(file_name):
+            try:
+                array = np.load(file_name, mmap_mode="r+" if writable else "r")
+                if array.shape == shape and array.dtype == dtype:
+                    return array if writable else np.array(array)
+            except ValueError:
+                pass
+            if not writable:
+                file_name = None
+        if file_name is not None and writable:
+            array = np.lib.format.open_memmap(file_name, mode="w+", dtype=dtype, shape=shape)
+        else:
+            array = np.zeros(shape, dtype=dtype)
+        if name == "kinds":
+            array[:] = -1
+        return array
+
+    def search(self, vector: np.ndarray, kind: int, now: float, threshold: float, limit: int) -> list:
+        '''
+        Slots of the live vectors of kind at least threshold similar to vector, most similar first, at most limit
+        '''
+        live = (self.kinds == kind) & (self.expires > now)
+        if not live.any():
+            return []
+        scores = self.vectors @ vector
+        scores[~live] = -np.inf
+        slots = np.flatnonzero(scores >= threshold)
+        return slots[np.argsort(-scores[slots])][:limit].tolist()
+
+    def allocate(self, now: float) -> int:
+        '''
+        A free or expired slot, else the least recently used one
+        '''
+        free = np.flatnonzero((self.kinds < 0) | (self.expires <= now))
+        if free.size:
+            return int(free[0])
+        return int(np.argmin(self.last_used))
+
+    def put(self, slot: int, vector: np.ndarray, kind: int, expires: float, now: float):
+        self.vectors[slot] = vector
+        self.kinds[slot] = kind
+        self.expires[slot] = expires
+        self.last_used[slot] = now
+        if self.persistent:
+            for array in (self.vectors, self.kinds, self.expires, self.last_used):
+                array.flush()
+
+    def live_slots(self, now: float) -> np.ndarray:
+        return np.flatnonzero((self.kinds >= 0) & (self.expires > now))
+
+
+class SemanticCache:
+    '''
+    Cache of build summaries for near-duplicate build logs, keyed on their error window (CacheKey).
+    A window identical to a cached one is a hit at once; otherwise the masked window is embedded with
+    the sentence encoder, and a cached entry of the same summary type is a hit when the cosine
+    similarity reaches threshold and its signature (error lines and hosts) is the same. Logs without
+    an error window are not cached. Entries expire after ttl_seconds and the least recently used is
+    evicted when the index is full.
+
+    With a path, the index is kept in memory-mapped files there and the summaries in an append-only
+    entries.jsonl. One process (the first to lock the directory) writes them; other server workers
+    load them at startup and keep their later entries in memory.
+    '''
+
+    def __init__(self, summary_types: list = SEMANTIC_CACHE_SUMMARY_TYPES, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES, ttl_seconds: int = SEMANTIC_CACHE_TTL_SECONDS,
+                 path: str = SEMANTIC_CACHE_INDEX_PATH or None, encoder=None,
+                 max_candidates: int = SEMANTIC_CACHE_MAX_CANDIDATES):
+        self.summary_types = list(summary_types)
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_candidates = max_candidates
+        self.path = path
+        self._encoder = encoder
+        self._index = None
+        # slot -> (digest, signature, value); (summary type, digest) -> slot
+        self._values = {}
+        self._digests = {}
+        self._log = None
+        self._log_lines = 0
+        self._lock_file = None
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.exact_hits = 0
+        self.rejected = 0
+        self.uncacheable = 0
+        self.stores = 0
+        self.evictions = 0
+        self.errors = 0
+        self.lookup_seconds = 0.0
+        self.max_lookup_seconds = 0.0
+
+    def handles(self, summary_type: str) -> bool:
+        return summary_type in self.summary_types
+
+    @property
+    def encoder(self) -> SentenceEncoder:
+        return self._encoder if self._encoder is not None else model_registry.get("sentence_encoder")
+
+    def _open(self):
+        # Must hold the lock; the index is created once the encoder (and so the dimension) is known
+        if self._index is not None:
+            return self._index
+        dimension = self.encoder.dimension
+        path, writable = self.path, False
+        if path:
+            os.makedirs(path, exist_ok=True)
+            writable = self._lock_directory()
+            if writable:
+                self._check_meta(dimension)
+            elif not self._meta_matches(dimension):
+                # Files of another configuration, still owned by a process that runs it
+                path = None
+        self._index = VectorIndex(self.max_entries, dimension, path, writable)
+        if path:
+            self._load_entries(writable)
+        return self._index
+
+    def _lock_directory(self) -> bool:
+        self._lock_file = open(os.path.join(self.path, "index.lock"), "w")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+
+    def _meta(self, dimension: int) -> dict:
+        return {"model": self.encoder.model_name, "dimension": dimension, "capacity": self.max_entries,
+                "summary_types": self.summary_types, "key": "error_window"}
+
+    def _meta_matches(self, dimension: int) -> bool:
+        try:
+            with open(os.path.join(self.path, "meta.json")) as f:
+                return json.load(f) == self._meta(dimension)
+        except (OSError, ValueError):
+            return False
+
+    def _check_meta(self, dimension: int):
+        '''
+        Clears the files when they were written for another model, size, list of summary types or key
+        '''
+        if self._meta_matches(dimension):
+            return
+        for name in ("vectors.npy", "kinds.npy", "expires.npy", "last_used.npy", "entries.jsonl"):
+            if os.path.exists(os.path.join(self.path, name)):
+                os.remove(os.path.join(self.path, name))
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(self._meta(dimension), f)
+
+    def _load_entries(self, writable: bool):
+        entries_file = os.path.join(self.path, "entries.jsonl")
+        now = time.time()
+        live = set(self._index.live_slots(now).tolist())
+        entries = {}
+        if os.path.exists(entries_file):
+            with open(entries_file) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut off by a crash
+                        continue
+                    entries[entry["slot"]] = entry
+        for slot, entry in entries.items():
+            if slot in live:
+                self._values[slot] = (entry["digest"], entry["signature"], entry["value"])
+                self._digests[(self.summary_types[self._index.kinds[slot]], entry["digest"])] = slot
+            elif 0 <= slot < self.max_entries:
+                # Vector without its summary, e.g. written just before a crash
+                self._index.kinds[slot] = -1
+        if writable:
+            self._rewrite_log()
+
+    def _rewrite_log(self):
+        # Compacts the entries log down to the live entries
+        entries_file = os.path.join(self.path, "entries.jsonl")
+        if self._log is not None:
+            self._log.close()
+        with open(entries_file + ".tmp", "w") as f:
+            for slot, (digest, signature, value) in self._values.items():
+                f.write(json.dumps({"slot": slot, "digest": digest, "signature": signature, "value": value}) + "\n")
+        os.replace(entries_file + ".tmp", entries_file)
+        self._log = open(entries_file, "a")
+        self._log_lines = len(self._values)
+
+    def _record(self, seconds: float, hit: bool, exact: bool = False):
+        with self._lock:
+            self.lookups += 1
+            self.hits += 1 if hit else 0
+            self.exact_hits += 1 if exact else 0
+            self.lookup_seconds += seconds
+            self.max_lookup_seconds = max(self.max_lookup_seconds, seconds)
+        observe_stage("semantic_cache_lookup", seconds)
+
+    def _verified(self, slots: list, signature: list):
+        # Similar is not enough: a candidate has to fail the same way on the same hosts
+        for slot in slots:
+            if self._values[slot][1] == signature:
+                return slot
+            self.rejected += 1
+        return None
+
+    def lookup(self, text: str, summary_type: str):
+        '''
+        Returns (query, cached value or None). The query is passed to store() once the summary is made,
+        so a miss does not embed the text twice. Errors of the cache count as misses.
+        '''
+        return self.lookup_many([text], summary_type)[0]
+
+    def lookup_many(self, texts: list, summary_type: str) -> list:
+        '''
+        lookup() for several texts, whose embeddings are computed in one batch
+        '''
+        start = time.perf_counter()
+        try:
+            kind = self.summary_types.index(summary_type)
+            keys = [CacheKey.from_text(text) for text in texts]
+            now = time.time()
+            results = [(None, None)] * len(texts)
+            exact = set()
+            missing = []
+            with self._lock:
+                index = self._open()
+                self.uncacheable += sum(1 for key in keys if key is None)
+                for position, key in enumerate(keys):
+                    if key is None:
+                        continue
+                    slot = self._digests.get((summary_type, key.digest))
+                    if slot is not None and index.kinds[slot] == kind and index.expires[slot] > now:
+                        index.last_used[slot] = now
+                        results[position] = (None, self._values[slot][2])
+                        exact.add(position)
+                    else:
+                        missing.append(position)
+
+            vectors = self.encoder.embed([keys[position].text for position in missing]) if missing else []
+            with self._lock:
+                for position, vector in zip(missing, vectors):
+                    key = keys[position]
+                    slot = self._verified(index.search(vector, kind, now, self.threshold, self.max_candidates),
+                                          key.signature)
+                    if slot is not None:
+                        index.last_used[slot] = now
+                        results[position] = (None, self._values[slot][2])
+                    else:
+                        results[position] = ((kind, key, vector), None)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            logging.error(f"Error during semantic cache lookup: {e}")
+            return [(None, None)] * len(texts)
+
+        # Lookups of a batch share their time; logs without an error window are not counted
+        seconds = (time.perf_counter() - start) / len(texts)
+        for position, (_, value) in enumerate(results):
+            if keys[position] is not None:
+                self._record(seconds, value is not None, exact=position in exact)
+        return results
+
+    def store(self, query, value: dict):
+        '''
+        Caches value, a JSON-serialisable summary, for the input of a missed lookup
+        '''
+        if query is None:
+            return
+        kind, key, vector = query
+        try:
+            now = time.time()
+            with self._lock:
+                index = self._open()
+                slot = index.allocate(now)
+                if index.kinds[slot] >= 0:
+                    if index.expires[slot] > now:
+                        self.evictions += 1
+                    old_digest, _, _ = self._values.pop(slot, (None, None, None))
+                    self._digests.pop((self.summary_types[index.kinds[slot]], old_digest), None)
+                index.put(slot, vector, kind, now + self.ttl_seconds, now)
+                self._values[slot] = (key.digest, key.signature, value)
+                self._digests[(self.summary_types[kind], key.digest)] = slot
+                self.stores += 1
+                if self._log is not None:
+                    self._log.write(json.dumps({"slot": slot, "digest": key.digest, "signature": key.signature,
+                                                "value": value}) + "\n")
+                    self._log.flush()
+                    self._log_lines += 1
+                    if self._log_lines > 2 * self.max_entries:
+                        self._rewrite_log()
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            logging.error(f"Error while storing in the semantic cache: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._values),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "exact_hits": self.exact_hits,
+                "rejected_candidates": self.rejected,
+                "uncacheable": self.uncacheable,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "errors": self.errors,
+                "average_lookup_ms": round(self.lookup_seconds / self.lookups * 1000, 3) if self.lookups else 0.0,
+                "max_lookup_ms": round(self.max_lookup_seconds * 1000, 3),
+                "persistent": self._log is not None,
+            }
+
+
+semantic_cache = SemanticCache() if SEMANTIC_CACHE_ENABLED else None
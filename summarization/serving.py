@@ -0,0 +1,189 @@
+import os
+import math
+import time
+import asyncio
+import logging
+import threading
+import configparser
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi.concurrency import run_in_threadpool
+from metrics import observe_stage
+
+config = configparser.ConfigParser()
+config.read("constants.ini")
+SERVING_WORKERS = int(os.getenv("WEB_CONCURRENCY", config.get('SERVING', 'WORKERS')))
+SERVING_CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", config.get('SERVING', 'CPU_POOL_WORKERS')))
+SERVING_TORCH_THREADS = int(os.getenv("TORCH_THREADS", config.get('SERVING', 'TORCH_THREADS')))
+
+
+def available_cpus() -> int:
+    '''
+    CPUs this process may run on: the affinity mask, limited by the cgroup CPU quota of a container
+    '''
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    # cgroup v2, then v1
+    for quota_file, period_file in (("/sys/fs/cgroup/cpu.max", None),
+                                    ("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "/sys/fs/cgroup/cpu/cpu.cfs_period_us")):
+        try:
+            with open(quota_file) as f:
+                values = f.read().split()
+            if period_file is not None:
+                with open(period_file) as f:
+                    values.append(f.read().strip())
+            if values[0] not in ("max", "-1"):
+                cpus = min(cpus, max(1, math.ceil(int(values[0]) / int(values[1]))))
+            break
+        except (OSError, ValueError, IndexError):
+            continue
+    return cpus
+
+
+def worker_count() -> int:
+    '''
+    Server worker processes: SERVING.WORKERS (or WEB_CONCURRENCY), one per available CPU when 0
+    '''
+    return SERVING_WORKERS if SERVING_WORKERS > 0 else available_cpus()
+
+
+def torch_thread_count(workers: int, pool_workers: int) -> int:
+    '''
+    Torch intra-op threads per process, so that all processes together do not use more threads than CPUs
+    '''
+    if SERVING_TORCH_THREADS > 0:
+        return SERVING_TORCH_THREADS
+    return max(1, available_cpus() // (workers * max(1, pool_workers)))
+
+
+def configure_torch_threads(threads: int):
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+
+
+def _init_pool_process(torch_threads: int, warm_up):
+    configure_torch_threads(torch_threads)
+    if warm_up is not None:
+        warm_up()
+
+
+class CPUPool:
+    '''
+    Process pool of one server worker for CPU-bound NLP (spaCy cleaning, BART generation), so that
+    these calls neither hold the GIL of the worker nor block its event loop. Pool processes are
+    forked from the worker and so share its preloaded models copy-on-write; each runs the warm_up
+    given to start() as it starts, since warming up the worker does not warm them. Until start() is
+    called (e.g. under plain uvicorn), and inside the pool processes themselves, calls run in
+    the calling process.
+    '''
+
+    def __init__(self, max_workers: int = SERVING_CPU_POOL_WORKERS):
+        self.max_workers = max_workers
+        self.torch_threads = None
+        self.warm_up = None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.submitted = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._executor is not None and self._pid == os.getpid()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("fork"),
+                                       initializer=_init_pool_process, initargs=(self.torch_threads, self.warm_up))
+        # Fork the pool processes now rather than on the first request; they are all started on the first submit
+        for _ in range(self.max_workers):
+            executor.submit(os.getpid)
+        return executor
+
+    def start(self, torch_threads: int, warm_up=None):
+        '''
+        Starts the pool; called right after the worker is forked, while it still runs a single thread.
+        warm_up() is run in every pool process before its first call.
+        '''
+        if self.max_workers <= 0:
+            return
+        with self._lock:
+            self.torch_threads = torch_threads
+            self.warm_up = warm_up
+            self._pid = os.getpid()
+            self._executor = self._new_executor()
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            executor = self._executor
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # A pool process died; start a fresh pool and retry once
+            logging.error("A CPU pool process died, restarting the pool")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = self._new_executor()
+                executor = self._executor
+            future = executor.submit(fn, *args)
+        with self._lock:
+            self._in_flight += 1
+            self.submitted += 1
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def call(self, fn, *args, stage: str = None):
+        '''
+        Runs fn(*args) in the pool and waits for the result. Stage timings recorded inside the pool
+        are lost with its process, so the call is recorded under stage here.
+        '''
+        if not self.enabled:
+            return fn(*args)
+        start = time.perf_counter()
+        future = self._submit(fn, *args)
+        try:
+            return future.result()
+        finally:
+            if stage is not None:
+                observe_stage(stage, time.perf_counter() - start)
+
+    async def acall(self, fn, *args, stage: str = None):
+        '''
+        Async counterpart of call; without the pool fn runs in the threadpool
+        '''
+        if not self.enabled:
+            return await run_in_threadpool(fn, *args)
+        start = time.perf_counter()
+        future = self._submit(fn, *args)
+        try:
+            return await asyncio.wrap_future(future)
+        finally:
+            if stage is not None:
+                observe_stage(stage, time.perf_counter() - start)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "workers": self.max_workers if self.enabled else 0,
+            "torch_threads": self.torch_threads,
+            "in_flight": self._in_flight,
+            "submitted": self.submitted,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+cpu_pool = CPUPool()
@@ -0,0 +1,61 @@
+import json
+import asyncio
+import hashlib
+
+
+def normalize_input(text: str) -> str:
+    '''
+    Normalizes line endings and trailing whitespace, which carry no meaning in notes and logs
+    '''
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def request_key(endpoint: str, *inputs) -> str:
+    '''
+    Hash of an endpoint and its normalized text inputs
+    '''
+    payload = json.dumps([endpoint] + [normalize_input(value) if isinstance(value, str) else value
+                                       for value in inputs], default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    '''
+    Coalesces concurrent identical requests: while a computation for a key is running, further
+    callers with the same key await it instead of starting their own, and all of them get its
+    result (or its exception). Keys are only held while the computation is in flight.
+    '''
+
+    def __init__(self):
+        self._in_flight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def run(self, key: str, fn, *args):
+        '''
+        Awaits fn(*args), a coroutine function, or the computation already running for key
+        '''
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.calls += 1
+            task = asyncio.ensure_future(fn(*args))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # A caller that disconnects must not cancel the computation the others are waiting for
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        requests = self.calls + self.coalesced
+        return {
+            "in_flight": len(self._in_flight),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalescing_rate": round(self.coalesced / requests, 4) if requests else 0.0,
+        }
+
+
+# Shared by the summary routes, which all run on the event loop of the worker process
+summary_flight = SingleFlight()
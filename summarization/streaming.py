@@ -0,0 +1,63 @@
+import json
+import time
+import logging
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+from model_classes import ExceptionMessageEnum, CustomException
+
+
+def format_event(event: str, data) -> str:
+    '''
+    Formats one Server-Sent Event with a JSON payload
+    '''
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _result_payload(result):
+    if isinstance(result, BaseModel):
+        return result.dict()
+    if isinstance(result, str):
+        return {"summary": result}
+    return result
+
+
+def sse_stream(events, name: str):
+    '''
+    Turns (event, data) pairs from a summarization pipeline into Server-Sent Events.
+    A "started" event is sent before any work is done, failures end the stream with an
+    "error" event, and the final "done" event reports the time to the first event of the pipeline
+    (first_byte_ms: a progress or partial event, or the result) and to the first partial result.
+    '''
+    start = time.perf_counter()
+    timings = {}
+
+    def elapsed_ms():
+        return round((time.perf_counter() - start) * 1000, 3)
+
+    yield format_event("started", {"stream": name})
+
+    try:
+        for event, data in events:
+            # "started" comes before any work, so it does not count as the first byte
+            if "first_byte_ms" not in timings:
+                timings["first_byte_ms"] = elapsed_ms()
+            if event == "partial" and "first_partial_ms" not in timings:
+                timings["first_partial_ms"] = elapsed_ms()
+            if event == "result":
+                if isinstance(data, HTTPException):
+                    yield format_event("error", {"status_code": data.status_code, "detail": data.detail})
+                    continue
+                data = _result_payload(data)
+            yield format_event(event, data)
+    except ValidationError as ve:
+        yield format_event("error", {"status_code": 400, "detail": ExceptionMessageEnum.VALIDATION_ERROR.value.format(ve)})
+    except CustomException as ce:
+        logging.error(str(ce))
+        yield format_event("error", {"status_code": ce.error_code, "detail": str(ce)})
+    except Exception as e:
+        logging.error(ExceptionMessageEnum.ERROR_RESPONSE.value.format(e))
+        yield format_event("error", {"status_code": 500, "detail": ExceptionMessageEnum.ERROR_RESPONSE.value.format(e)})
+
+    timings["total_ms"] = elapsed_ms()
+    logging.info(f"Stream {name} finished: {timings}")
+    yield format_event("done", timings)
@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import inspect
+import threading
+import contextvars
+import configparser
+from functools import wraps
+
+config = configparser.ConfigParser()
+config.read("constants.ini")
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", config.get('TRACING', 'ENABLED')).lower() == "true"
+TRACING_LEVEL = logging.getLevelName(os.getenv("TRACING_LEVEL", config.get('TRACING', 'LEVEL')).upper())
+TRACING_SAMPLE_RATE = float(config.get('TRACING', 'SAMPLE_RATE'))
+TRACING_MAX_ARG_LENGTH = int(config.get('TRACING', 'MAX_ARG_LENGTH'))
+TRACING_EXPORTER = config.get('TRACING', 'EXPORTER')
+TRACING_SPAN_FILE = config.get('TRACING', 'SPAN_FILE')
+
+logger = logging.getLogger("tracing")
+# The root logger stays at INFO (config.py); span records are logged at TRACING_LEVEL
+logger.setLevel(TRACING_LEVEL)
+
+# Span of the function currently executing in this thread or task, or NOT_SAMPLED
+_current_span = contextvars.ContextVar("current_span", default=None)
+NOT_SAMPLED = object()
+
+
+def summarize_value(value, max_length: int = TRACING_MAX_ARG_LENGTH) -> str:
+    '''
+    Short description of an argument or result: large strings are reported by length and hash,
+    large containers by length and their first items
+    '''
+    if isinstance(value, (str, bytes)):
+        if len(value) <= max_length:
+            return repr(value)
+        data = value.encode("utf-8", "replace") if isinstance(value, str) else value
+        return f"<{type(value).__name__} len={len(value)} sha1={hashlib.sha1(data).hexdigest()[:12]}>"
+    if isinstance(value, (list, tuple, set)):
+        items = [summarize_value(item, max_length // 4) for item in list(value)[:3]]
+        more = ", ..." if len(value) > 3 else ""
+        return f"<{type(value).__name__} len={len(value)} [{', '.join(items)}{more}]>"
+    if isinstance(value, dict):
+        return f"<dict len={len(value)} keys={summarize_value(list(value)[:5], max_length)}>"
+    text = repr(value)
+    return text if len(text) <= max_length else text[:max_length] + "..."
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "attributes")
+
+    def __init__(self, name: str, parent):
+        self.trace_id = parent.trace_id if parent is not None else "%032x" % random.getrandbits(128)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.attributes = {}
+
+    def to_dict(self, end_ns: int, status: str) -> dict:
+        # OpenTelemetry-style field names so the file can be fed to a local collector
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": end_ns,
+            "durationMs": round((end_ns - self.start_ns) / 1e6, 3),
+            "status": status,
+            "attributes": self.attributes,
+        }
+
+
+class SpanExporter:
+    '''
+    Writes finished spans as JSON lines, either to the log or to a span file
+    '''
+
+    def __init__(self, exporter: str = TRACING_EXPORTER, span_file: str = TRACING_SPAN_FILE):
+        self.exporter = exporter
+        self.span_file = span_file
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def add_listener(self, listener):
+        '''
+        Registers listener(span_dict), called for every exported span (e.g. by benchmarks)
+        '''
+        self._listeners.append(listener)
+
+    def export(self, span: dict):
+        for listener in self._listeners:
+            listener(span)
+        line = json.dumps(span, default=str)
+        if self.exporter == "file":
+            with self._lock:
+                with open(self.span_file, "a") as span_file:
+                    span_file.write(line + "\n")
+        else:
+            logger.log(TRACING_LEVEL, line)
+
+
+    def enabled(self) -> bool:
+        '''
+        The file exporter always writes; the log exporter only when the tracing logger logs TRACING_LEVEL
+        '''
+        return self.exporter == "file" or logger.isEnabledFor(TRACING_LEVEL)
+
+
+exporter = SpanExporter()
+
+
+def _start_span(name: str, args, kwargs):
+    parent = _current_span.get()
+    if parent is NOT_SAMPLED:
+        return None
+    if parent is None and random.random() >= TRACING_SAMPLE_RATE:
+        return None
+    span = Span(name, parent)
+    if args:
+        span.attributes["args"] = [summarize_value(arg) for arg in args]
+    if kwargs:
+        span.attributes["kwargs"] = {key: summarize_value(value) for key, value in kwargs.items()}
+    return span
+
+
+def _finish_span(span: Span, result=None, error: Exception = None):
+    if error is None:
+        span.attributes["result"] = summarize_value(result)
+        exporter.export(span.to_dict(time.time_ns(), "OK"))
+    else:
+        span.attributes["error"] = summarize_value(str(error))
+        exporter.export(span.to_dict(time.time_ns(), "ERROR"))
+
+
+def traced(func):
+    '''
+    Records a span (timing, summarized arguments and result) for every sampled call of func.
+    With tracing disabled the function is returned undecorated, so it costs nothing.
+    '''
+    if not TRACING_ENABLED:
+        return func
+    name = func.__qualname__
+
+    if inspect.isgeneratorfunction(func):
+        @wraps(func)
+        def steps_wrapper(*args, **kwargs):
+            # A pipeline of steps (dataprocessing.pipeline): the span lasts until the pipeline returns. It is
+            # not made the current span, because the steps run in the driver between two resumptions.
+            if not exporter.enabled():
+                return (yield from func(*args, **kwargs))
+            span = _start_span(name, args, kwargs)
+            try:
+                result = yield from func(*args, **kwargs)
+            except Exception as e:
+                if span is not None:
+                    _finish_span(span, error=e)
+                raise
+            if span is not None:
+                _finish_span(span, result=result)
+            return result
+        return steps_wrapper
+
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if not exporter.enabled():
+                return await func(*args, **kwargs)
+            span = _start_span(name, args, kwargs)
+            token = _current_span.set(span if span is not None else NOT_SAMPLED)
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                if span is not None:
+                    _finish_span(span, error=e)
+                raise
+            finally:
+                _current_span.reset(token)
+            if span is not None:
+                _finish_span(span, result=result)
+            return result
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not exporter.enabled():
+            return func(*args, **kwargs)
+        span = _start_span(name, args, kwargs)
+        token = _current_span.set(span if span is not None else NOT_SAMPLED)
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if span is not None:
+                _finish_span(span, error=e)
+            raise
+        finally:
+            _current_span.reset(token)
+        if span is not None:
+            _finish_span(span, result=result)
+        return result
+    return wrapper